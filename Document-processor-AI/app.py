@@ -2,29 +2,76 @@
 # post /ask {"question": "What is the capital of France?"}
 # get /metrics {Prometheus scrape will be done here}
 
-import time, uuid, logging
+import time, uuid, json, asyncio, logging, threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from cache_store import get as cache_get, set as cache_set
-from llm_client import call as llm_call
+import redis.asyncio
+from cache_store import get as cache_get, set as cache_set, aget as cache_aget, aset as cache_aset, USE_REDIS, REDIS_URL
+from cache_version import acurrent_version
+from llm_client import call as llm_call, acall as llm_acall, astream as llm_astream
 from postprocess import secure_output
 from guardrails import apply_guardrails
-from observability import log as audit_log, record_metric, start_metrics_server
-from config import CACHE_TTL_SECONDS, CACHE_SIMILARITY_THRESHOLD
-from retrieval import retrieve_context
+from observability import log as audit_log, log_cache_hit, record_metric, record_time_to_first_token, start_metrics_server
+from config import (CACHE_TTL_SECONDS, CACHE_SIMILARITY_THRESHOLD, WARMUP_ENABLED, WARMUP_SOURCE,
+                    WARMUP_TOP_N, WARMUP_CONCURRENCY, SINGLE_FLIGHT_ENABLED, SINGLE_FLIGHT_LOCK_SECONDS,
+                    SINGLE_FLIGHT_WAIT_SECONDS, REQUEST_DEADLINE_SECONDS, CACHE_REDIS_TIMEOUT_SECONDS)
+from retrieval import retrieve_context, aretrieve_context
+from embeddings import QuestionEmbedding
 from router import build_prompt
+from stream_guard import StreamGuard
+from single_flight import SingleFlight
+from vector_store import ping as vector_store_ping
+from warmup import WarmupStatus, questions_from_file, questions_from_log, record_questions, warm_cache
 import uvicorn
+
+# cache warm-up runs in the background, /ready reports 503 until it is done
+warmup_status = WarmupStatus()
+
+# the questions served here feed the next start's warm-up, unless it reads a fixed question list
+if not WARMUP_SOURCE.endswith(".txt"):
+    record_questions(WARMUP_SOURCE)
+
+def _warm_up():
+    try:
+        if WARMUP_SOURCE.endswith(".txt"):
+            questions = questions_from_file(WARMUP_SOURCE, WARMUP_TOP_N)
+        else:
+            questions = questions_from_log(WARMUP_SOURCE, WARMUP_TOP_N)
+        warm_cache(questions, run_pipeline, WARMUP_CONCURRENCY, warmup_status)
+    except Exception as e:
+        logging.error(f"Cache warm-up failed: {e}")
+        warmup_status.finish()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ENABLED:
+        threading.Thread(target=_warm_up, name="cache-warmup", daemon=True).start()
+    else:
+        warmup_status.finish()
+    yield
+
 app = FastAPI(
     title="GenAI RAG Pipeline",
     description="A pipeline for answering questions using GenAI and RAG with guardrails, caching and metrics",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 start_metrics_server(port = 8002)
 
+# concurrent cache misses for the same question share one pipeline run, across workers when Redis is up
+_single_flight = SingleFlight(redis.asyncio.Redis.from_url(REDIS_URL, socket_timeout=CACHE_REDIS_TIMEOUT_SECONDS,
+                                                           socket_connect_timeout=CACHE_REDIS_TIMEOUT_SECONDS)
+                              if USE_REDIS else None,
+                              threshold=CACHE_SIMILARITY_THRESHOLD, lock_ttl=SINGLE_FLIGHT_LOCK_SECONDS,
+                              wait_timeout=SINGLE_FLIGHT_WAIT_SECONDS) if SINGLE_FLIGHT_ENABLED else None
+
 # pydantic schema for the request body
 class AskRequest(BaseModel):
     question: str
     user_id: str | None = None
+    timeout_ms: int | None = None  # /ask deadline, REQUEST_DEADLINE_SECONDS if not given
 
 class AskResponse(BaseModel):
     answer: str
@@ -34,15 +81,18 @@ def run_pipeline(question: str, user_id: str | None = None)-> str:
     """
     Run the pipeline for a given question and user id
     """
+    # embedding is computed at most once and shared by cache lookup, retrieval and cache write
+    question_embedding = QuestionEmbedding(question)
+
     # step 1 : Check cache with semantic similarity
-    cached = cache_get(question, similarity_threshold=CACHE_SIMILARITY_THRESHOLD)
+    cached = cache_get(question, similarity_threshold=CACHE_SIMILARITY_THRESHOLD, embedding=question_embedding)
     if cached:
-        logging.info(f"Semantic cache hit for question: {question}")
+        log_cache_hit(question)
         return AskResponse(answer=cached, user_id=user_id)
     
     # step 2 : Retrive context
     t0 = time.time()
-    context = retrieve_context(question)
+    context = retrieve_context(question, embedding=question_embedding)
     retrieval_latency = int( (time.time() - t0)*1000) # in milliseconds
     record_metric("retrieval_latency_ms", retrieval_latency)
     logging.info(f"Retrieval latency: {retrieval_latency}ms")
@@ -77,10 +127,122 @@ def run_pipeline(question: str, user_id: str | None = None)-> str:
     audit_log(question, prompt, post_processed, secured, model=model, latency_ms=retrieval_latency + llm_latency, retrieved_context=context,user_id=user_id)
 
     # Cache the answer
-    cache_set(question, secured, CACHE_TTL_SECONDS)
+    cache_set(question, secured, CACHE_TTL_SECONDS, embedding=question_embedding)
 
     return AskResponse(answer=secured, user_id=user_id)
 
+async def arun_pipeline(question: str, user_id: str | None = None, deadline: float | None = None) -> AskResponse:
+    """
+    Async run_pipeline, used by /ask: the LLM, embedding and Redis calls are awaited,
+    so one slow call does not hold up the other requests on this worker.
+    deadline (time.monotonic()) bounds the LLM call, including its retries and hedge
+    """
+    question_embedding = QuestionEmbedding(question)
+
+    cached = await cache_aget(question, similarity_threshold=CACHE_SIMILARITY_THRESHOLD, embedding=question_embedding)
+    if cached:
+        log_cache_hit(question)
+        return AskResponse(answer=cached, user_id=user_id)
+
+    if _single_flight is None:
+        answer = await _agenerate(question, question_embedding, user_id, deadline)
+    else:
+        answer = await _single_flight.run(question, await question_embedding.avector(), await acurrent_version(),
+                                          lambda: _agenerate(question, question_embedding, user_id, deadline))
+    return AskResponse(answer=answer, user_id=user_id)
+
+async def _agenerate(question: str, question_embedding: QuestionEmbedding, user_id: str | None,
+                     deadline: float | None = None) -> str:
+    """Retrieval, LLM call, redaction and cache write of arun_pipeline, run once per single-flight group"""
+    t0 = time.time()
+    context = await aretrieve_context(question, embedding=question_embedding)
+    retrieval_latency = int( (time.time() - t0)*1000) # in milliseconds
+    record_metric("retrieval_latency_ms", retrieval_latency)
+    logging.info(f"Retrieval latency: {retrieval_latency}ms")
+    logging.info("Retrieved context:")
+    logging.info(context)
+
+    model, prompt = build_prompt(question, context)
+
+    t1 = time.time()
+    raw_answer = await llm_acall(model, prompt, deadline=deadline)
+    llm_latency = int( (time.time() - t1)*1000) # in milliseconds
+    record_metric("llm_latency_ms", llm_latency)
+    logging.info(f"LLM latency: {llm_latency}ms")
+    logging.info("Raw answer:")
+    logging.info(raw_answer)
+
+    post_processed = secure_output(raw_answer)
+    logging.info("Post processed answer:")
+    logging.info(post_processed)
+
+    secured = apply_guardrails(post_processed)
+    logging.info("Secured answer:")
+    logging.info(secured)
+
+    audit_log(question, prompt, post_processed, secured, model=model, latency_ms=retrieval_latency + llm_latency, retrieved_context=context,user_id=user_id)
+
+    await cache_aset(question, secured, CACHE_TTL_SECONDS, embedding=question_embedding)
+
+    return secured
+
+async def astream_pipeline(question: str, user_id: str | None = None, deadline: float | None = None):
+    """
+    arun_pipeline that yields the answer text as the LLM generates it. Every piece is
+    redacted by StreamGuard before it is yielded; the assembled answer is cached.
+    deadline (time.monotonic()) bounds the LLM stream, as in arun_pipeline
+    """
+    t0 = time.time()
+    question_embedding = QuestionEmbedding(question)
+
+    cached = await cache_aget(question, similarity_threshold=CACHE_SIMILARITY_THRESHOLD, embedding=question_embedding)
+    if cached:
+        log_cache_hit(question)
+        record_time_to_first_token("cache", int((time.time() - t0)*1000))
+        yield cached
+        return
+
+    context = await aretrieve_context(question, embedding=question_embedding)
+    retrieval_latency = int( (time.time() - t0)*1000) # in milliseconds
+    record_metric("retrieval_latency_ms", retrieval_latency)
+    logging.info(f"Retrieval latency: {retrieval_latency}ms")
+
+    model, prompt = build_prompt(question, context)
+
+    t1 = time.time()
+    guard = StreamGuard()
+    raw_parts, sent_parts = [], []
+    async for token in llm_astream(model, prompt, deadline=deadline):
+        raw_parts.append(token)
+        safe = guard.feed(token)
+        if safe:
+            if not sent_parts:
+                ttft = int((time.time() - t0)*1000)
+                record_time_to_first_token("llm", ttft)
+                logging.info(f"Time to first token: {ttft}ms")
+            sent_parts.append(safe)
+            yield safe
+    tail = guard.flush()
+    if tail:
+        sent_parts.append(tail)
+        yield tail
+    llm_latency = int( (time.time() - t1)*1000) # in milliseconds
+    record_metric("llm_latency_ms", llm_latency)
+    logging.info(f"LLM latency: {llm_latency}ms")
+
+    # what was streamed is the redacted answer, the same text /ask would have returned
+    secured = "".join(sent_parts).strip()
+    audit_log(question, prompt, secure_output("".join(raw_parts)), secured, model=model, latency_ms=retrieval_latency + llm_latency, retrieved_context=context,user_id=user_id)
+
+    await cache_aset(question, secured, CACHE_TTL_SECONDS, embedding=question_embedding)
+
+def _request_deadline(request: AskRequest) -> float:
+    timeout = request.timeout_ms / 1000 if request.timeout_ms else REQUEST_DEADLINE_SECONDS
+    return time.monotonic() + timeout
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.post("/ask", response_model=AskResponse)
 async def ask(request: AskRequest):
     """
@@ -94,10 +256,37 @@ async def ask(request: AskRequest):
     
     
     try:
-        return run_pipeline(request.question, request.user_id)
+        return await arun_pipeline(request.question, request.user_id, deadline=_request_deadline(request))
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ask/stream")
+async def ask_stream(request: AskRequest):
+    """
+    Ask a question and get the answer as Server-Sent Events: "token" events with
+    redacted answer text as it is generated, then "done" (or "error")
+    """
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    request_id = str(uuid.uuid4())
+    logging.info(f"Request ID: {request_id}")
+    deadline = _request_deadline(request)
+
+    async def events():
+        try:
+            async for text in astream_pipeline(request.question, request.user_id, deadline):
+                yield _sse("token", {"text": text})
+            yield _sse("done", {"user_id": request.user_id})
+        except Exception as e:
+            logging.error(f"Streaming request {request_id} failed: {e}")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/")
 async def root():
     """
@@ -110,7 +299,18 @@ async def health():
     """
     Health check endpoint
     """
-    return {"status": "ok"}
+    # the ping is a blocking Redis round trip, kept off the event loop
+    return {"status": "ok", "vector_store": "ok" if await asyncio.to_thread(vector_store_ping) else "unavailable"}
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness endpoint, ready once the cache warm-up has finished
+    """
+    warmup = warmup_status.as_dict()
+    if not warmup["finished"]:
+        return JSONResponse(status_code=503, content={"status": "warming", "warmup": warmup})
+    return {"status": "ready", "warmup": warmup}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
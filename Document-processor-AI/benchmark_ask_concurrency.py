@@ -0,0 +1,61 @@
+"""
+Throughput and latency of a running /ask server under a concurrency sweep.
+
+Each level keeps `concurrency` requests in flight until `--requests` have
+completed. Questions get a unique suffix, so every request misses the answer
+cache and reaches the LLM; pass --repeat to measure cache hits instead. Run it
+against a single worker to see how many LLM calls that worker sustains:
+
+    uvicorn app:app --port 8001 --workers 1
+    python benchmark_ask_concurrency.py --url http://localhost:8001 --concurrency 1 8 32 128
+"""
+
+import argparse
+import asyncio
+import time
+import httpx
+import numpy as np
+
+QUESTION = "What is an agentic AI system?"
+
+
+async def _level(client: httpx.AsyncClient, url: str, concurrency: int, requests: int, repeat: bool) -> None:
+    latencies, errors = [], 0
+    queue = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in queue:
+            question = QUESTION if repeat else f"{QUESTION} (request {time.time_ns()}-{i})"
+            t0 = time.perf_counter()
+            try:
+                response = await client.post(f"{url}/ask", json={"question": question})
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - t0) * 1000)
+            except httpx.HTTPError:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    p50, p99 = np.percentile(latencies, [50, 99]) if latencies else (float("nan"), float("nan"))
+    print(f"{concurrency:>11} {len(latencies) / elapsed:>8.2f} {p50:>9.0f} {p99:>9.0f} {errors:>6}")
+
+
+async def run(url: str, levels: list[int], requests: int, repeat: bool, timeout: float) -> None:
+    print(f"{'concurrency':>11} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'errors':>6}")
+    limits = httpx.Limits(max_connections=max(levels))
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        for concurrency in levels:
+            await _level(client, url, concurrency, max(requests, concurrency), repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /ask under increasing concurrency")
+    parser.add_argument("--url", type=str, default="http://localhost:8001", help="Base URL of the API")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128], help="In-flight requests")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per level")
+    parser.add_argument("--repeat", action="store_true", help="Ask the same question, measuring cache hits")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.concurrency, args.requests, args.repeat, args.timeout))
@@ -0,0 +1,94 @@
+"""
+Embedding requests saved and latency added by micro-batching question embeddings.
+
+Simulates requests arriving at a steady rate (Poisson) against a fake embeddings
+API whose latency grows with the batch size, and compares one request per
+question with EmbeddingBatcher at several max-wait settings:
+
+- API requests per second, the number that counts against the rate limit
+- mean texts per request
+- p50/p99 time a question waited for its batch to be sent
+- p50/p99 end-to-end embedding latency
+
+Take the API latency from the provider's dashboards before choosing a setting:
+
+    python benchmark_embedding_batcher.py --rates 50 200 1000 --max-wait-ms 1 2 5 10
+"""
+
+import argparse
+import asyncio
+import time
+import numpy as np
+import embedding_batcher
+from embedding_batcher import EmbeddingBatcher
+from config import EMBEDDING_BATCH_MAX_SIZE
+
+
+class FakeEmbeddingsAPI:
+    def __init__(self, base_ms: float, per_text_ms: float):
+        self.base_ms, self.per_text_ms = base_ms, per_text_ms
+        self.requests = 0
+        self.texts = 0
+
+    async def __call__(self, texts):
+        self.requests += 1
+        self.texts += len(texts)
+        await asyncio.sleep((self.base_ms + self.per_text_ms * len(texts)) / 1000)
+        return np.zeros((len(texts), 8), dtype=np.float32)
+
+
+async def _simulate(rate: float, seconds: float, api: FakeEmbeddingsAPI, batcher, seed: int) -> tuple[list[float], float]:
+    rng = np.random.default_rng(seed)
+    latencies = []
+
+    async def request(i):
+        t0 = time.perf_counter()
+        if batcher is None:
+            await api([f"question {i}"])
+        else:
+            await batcher.embed(f"question {i}")
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    tasks, start = [], time.perf_counter()
+    for i, gap in enumerate(rng.exponential(1 / rate, int(rate * seconds))):
+        await asyncio.sleep(gap)
+        tasks.append(asyncio.create_task(request(i)))
+    await asyncio.gather(*tasks)
+    return latencies, time.perf_counter() - start
+
+
+def _delays(batcher_delays: list[float]) -> str:
+    if not batcher_delays:
+        return f"{0:>8.2f} {0:>8.2f}"
+    p50, p99 = np.percentile(batcher_delays, [50, 99])
+    return f"{p50:>8.2f} {p99:>8.2f}"
+
+
+def run(rates: list[float], waits_ms: list[float], seconds: float, max_size: int, base_ms: float,
+        per_text_ms: float, seed: int = 0) -> None:
+    print(f"{'rate/s':>7} {'max wait':>8} {'api req/s':>9} {'texts/req':>9} {'queue p50':>9} {'p99':>8} "
+          f"{'total p50':>9} {'p99':>8}")
+    for rate in rates:
+        for wait_ms in [None] + waits_ms:
+            api = FakeEmbeddingsAPI(base_ms, per_text_ms)
+            delays = []
+            # the batcher reports each text's queueing delay through observability, captured here
+            embedding_batcher.record_embedding_batch = lambda size, ms: delays.extend(ms)
+            batcher = None if wait_ms is None else EmbeddingBatcher(api, max_size, wait_ms / 1000)
+            latencies, elapsed = asyncio.run(_simulate(rate, seconds, api, batcher, seed))
+            p50, p99 = np.percentile(latencies, [50, 99])
+            label = "off" if wait_ms is None else f"{wait_ms:g} ms"
+            print(f"{rate:>7.0f} {label:>8} {api.requests / elapsed:>9.1f} {api.texts / api.requests:>9.1f} "
+                  f"{_delays(delays)} {p50:>9.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark micro-batched embedding calls")
+    parser.add_argument("--rates", type=float, nargs="+", default=[50, 200, 1000], help="Questions per second")
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[1, 2, 5, 10], help="Batcher max-wait settings")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Simulated seconds per setting")
+    parser.add_argument("--max-size", type=int, default=EMBEDDING_BATCH_MAX_SIZE, help="Texts per batch")
+    parser.add_argument("--api-base-ms", type=float, default=60.0, help="Fake API latency per request")
+    parser.add_argument("--api-per-text-ms", type=float, default=0.2, help="Fake API latency per text")
+    args = parser.parse_args()
+    run(args.rates, args.max_wait_ms, args.seconds, args.max_size, args.api_base_ms, args.api_per_text_ms)
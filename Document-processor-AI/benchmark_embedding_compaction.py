@@ -0,0 +1,136 @@
+"""
+Memory, lookup latency and hit/recall deltas of compacted embeddings.
+
+Each setting combines a dimension count (Matryoshka truncation), a quantization
+scheme and the number of candidates rescored with float vectors. It is run
+against both consumers and compared with full-size float32 vectors:
+
+- semantic cache (SemanticIndex): bytes per entry, lookup latency, hit rate at
+  the cache threshold and the share of hit/miss decisions that changed
+- document index (LocalVectorStore, exact scan): bytes scanned per row, lookup
+  latency and recall@k of the float32 top k
+
+Synthetic vectors are clustered, and their per-dimension variance decays the way
+it does in a Matryoshka-trained model, so truncation keeps most of the signal.
+Decide on real embeddings, saved as an (n, 1536) .npy array:
+
+    python benchmark_embedding_compaction.py --dims 1536 512 256
+    python benchmark_embedding_compaction.py --embeddings corpus_embeddings.npy
+"""
+
+import argparse
+import tempfile
+import time
+import numpy as np
+from semantic_index import SemanticIndex
+from local_vector_store import LocalVectorStore
+from quantization import truncate, code_layout
+from config import CACHE_SIMILARITY_THRESHOLD, CACHE_RESCORE_CANDIDATES, LOCAL_INDEX_RESCORE_CANDIDATES
+
+FULL_DIMENSIONS = 1536
+TOPICS = 200
+
+
+def synthetic_embeddings(rng, count: int) -> np.ndarray:
+    centers = rng.standard_normal((TOPICS, FULL_DIMENSIONS)).astype(np.float32)
+    vectors = centers[rng.integers(0, TOPICS, count)] + 0.8 * rng.standard_normal((count, FULL_DIMENSIONS), dtype=np.float32)
+    vectors *= (1 + np.arange(FULL_DIMENSIONS, dtype=np.float32) / 32) ** -0.5
+    return truncate(vectors, FULL_DIMENSIONS)
+
+
+def perturb(rng, vectors: np.ndarray, low: float, high: float) -> np.ndarray:
+    """Vectors moved in a random direction by a norm drawn from [low, high)."""
+    noise = rng.standard_normal(vectors.shape, dtype=np.float32)
+    noise *= (rng.uniform(low, high, len(vectors)) / np.linalg.norm(noise, axis=1))[:, None]
+    return truncate(vectors + noise, vectors.shape[1])
+
+
+def settings(dims: list[int]) -> list[tuple[int, str, int]]:
+    out = []
+    for dim in dims:
+        out += [(dim, "float32", 0), (dim, "int8", 0), (dim, "int8", CACHE_RESCORE_CANDIDATES),
+                (dim, "binary", CACHE_RESCORE_CANDIDATES), (dim, "binary", LOCAL_INDEX_RESCORE_CANDIDATES)]
+    return out
+
+
+def _latency(samples: list[float]) -> str:
+    p50, p99 = np.percentile(samples, [50, 99])
+    return f"{p50:7.3f} {p99:7.3f}"
+
+
+def bench_cache(rng, base: np.ndarray, entries: int, lookups: int, dims: list[int], threshold: float) -> None:
+    cached = base[:entries]
+    # half near-duplicates of cached questions around the threshold, half unseen questions
+    targets = rng.choice(entries, lookups // 2, replace=False)
+    queries = np.concatenate([perturb(rng, cached[targets], 0.15, 0.5),
+                              perturb(rng, base[entries:entries + lookups - len(targets)], 0.15, 0.5)])
+    keys = [f"{i:08d}" for i in range(entries)]
+    baseline = None
+    print(f"\nsemantic cache: {entries} entries, {len(queries)} lookups, threshold {threshold}")
+    print(f"{'dims':>5} {'codes':>7} {'rescore':>7} {'bytes/entry':>11} {'p50 ms':>7} {'p99 ms':>7} {'hit rate':>8} {'changed':>8}")
+    for dim, scheme, rescore in settings(dims):
+        index = SemanticIndex(initial_capacity=entries, quantization=scheme, rescore_candidates=rescore)
+        for key, vec in zip(keys, truncate(cached, dim)):
+            index.add(key, vec, "")
+        decisions, samples = [], []
+        for query in truncate(queries, dim):
+            t0 = time.perf_counter()
+            key, _, score = index.search(query)
+            samples.append((time.perf_counter() - t0) * 1000)
+            decisions.append(key if score >= threshold else None)
+        if baseline is None:
+            baseline = decisions
+        changed = np.mean([a != b for a, b in zip(decisions, baseline)])
+        hit_rate = np.mean([d is not None for d in decisions])
+        per_entry = index.nbytes / len(index) - len(keys[0])
+        print(f"{dim:>5} {scheme:>7} {rescore:>7} {per_entry:>11.0f} {_latency(samples)} {hit_rate:>8.1%} {changed:>8.1%}")
+
+
+def bench_documents(rng, base: np.ndarray, lookups: int, k: int, dims: list[int]) -> None:
+    queries = perturb(rng, base[rng.choice(len(base), lookups, replace=False)], 0.6, 1.0)
+    truth = [set(np.argsort(-(base @ query))[:k]) for query in queries]
+    print(f"\ndocument index: {len(base)} rows, {lookups} lookups, recall@{k} of the float32 {FULL_DIMENSIONS}-dim top {k}")
+    print(f"{'dims':>5} {'codes':>7} {'rescore':>7} {'bytes/row':>9} {'p50 ms':>7} {'p99 ms':>7} {'recall':>8}")
+    for dim, scheme, rescore in settings(dims):
+        if scheme == "int8" and rescore == 0:
+            continue  # the local backend always rescores its candidates
+        columns, dtype = code_layout(dim, scheme)
+        scanned = columns * np.dtype(dtype).itemsize + (4 if scheme != "float32" else 0)
+        with tempfile.TemporaryDirectory() as path:
+            store = LocalVectorStore(path, quantization=scheme, rescore_candidates=rescore)
+            vectors = truncate(base, dim)
+            for start in range(0, len(base), 10000):
+                ids = [str(i) for i in range(start, min(start + 10000, len(base)))]
+                store.add(ids, [""] * len(ids), vectors[start:start + len(ids)])
+            hits, samples = 0, []
+            for query, expected in zip(truncate(queries, dim), truth):
+                t0 = time.perf_counter()
+                found = store.search(query, k)
+                samples.append((time.perf_counter() - t0) * 1000)
+                hits += len({int(record["id"]) for record, _ in found} & expected)
+        print(f"{dim:>5} {scheme:>7} {rescore:>7} {scanned:>9} {_latency(samples)} {hits / (k * lookups):>8.1%}")
+
+
+def run(embeddings_path, cache_entries: int, documents: int, lookups: int, k: int, dims: list[int],
+        threshold: float, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    if embeddings_path:
+        base = truncate(np.load(embeddings_path), FULL_DIMENSIONS)
+        rng.shuffle(base)
+    else:
+        base = synthetic_embeddings(rng, max(cache_entries + lookups, documents))
+    bench_cache(rng, base, min(cache_entries, len(base) - lookups), lookups, dims, threshold)
+    bench_documents(rng, base[:documents], lookups, k, dims)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark reduced-dimension and quantized embeddings")
+    parser.add_argument("--embeddings", type=str, default=None, help=".npy array of real embeddings (n, 1536)")
+    parser.add_argument("--cache-entries", type=int, default=20_000, help="Entries in the semantic cache")
+    parser.add_argument("--documents", type=int, default=20_000, help="Rows in the document index")
+    parser.add_argument("--lookups", type=int, default=400, help="Lookups per setting")
+    parser.add_argument("--k", type=int, default=5, help="Cut-off for document recall@k")
+    parser.add_argument("--dims", type=int, nargs="+", default=[1536, 768, 512, 256], help="Dimensions to compare")
+    parser.add_argument("--threshold", type=float, default=CACHE_SIMILARITY_THRESHOLD, help="Cache hit threshold")
+    args = parser.parse_args()
+    run(args.embeddings, args.cache_entries, args.documents, args.lookups, args.k, args.dims, args.threshold)
@@ -0,0 +1,73 @@
+"""
+Cost of moving embeddings as JSON float lists versus base64 float32 bytes.
+
+Measures the two places vectors cross a text boundary:
+
+- embeddings API response: parsing a batch of vectors into a float32 matrix,
+  from `encoding_format="float"` lists or `"base64"` strings
+- semantic cache entry: serializing a vector into its JSON entry and reading
+  it back, as cache_store.set and the index warm-up do
+
+Both are reported with the payload size, for the configured dimensions by default:
+
+    python benchmark_embedding_transport.py --dims 1536 256 --batch 64
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from vector_codec import encode, decode
+from config import EMBEDDING_DIMENSIONS
+
+
+def _timed(fn, repeats: int) -> float:
+    """Median milliseconds of one call."""
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(samples))
+
+
+def bench_response(rng, dim: int, batch: int, repeats: int) -> None:
+    vectors = rng.standard_normal((batch, dim), dtype=np.float32)
+    as_floats = json.dumps({"data": [{"index": i, "embedding": vec.tolist()} for i, vec in enumerate(vectors)]})
+    as_base64 = json.dumps({"data": [{"index": i, "embedding": encode(vec)} for i, vec in enumerate(vectors)]})
+    floats_ms = _timed(lambda: np.asarray([item["embedding"] for item in json.loads(as_floats)["data"]],
+                                          dtype=np.float32), repeats)
+    base64_ms = _timed(lambda: np.stack([decode(item["embedding"]) for item in json.loads(as_base64)["data"]]),
+                       repeats)
+    print(f"{'response':<9} {dim:>5} {batch:>5} {len(as_floats):>11} {floats_ms:>9.3f} "
+          f"{len(as_base64):>11} {base64_ms:>9.3f}")
+
+
+def bench_cache_entry(rng, dim: int, repeats: int) -> None:
+    vector = rng.standard_normal(dim, dtype=np.float32)
+    entry = {"question": "q", "answer": "a", "version": "v"}
+    as_floats = json.dumps({**entry, "embedding": vector.tolist()})
+    as_base64 = json.dumps({**entry, "embedding": encode(vector)})
+    floats_ms = _timed(lambda: np.asarray(json.loads(json.dumps({**entry, "embedding": vector.tolist()}))["embedding"],
+                                          dtype=np.float32), repeats)
+    base64_ms = _timed(lambda: decode(json.loads(json.dumps({**entry, "embedding": encode(vector)}))["embedding"]),
+                       repeats)
+    print(f"{'cache':<9} {dim:>5} {1:>5} {len(as_floats):>11} {floats_ms:>9.3f} "
+          f"{len(as_base64):>11} {base64_ms:>9.3f}")
+
+
+def run(dims: list[int], batch: int, repeats: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    print(f"{'payload':<9} {'dims':>5} {'batch':>5} {'float bytes':>11} {'float ms':>9} {'b64 bytes':>11} {'b64 ms':>9}")
+    for dim in dims:
+        bench_response(rng, dim, batch, repeats)
+        bench_cache_entry(rng, dim, repeats)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JSON float lists against base64 float32 embeddings")
+    parser.add_argument("--dims", type=int, nargs="+", default=[EMBEDDING_DIMENSIONS], help="Vector dimensions")
+    parser.add_argument("--batch", type=int, default=64, help="Vectors per embeddings response")
+    parser.add_argument("--repeats", type=int, default=50, help="Timed runs per measurement")
+    args = parser.parse_args()
+    run(args.dims, args.batch, args.repeats)
@@ -0,0 +1,121 @@
+"""
+Recall@k and latency of hybrid (BM25 + vector, RRF) retrieval against vector-only retrieval.
+
+Builds a synthetic corpus where every chunk belongs to a topic and carries a
+rare identifier (an acronym, product code or number). Its dense embedding
+encodes the topic plus a chunk-specific direction that its words do not
+reveal. Two kinds of labelled queries are run:
+
+- paraphrase: a near-duplicate of the chunk's embedding with a few of its
+  common words, which is what dense retrieval is good at
+- exact-term: the chunk's identifier plus topic words, with an embedding that
+  only knows the topic, which is what dense retrieval misses
+
+Real corpora sit somewhere in between, so compare the settings on a labelled
+sample of production questions before changing defaults.
+
+    python benchmark_hybrid_retrieval.py --chunks 100000 --k 2 5
+"""
+
+import argparse
+import tempfile
+import time
+import numpy as np
+from bm25_index import BM25Index
+from retrieval import reciprocal_rank_fusion
+from config import HYBRID_CANDIDATES, RRF_K
+
+DIM = 128
+TOPICS = 200
+TOPIC_WORDS = 60
+GENERIC_WORDS = 3000
+
+
+def build_corpus(rng, chunks: int):
+    topics = rng.integers(0, TOPICS, chunks)
+    centers = rng.standard_normal((TOPICS, DIM)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    own = rng.standard_normal((chunks, DIM)).astype(np.float32)
+    own /= np.linalg.norm(own, axis=1, keepdims=True)
+    vectors = centers[topics] + 0.8 * own
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    texts = []
+    for i, topic in enumerate(topics):
+        words = [f"t{topic}w{w}" for w in rng.integers(0, TOPIC_WORDS, 8)]
+        words += [f"g{w}" for w in rng.zipf(1.3, 14) % GENERIC_WORDS]
+        words.append(f"id{i:07d}")
+        rng.shuffle(words)
+        texts.append(" ".join(words))
+    return topics, centers, vectors, texts
+
+
+def build_queries(rng, topics, centers, vectors, texts, count: int):
+    queries = []  # (kind, target, text, vector)
+    for target in rng.choice(len(texts), count, replace=False):
+        words = [w for w in texts[target].split() if not w.startswith("id")]
+        if len(queries) % 2 == 0:
+            noise = rng.standard_normal(DIM).astype(np.float32)
+            vec = vectors[target] + 0.25 * noise / np.linalg.norm(noise)
+            text = " ".join(rng.choice(words, 3, replace=False))
+            queries.append(("paraphrase", target, text, vec / np.linalg.norm(vec)))
+        else:
+            noise = rng.standard_normal(DIM).astype(np.float32)
+            vec = centers[topics[target]] + 0.5 * noise / np.linalg.norm(noise)
+            text = f"id{target:07d} " + " ".join([w for w in words if w.startswith("t")][:2])
+            queries.append(("exact-term", target, text, vec / np.linalg.norm(vec)))
+    return queries
+
+
+def run(chunks: int, queries: int, ks: list[int], seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    topics, centers, vectors, texts = build_corpus(rng, chunks)
+    query_set = build_queries(rng, topics, centers, vectors, texts, queries)
+    ids = [str(i) for i in range(chunks)]
+
+    with tempfile.TemporaryDirectory() as path:
+        index = BM25Index(path)
+        t0 = time.perf_counter()
+        index.build((chunk_id, text, {}) for chunk_id, text in zip(ids, texts))
+        print(f"built BM25 index over {chunks} chunks in {time.perf_counter() - t0:.1f}s")
+
+        candidates = max(max(ks), HYBRID_CANDIDATES)
+        dense_ms, lexical_ms, fusion_ms = [], [], []
+        hits = {}  # (kind, method, k) -> hits
+        for kind, target, text, vec in query_set:
+            t0 = time.perf_counter()
+            scores = vectors @ vec
+            top = np.argpartition(-scores, candidates)[:candidates]
+            dense = [(ids[i], texts[i], {}) for i in top[np.argsort(-scores[top])]]
+            dense_ms.append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            lexical = [chunk[:3] for chunk in index.search(text, candidates)]
+            lexical_ms.append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            fused = reciprocal_rank_fusion([dense, lexical], candidates, RRF_K)
+            fusion_ms.append((time.perf_counter() - t0) * 1000)
+
+            for k in ks:
+                for method, ranking in (("vector", dense), ("bm25", lexical), ("hybrid", fused)):
+                    found = str(target) in [chunk[0] for chunk in ranking[:k]]
+                    hits[kind, method, k] = hits.get((kind, method, k), 0) + found
+
+    per_kind = {kind: sum(1 for q in query_set if q[0] == kind) for kind in ("paraphrase", "exact-term")}
+    print(f"{'queries':>11} {'k':>3} {'vector':>8} {'bm25':>8} {'hybrid':>8}")
+    for kind, total in per_kind.items():
+        for k in ks:
+            row = [hits.get((kind, method, k), 0) / total for method in ("vector", "bm25", "hybrid")]
+            print(f"{kind:>11} {k:>3} " + " ".join(f"{r:>8.1%}" for r in row))
+    for name, samples in (("vector (brute force)", dense_ms), ("bm25", lexical_ms), ("rrf fusion", fusion_ms)):
+        print(f"{name:>21}: p50 {np.percentile(samples, 50):.3f}ms  p99 {np.percentile(samples, 99):.3f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark hybrid BM25 + vector retrieval against vector-only")
+    parser.add_argument("--chunks", type=int, default=100_000, help="Chunks in the synthetic corpus")
+    parser.add_argument("--queries", type=int, default=400, help="Labelled queries to run")
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 5], help="Cut-offs for recall@k")
+    args = parser.parse_args()
+    run(args.chunks, args.queries, args.k)
@@ -0,0 +1,90 @@
+"""
+Recall-vs-probes benchmark for the LSH-partitioned semantic cache.
+
+Builds a synthetic cache of random embeddings, then queries it with
+near-duplicates (cosine similarity drawn around the cache threshold) and
+with unrelated questions. For each (bits, probes) setting it reports the
+LSH hit rate relative to the brute-force scan, how often both return the
+same entry, and the entries read per lookup (absolute and as a fraction of
+the cache). Like LSHCache, a lookup stops after --max-candidates entries.
+
+Random vectors spread evenly over the buckets; real embeddings cluster, so
+confirm the chosen setting against a sample of production questions.
+
+    python benchmark_lsh_cache.py --entries 50000 --bits 10 12 14 --probes 32 64 128 256
+"""
+
+import argparse
+import time
+from collections import defaultdict
+import numpy as np
+from lsh_cache import LSHPartitioner
+from config import CACHE_SIMILARITY_THRESHOLD, CACHE_LSH_SEED, CACHE_LSH_MAX_CANDIDATES
+
+EMBEDDING_DIM = 1536
+
+
+def _near_duplicates(rng, base: np.ndarray, similarities: np.ndarray) -> np.ndarray:
+    """Vectors with the given cosine similarity to the (unit) base vectors."""
+    noise = rng.standard_normal(base.shape, dtype=np.float32)
+    noise -= (noise * base).sum(axis=1, keepdims=True) * base
+    noise /= np.linalg.norm(noise, axis=1, keepdims=True)
+    return similarities[:, None] * base + np.sqrt(1 - similarities[:, None] ** 2) * noise
+
+
+def run(entries: int, queries: int, bits_options: list[int], probe_options: list[int],
+        threshold: float, max_candidates: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    cache = rng.standard_normal((entries, EMBEDDING_DIM), dtype=np.float32)
+    cache /= np.linalg.norm(cache, axis=1, keepdims=True)
+
+    # half the queries paraphrase a cached question, half are unrelated
+    targets = rng.integers(0, entries, queries // 2)
+    similarities = rng.uniform(threshold - 0.03, 1.0, len(targets)).astype(np.float32)
+    related = _near_duplicates(rng, cache[targets], similarities)
+    unrelated = rng.standard_normal((queries - len(targets), EMBEDDING_DIM), dtype=np.float32)
+    query_set = np.vstack([related, unrelated])
+    query_set /= np.linalg.norm(query_set, axis=1, keepdims=True)
+
+    t0 = time.perf_counter()
+    brute_scores = query_set @ cache.T
+    brute_best = brute_scores.argmax(axis=1)
+    brute_hit = brute_scores.max(axis=1) >= threshold
+    brute_ms = (time.perf_counter() - t0) * 1000 / len(query_set)
+    print(f"brute force: {int(brute_hit.sum())} hits / {len(query_set)} queries, {brute_ms:.3f}ms per lookup")
+    print(f"{'bits':>4} {'probes':>6} {'hit rate':>9} {'same entry':>11} {'candidates':>10} {'scanned':>9} {'lookup':>10}")
+
+    for bits in bits_options:
+        partitioner = LSHPartitioner(bits, CACHE_LSH_SEED)
+        buckets = defaultdict(list)
+        for row, vec in enumerate(cache):
+            buckets[partitioner.bucket(vec)].append(row)
+        for probes in probe_options:
+            hits, same_entry, scanned = 0, 0, 0
+            t0 = time.perf_counter()
+            for i, query in enumerate(query_set):
+                rows = [row for bucket in partitioner.probe_buckets(query, probes)
+                        for row in buckets.get(bucket, ())][:max_candidates]
+                scanned += len(rows)
+                if not rows:
+                    continue
+                scores = cache[rows] @ query
+                if scores.max() >= threshold:
+                    hits += 1
+                    same_entry += rows[int(np.argmax(scores))] == brute_best[i]
+            lookup_ms = (time.perf_counter() - t0) * 1000 / len(query_set)
+            brute_hits = max(1, int(brute_hit.sum()))
+            print(f"{bits:>4} {probes:>6} {hits / brute_hits:>9.2%} {same_entry / brute_hits:>11.2%} "
+                  f"{scanned / len(query_set):>10.0f} {scanned / len(query_set) / entries:>9.2%} {lookup_ms:>8.3f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark LSH cache recall against a brute-force scan")
+    parser.add_argument("--entries", type=int, default=20_000, help="Cached entries")
+    parser.add_argument("--queries", type=int, default=400, help="Lookups to run")
+    parser.add_argument("--bits", type=int, nargs="+", default=[6, 8, 10], help="Signature sizes to test")
+    parser.add_argument("--probes", type=int, nargs="+", default=[0, 4, 16, 64, 256], help="Neighbor bucket counts to test")
+    parser.add_argument("--threshold", type=float, default=CACHE_SIMILARITY_THRESHOLD, help="Cache hit threshold")
+    parser.add_argument("--max-candidates", type=int, default=CACHE_LSH_MAX_CANDIDATES, help="Entries read per lookup at most")
+    args = parser.parse_args()
+    run(args.entries, args.queries, args.bits, args.probes, args.threshold, args.max_candidates)
@@ -0,0 +1,74 @@
+"""
+Benchmark semantic cache lookup latency at different cache sizes.
+
+Compares the in-process SemanticIndex (one matrix-vector product) against the
+old per-entry scan (json.loads + cosine similarity on every cached item).
+The per-entry numbers exclude the Redis round trips the old scan also paid,
+so they are a lower bound for the old code path.
+
+    python benchmark_semantic_cache.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from semantic_index import SemanticIndex
+
+EMBEDDING_DIM = 1536
+
+
+def _percentiles(samples_ms: list[float]) -> str:
+    p50, p99 = np.percentile(samples_ms, [50, 99])
+    return f"p50={p50:8.3f}ms  p99={p99:8.3f}ms"
+
+
+def _legacy_scan(query: list[float], payloads: list[str]) -> float:
+    best = -1.0
+    query_np = np.array(query)
+    for payload in payloads:
+        cached = np.array(json.loads(payload)["embedding"])
+        similarity = np.dot(query_np, cached) / (np.linalg.norm(query_np) * np.linalg.norm(cached))
+        best = max(best, similarity)
+    return best
+
+
+def run(sizes: list[int], lookups: int, legacy_max: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    print(f"{'entries':>8}  {'engine':<14} latency")
+    for size in sizes:
+        vectors = rng.standard_normal((size, EMBEDDING_DIM), dtype=np.float32)
+        queries = rng.standard_normal((lookups, EMBEDDING_DIM), dtype=np.float32)
+
+        index = SemanticIndex()
+        t0 = time.perf_counter()
+        for i, vec in enumerate(vectors):
+            index.add(f"k{i}", vec, "answer")
+        build_s = time.perf_counter() - t0
+
+        samples = []
+        for query in queries:
+            t0 = time.perf_counter()
+            index.search(query)
+            samples.append((time.perf_counter() - t0) * 1000)
+        print(f"{size:>8}  {'index':<14} {_percentiles(samples)}  (build {build_s:.2f}s)")
+
+        if size > legacy_max:
+            print(f"{size:>8}  {'per-entry scan':<14} skipped (--legacy-max {legacy_max})")
+            continue
+        payloads = [json.dumps({"embedding": vec.tolist(), "answer": "answer"}) for vec in vectors]
+        samples = []
+        for query in queries[: max(1, lookups // 10)]:
+            t0 = time.perf_counter()
+            _legacy_scan(query.tolist(), payloads)
+            samples.append((time.perf_counter() - t0) * 1000)
+        print(f"{size:>8}  {'per-entry scan':<14} {_percentiles(samples)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark semantic cache lookup latency")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="Cache sizes to test")
+    parser.add_argument("--lookups", type=int, default=200, help="Lookups per size")
+    parser.add_argument("--legacy-max", type=int, default=10_000, help="Largest size to run the per-entry scan on")
+    args = parser.parse_args()
+    run(args.sizes, args.lookups, args.legacy_max)
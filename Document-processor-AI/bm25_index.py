@@ -0,0 +1,375 @@
+# lexical retrieval: BM25 over an inverted index built at ingest time
+import os
+import re
+import json
+import mmap
+import logging
+import threading
+from collections import Counter
+from typing import Iterable, Optional
+import numpy as np
+
+DOCS_FILE = "docs.jsonl"  # log of chunks added and deleted since the last commit
+COMMITTING_FILE = "docs.committing.jsonl"  # the log being applied by a commit, kept until the commit is done
+META_FILE = "meta.json"  # generation, segments and their deletions; replaced last, readers reload when it changes
+# a commit writes the added chunks as a new segment; segment files are never rewritten, so readers can map them
+TERMS_FILE = "terms.{segment}.json"  # term -> row in the postings arrays
+CHUNKS_FILE = "chunks.{segment}.jsonl"  # [chunk id, text, metadata] per document number
+CHUNK_OFFSETS_FILE = "chunk_offsets.{segment}.npy"  # byte offset of each line in the chunks file, plus the end
+IDS_FILE = "ids.{segment}.npy"  # chunk id per document number, to find the documents a deletion hits
+LENGTHS_FILE = "lengths.{segment}.npy"  # tokens per document (float32)
+INDPTR_FILE = "indptr.{segment}.npy"  # postings of term t are [indptr[t], indptr[t + 1])
+POSTINGS_FILE = "postings.{segment}.npy"  # document numbers (int32), highest-scoring first within a term
+TFS_FILE = "tfs.{segment}.npy"  # term frequency of each posting (float32)
+SEGMENT_FILES = (TERMS_FILE, CHUNKS_FILE, CHUNK_OFFSETS_FILE, IDS_FILE, LENGTHS_FILE, INDPTR_FILE, POSTINGS_FILE,
+                 TFS_FILE)
+OPEN_RETRIES = 3  # re-reads of the meta file when a commit retires a segment while it is being opened
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("a an and are as at be by for from has have in is it its of on or that the this to was "
+                      "were what when where which who why how with do does can you your i".split())
+
+def tokenize(text: str) -> list[str]:
+    """Case-folded alphanumeric runs, so acronyms, product names and numbers stay searchable."""
+    return [token for token in _TOKEN.findall(text.casefold()) if token not in STOPWORDS]
+
+
+class _Segment:
+    """The mapped files of one segment. Immutable once written; deletions live in the meta file."""
+
+    def __init__(self, index: "BM25Index", name: str):
+        self.name = name
+        with open(index._file(TERMS_FILE, name), encoding="utf-8") as f:
+            self.terms: dict[str, int] = json.load(f)
+        self.chunk_offsets = np.load(index._file(CHUNK_OFFSETS_FILE, name), mmap_mode="r")
+        self.lengths = np.load(index._file(LENGTHS_FILE, name), mmap_mode="r")
+        self.indptr = np.load(index._file(INDPTR_FILE, name), mmap_mode="r")
+        self.postings = np.load(index._file(POSTINGS_FILE, name), mmap_mode="r")
+        self.tfs = np.load(index._file(TFS_FILE, name), mmap_mode="r")
+        self.chunks = None
+        if len(self.lengths):
+            with open(index._file(CHUNKS_FILE, name), "rb") as f:
+                self.chunks = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def df(self, term: str) -> int:
+        row = self.terms.get(term)
+        return 0 if row is None else int(self.indptr[row + 1] - self.indptr[row])
+
+    def chunk(self, doc: int) -> list:
+        return json.loads(self.chunks[int(self.chunk_offsets[doc]):int(self.chunk_offsets[doc + 1])])
+
+
+class _Generation:
+    """The segments of one committed generation, replaced as a whole so a search never sees a mix."""
+
+    def __init__(self, generation: int = 0, segments: Optional[list[tuple[_Segment, np.ndarray]]] = None,
+                 count: int = 0, docs: int = 0, avg_length: float = 0.0):
+        self.generation = generation
+        self.segments = segments or []  # (segment, deleted mask)
+        self.count = count  # live documents
+        self.docs = docs  # documents including deleted ones, the N of the idf like Lucene's maxDoc
+        self.avg_length = avg_length
+
+
+class BM25Index:
+    """
+    Inverted index in CSR layout, split into immutable segments.
+
+    A query only gathers the postings of its own terms in each segment and sums
+    them with one bincount, so its cost follows the postings touched, not the
+    corpus size. Postings are impact-ordered and a query reads at most
+    `max_postings` per term and segment: very common terms only contribute
+    their highest-scoring documents, which bounds latency at a small cost in
+    exactness for those terms.
+
+    Ingestion logs changes with `record`; `commit` writes the added chunks as a
+    new segment and marks deleted ones in the meta file, so its cost follows the
+    change, not the corpus. Segments with more than `max_deleted_ratio` deleted
+    documents are compacted, and beyond `max_segments` the smallest are merged.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75, max_postings: int = 4096,
+                 max_segments: int = 8, max_deleted_ratio: float = 0.2):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_postings = max_postings
+        self.max_segments = max_segments
+        self.max_deleted_ratio = max_deleted_ratio
+        self._lock = threading.Lock()
+        self._stamp: Optional[tuple] = None
+        self._meta: dict = {}
+        self._segments: dict[str, _Segment] = {}  # opened segments by name, reused across generations
+        self._mapped = _Generation()
+
+    def _file(self, name: str, segment: str = "") -> str:
+        return os.path.join(self.path, name.format(segment=segment))
+
+    def _refresh(self) -> None:
+        for _ in range(OPEN_RETRIES):
+            try:
+                stat = os.stat(self._file(META_FILE))
+            except FileNotFoundError:
+                return
+            stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if stamp == self._stamp:
+                return
+            try:
+                with self._lock:
+                    self._load(stamp)
+                return
+            except FileNotFoundError:
+                continue  # a newer commit retired a segment of the generation being opened: read its meta
+        logging.warning(f"BM25 index in {self.path} changed while it was opened, serving generation "
+                        f"{self._mapped.generation} until the next query")
+
+    def _load(self, stamp: tuple) -> None:
+        with open(self._file(META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        segments, docs, length = [], 0, 0.0
+        opened = {}
+        for entry in meta.get("segments", []):
+            segment = self._segments.get(entry["name"]) or _Segment(self, entry["name"])
+            opened[entry["name"]] = segment
+            deleted = np.zeros(len(segment), dtype=bool)
+            deleted[entry["deleted"]] = True
+            segments.append((segment, deleted))
+            docs += len(segment)
+            length += entry["length"]
+        count = meta.get("chunks", 0)
+        # one assignment: searches in other threads use either the old or the new generation
+        self._mapped = _Generation(meta.get("generation", 0), segments, count, docs, length / max(count, 1))
+        self._segments, self._meta, self._stamp = opened, meta, stamp
+
+    def __len__(self) -> int:
+        self._refresh()
+        return self._mapped.count
+
+    @property
+    def generation(self) -> int:
+        """Generation of the committed index, bumped by every commit that changed it."""
+        self._refresh()
+        return self._mapped.generation
+
+    def search(self, query: str, k: int) -> list[tuple[str, str, dict, float]]:
+        """
+        Returns:
+            (chunk id, text, metadata, BM25 score) of the k best matching chunks, best first
+        """
+        self._refresh()
+        mapped = self._mapped
+        terms = set(tokenize(query))
+        if not mapped.count or not terms:
+            return []
+        # idf over the whole index; documents deleted since their segment was written still count, as in Lucene
+        idf = {}
+        for term in terms:
+            df = sum(segment.df(term) for segment, _ in mapped.segments)
+            if df:
+                idf[term] = float(np.log(1 + (mapped.docs - df + 0.5) / (df + 0.5)))
+        hits = []  # (score, segment, document number)
+        for segment, deleted in mapped.segments:
+            rows = [(segment.terms[term], weight) for term, weight in idf.items() if term in segment.terms]
+            if not rows:
+                continue
+            slices = [slice(int(segment.indptr[row]),
+                            min(int(segment.indptr[row + 1]), int(segment.indptr[row]) + self.max_postings))
+                      for row, _ in rows]
+            docs = np.concatenate([segment.postings[s] for s in slices])
+            tf = np.concatenate([segment.tfs[s] for s in slices])
+            term_idf = np.repeat(np.array([weight for _, weight in rows], dtype=np.float32),
+                                 [s.stop - s.start for s in slices])
+            norm = self.k1 * (1 - self.b + self.b * segment.lengths[docs] / max(mapped.avg_length, 1e-9))
+            weights = term_idf * tf * (self.k1 + 1) / (tf + norm)
+            live = ~deleted[docs]
+            docs, weights = docs[live], weights[live]
+            if not len(docs):
+                continue
+            if len(docs) * 8 < len(segment):
+                # few postings: accumulate over the touched documents only
+                docs, inverse = np.unique(docs, return_inverse=True)
+                scores = np.bincount(inverse, weights=weights)
+            else:
+                scores = np.bincount(docs, weights=weights)
+                docs = np.arange(len(scores))
+            top = min(k, int(np.count_nonzero(scores)))
+            if not top:
+                continue
+            best = np.argpartition(-scores, top - 1)[:top]
+            hits.extend((float(scores[i]), segment, int(docs[i])) for i in best)
+        hits.sort(key=lambda hit: -hit[0])
+        return [(*segment.chunk(doc), score) for score, segment, doc in hits[:k]]
+
+    # -- ingestion ---------------------------------------------------------
+
+    def record(self, added: Iterable[tuple[str, str, dict]] = (), deleted: Iterable[str] = ()) -> None:
+        """
+        Log added (chunk id, text, metadata) chunks and deleted chunk ids. Appending keeps
+        this cheap per file; `commit` applies the log once per ingestion run.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock, open(self._file(DOCS_FILE), "a", encoding="utf-8") as f:
+            for chunk_id in deleted:
+                f.write(json.dumps({"del": chunk_id}) + "\n")
+            for chunk_id, text, metadata in added:
+                f.write(json.dumps({"add": [chunk_id, text, metadata]}) + "\n")
+
+    def _take_log(self) -> list[dict]:
+        """Entries logged since the last commit. Chunks recorded from now on go to a fresh log."""
+        with self._lock:
+            # a log left by an interrupted commit is applied again first; applying a log twice is harmless
+            if os.path.exists(self._file(DOCS_FILE)):
+                with open(self._file(DOCS_FILE), "rb") as src, open(self._file(COMMITTING_FILE), "ab") as dst:
+                    dst.write(src.read())
+                os.remove(self._file(DOCS_FILE))
+        try:
+            with open(self._file(COMMITTING_FILE), encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def commit(self) -> bool:
+        """
+        Apply the logged changes as a new generation. Cost follows the change: the added
+        chunks are tokenized into one new segment and deletions only touch the meta file,
+        unless they trigger a compaction or merge of the segments they hit.
+
+        Returns:
+            True if a new generation was written
+        """
+        entries = self._take_log()
+        if not entries:
+            return False
+        added: dict[str, list] = {}
+        removed = []
+        for entry in entries:
+            if "add" in entry:
+                chunk_id, text, *metadata = entry["add"]
+                added[chunk_id] = [chunk_id, text, metadata[0] if metadata else {}]
+            else:
+                added.pop(entry["del"], None)
+                removed.append(entry["del"])
+        self._refresh()
+        segments = [dict(entry) for entry in self._meta.get("segments", [])]
+        # re-added chunks replace the copy in their old segment
+        self._delete(segments, list(dict.fromkeys(removed + list(added))))
+        next_segment = self._meta.get("next_segment", 0)
+        if added:
+            segments.append(self._write_segment(f"s{next_segment}", added.values()))
+            next_segment += 1
+        segments, next_segment = self._merge(segments, next_segment)
+        self._publish(segments, next_segment)
+        os.remove(self._file(COMMITTING_FILE))
+        return True
+
+    def build(self, docs: Iterable[tuple[str, str, dict]]) -> None:
+        """Replace the whole index by one segment over `docs`."""
+        os.makedirs(self.path, exist_ok=True)
+        self._refresh()
+        next_segment = self._meta.get("next_segment", 0)
+        segment = self._write_segment(f"s{next_segment}", ([chunk_id, text, metadata] for chunk_id, text, metadata in docs))
+        self._publish([segment], next_segment + 1)
+
+    def _delete(self, segments: list[dict], chunk_ids: list[str]) -> None:
+        if not chunk_ids:
+            return
+        targets = np.array(chunk_ids)
+        for entry in segments:
+            ids = np.load(self._file(IDS_FILE, entry["name"]), mmap_mode="r")
+            hit = np.flatnonzero(np.isin(ids, targets))
+            new = np.setdiff1d(hit, np.asarray(entry["deleted"], dtype=np.int64))
+            if len(new):
+                lengths = np.load(self._file(LENGTHS_FILE, entry["name"]), mmap_mode="r")
+                entry["deleted"] = sorted(entry["deleted"] + new.tolist())
+                entry["length"] -= float(lengths[new].sum())
+
+    def _merge(self, segments: list[dict], next_segment: int) -> tuple[list[dict], int]:
+        """Compact segments with too many deletions and merge the smallest beyond `max_segments`."""
+        segments = [entry for entry in segments if entry["docs"] > len(entry["deleted"])]
+        merge = [entry for entry in segments if len(entry["deleted"]) > self.max_deleted_ratio * entry["docs"]]
+        rest = sorted((entry for entry in segments if entry not in merge), key=lambda e: e["docs"] - len(e["deleted"]))
+        while rest and len(rest) + (1 if merge else 0) > self.max_segments:
+            merge.append(rest.pop(0))
+        if not merge:
+            return segments, next_segment
+        opened = {entry["name"]: _Segment(self, entry["name"]) for entry in merge}
+        chunks = (opened[entry["name"]].chunk(doc) for entry in merge
+                  for doc in np.setdiff1d(np.arange(entry["docs"]), np.asarray(entry["deleted"], dtype=np.int64)))
+        merged = self._write_segment(f"s{next_segment}", chunks)
+        published = {entry["name"] for entry in self._meta.get("segments", [])}
+        for entry in merge:
+            if entry["name"] not in published:
+                self._remove_segment(entry["name"])  # written by this commit, no reader has seen it
+        kept = [entry for entry in segments if entry not in merge]
+        return kept + [merged], next_segment + 1
+
+    def _write_segment(self, name: str, chunks: Iterable[list]) -> dict:
+        chunk_list, counts = [], []
+        for chunk in chunks:
+            chunk_list.append(chunk)
+            counts.append(Counter(tokenize(chunk[1])))
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) else 0.0
+
+        postings: dict[str, list[tuple[int, int]]] = {}
+        for doc, c in enumerate(counts):
+            for term, tf in c.items():
+                postings.setdefault(term, []).append((doc, tf))
+
+        terms, indptr, doc_ids, tfs = {}, [0], [], []
+        for term, plist in postings.items():
+            docs_arr = np.array([doc for doc, _ in plist], dtype=np.int32)
+            tf = np.array([tf for _, tf in plist], dtype=np.float32)
+            # impact order by the segment's own length normalization, the idf is the same for all postings of a term
+            norm = self.k1 * (1 - self.b + self.b * lengths[docs_arr] / max(avg_length, 1e-9))
+            order = np.argsort(-(tf / (tf + norm)), kind="stable")
+            terms[term] = len(terms)
+            doc_ids.append(docs_arr[order])
+            tfs.append(tf[order])
+            indptr.append(indptr[-1] + len(plist))
+
+        os.makedirs(self.path, exist_ok=True)
+        lines = [json.dumps(chunk).encode("utf-8") + b"\n" for chunk in chunk_list]
+        with open(self._file(CHUNKS_FILE, name), "wb") as f:
+            f.writelines(lines)
+        np.save(self._file(CHUNK_OFFSETS_FILE, name),
+                np.concatenate([[0], np.cumsum([len(line) for line in lines])]).astype(np.int64))
+        np.save(self._file(IDS_FILE, name), np.array([chunk[0] for chunk in chunk_list], dtype=str))
+        np.save(self._file(LENGTHS_FILE, name), lengths)
+        np.save(self._file(INDPTR_FILE, name), np.array(indptr, dtype=np.int64))
+        np.save(self._file(POSTINGS_FILE, name), np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int32))
+        np.save(self._file(TFS_FILE, name), np.concatenate(tfs) if tfs else np.zeros(0, dtype=np.float32))
+        self._write_json(TERMS_FILE.format(segment=name), terms)
+        return {"name": name, "docs": len(chunk_list), "deleted": [], "length": float(lengths.sum())}
+
+    def _publish(self, segments: list[dict], next_segment: int) -> None:
+        previous = self._meta
+        names = {entry["name"] for entry in segments}
+        retired = [entry["name"] for entry in previous.get("segments", []) if entry["name"] not in names]
+        self._write_json(META_FILE, {
+            "generation": previous.get("generation", 0) + 1,
+            "segments": segments,
+            "chunks": sum(entry["docs"] - len(entry["deleted"]) for entry in segments),
+            "next_segment": next_segment,
+            "retired": retired,
+        })
+        # segments retired by the previous commit go now: readers had a whole generation to move off them
+        for name in previous.get("retired", []):
+            self._remove_segment(name)
+        self._refresh()
+
+    def _remove_segment(self, name: str) -> None:
+        for pattern in SEGMENT_FILES:
+            path = self._file(pattern, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _write_json(self, name: str, data) -> None:
+        tmp_path = self._file(f"{name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.write("\n")
+        os.replace(tmp_path, self._file(name))
@@ -0,0 +1,151 @@
+# capacity bounds and hit-count-aware eviction for the Redis-backed semantic cache
+import json
+import time
+import logging
+from typing import Optional
+
+HITS_KEY = "genai:semantic_cache_stats:hits"  # ZSET cache key -> hit count
+PRIORITY_KEY = "genai:semantic_cache_stats:priority"  # ZSET cache key -> hits + insert time in age units, lowest evicted first
+META_KEY = "genai:semantic_cache_stats:meta"  # HASH cache key -> {"created_at", "linked"}
+EXPIRES_KEY = "genai:semantic_cache_stats:expires"  # ZSET cache key -> time its TTL runs out
+PRUNE_BATCH = 100  # expired entries checked per write
+PRIORITY_EPOCH = 1_700_000_000  # insert times count from here, keeps priorities small
+
+
+class RedisEvictionPolicy:
+    """
+    Keep the Redis semantic cache within `max_entries`.
+
+    Every get hit bumps the entry's counter in a sorted set, and entries that
+    reach `hot_hits` have their TTL extended to `hot_ttl`. When a write takes
+    the cache over budget, the entries with the lowest priority are evicted
+    together with any keys linked to them (e.g. their exact-match tier key).
+    An entry's priority is its hits plus its insert time counted in
+    `age_seconds`, so an entry written `age_seconds` later outranks one with
+    a hit more: old entries decay instead of holding their place forever.
+
+    Entries that expire leave the bookkeeping as each write checks the ones
+    whose TTL is due, so `size` and the budget count live entries even without
+    keyspace notifications.
+    """
+
+    def __init__(self, client, max_entries: int, hot_hits: int, hot_ttl: int, age_seconds: float = 3600):
+        self._client = client
+        self._max_entries = max_entries
+        self._hot_hits = hot_hits
+        self._hot_ttl = hot_ttl
+        self._age_seconds = age_seconds
+
+    def size(self) -> int:
+        return self._client.zcard(PRIORITY_KEY)
+
+    def _priority(self, now: float) -> float:
+        return (now - PRIORITY_EPOCH) / self._age_seconds
+
+    def record_hit(self, key: str) -> bool:
+        """
+        Count a cache hit on `key`.
+
+        Returns:
+            True if the entry just became hot and its TTL was extended
+        """
+        pipe = self._client.pipeline(transaction=False)
+        pipe.zincrby(HITS_KEY, 1, key)
+        pipe.zincrby(PRIORITY_KEY, 1, key)
+        hits, _ = pipe.execute()
+        if hits != self._hot_hits:
+            return False
+        meta = self._client.hget(META_KEY, key)
+        linked = json.loads(meta)["linked"] if meta else []
+        pipe = self._client.pipeline(transaction=False)
+        for k in [key, *linked]:
+            pipe.expire(k, self._hot_ttl, gt=True)
+        pipe.execute()
+        logging.info(f"Extended TTL of hot cache entry {key} to {self._hot_ttl}s after {int(hits)} hits")
+        return True
+
+    def _prune_expired(self, now: float) -> None:
+        """Forget entries whose TTL is due and which are gone; hot entries whose TTL was extended are rescheduled."""
+        due = [k.decode("utf-8") if isinstance(k, bytes) else k
+               for k in self._client.zrangebyscore(EXPIRES_KEY, "-inf", now, start=0, num=PRUNE_BATCH)]
+        if not due:
+            return
+        pipe = self._client.pipeline(transaction=False)
+        for k in due:
+            pipe.pttl(k)
+        pttls = pipe.execute()
+        pipe = self._client.pipeline(transaction=False)
+        for k, pttl in zip(due, pttls):
+            if pttl > 0:
+                pipe.zadd(EXPIRES_KEY, {k: now + pttl / 1000})
+                continue
+            pipe.zrem(EXPIRES_KEY, k)
+            if pttl == -2:  # no such key
+                pipe.zrem(HITS_KEY, k)
+                pipe.zrem(PRIORITY_KEY, k)
+                pipe.hdel(META_KEY, k)
+        pipe.execute()
+
+    def record_set(self, key: str, linked: list[str] = (), ttl: Optional[float] = None) -> list[tuple[str, float]]:
+        """
+        Register a newly written entry and evict the coldest ones if over budget.
+
+        Returns:
+            (key, age in seconds) for every evicted entry that was still live
+        """
+        now = time.time()
+        pipe = self._client.pipeline(transaction=False)
+        pipe.zadd(HITS_KEY, {key: 0}, nx=True)
+        pipe.zadd(PRIORITY_KEY, {key: self._priority(now)}, nx=True)
+        pipe.hset(META_KEY, key, json.dumps({"created_at": now, "linked": list(linked)}))
+        if ttl:
+            pipe.zadd(EXPIRES_KEY, {key: now + ttl})
+        pipe.execute()
+        self._prune_expired(now)
+        size = self._client.zcard(PRIORITY_KEY)
+        excess = size - self._max_entries
+        if excess <= 0:
+            return []
+        # lowest priority first, never the one just written
+        candidates = [k.decode("utf-8") if isinstance(k, bytes) else k
+                      for k in self._client.zrange(PRIORITY_KEY, 0, excess)]
+        candidates = [k for k in candidates if k != key][:excess]
+        # ZREM is the claim, so concurrent writers never evict the same entry twice
+        pipe = self._client.pipeline(transaction=False)
+        for k in candidates:
+            pipe.zrem(PRIORITY_KEY, k)
+            pipe.zrem(HITS_KEY, k)
+            pipe.hget(META_KEY, k)
+            pipe.hdel(META_KEY, k)
+            pipe.zrem(EXPIRES_KEY, k)
+        results = pipe.execute()
+        cold, metas = [], []
+        for i, k in enumerate(candidates):
+            if results[5 * i]:
+                cold.append(k)
+                metas.append(results[5 * i + 2])
+        pipe = self._client.pipeline(transaction=False)
+        candidates = []
+        for k, meta in zip(cold, metas):
+            meta = json.loads(meta) if meta else {"created_at": now, "linked": []}
+            pipe.delete(k)
+            if meta["linked"]:
+                pipe.delete(*meta["linked"])
+            candidates.append((k, now - meta["created_at"], 2 if meta["linked"] else 1))
+        results = pipe.execute()
+        # entries whose TTL had already run out are cleaned up but not counted as evictions
+        evicted, position = [], 0
+        for k, age, ops in candidates:
+            if results[position] > 0:
+                evicted.append((k, age))
+            position += ops
+        return evicted
+
+    def forget(self, key: str) -> None:
+        """Drop bookkeeping for an entry that expired or was deleted."""
+        pipe = self._client.pipeline(transaction=False)
+        pipe.zrem(HITS_KEY, key)
+        pipe.zrem(PRIORITY_KEY, key)
+        pipe.hdel(META_KEY, key)
+        pipe.zrem(EXPIRES_KEY, key)
+        pipe.execute()
@@ -3,145 +3,503 @@
 from typing import Optional
 import os
 import logging
+import threading
+import time
+import hashlib
+import re
+import string
 import redis
+import redis.asyncio
 import json
-import numpy as np
-from openai import OpenAI
+import asyncio
+import uuid
+from embeddings import QuestionEmbedding
+from vector_codec import encode, decode
+from semantic_index import SemanticIndex
+from redisearch_cache import RediSearchCache
+from lsh_cache import LSHCache
+from ttl_cache import TTLCache
+from cache_eviction import RedisEvictionPolicy
+from config import (CACHE_BACKEND, CACHE_EXACT_MAX_ENTRIES, CACHE_MEMORY_MAX_ENTRIES,
+                    CACHE_MEMORY_MAX_BYTES, CACHE_MEMORY_EVICTION_POLICY, CACHE_MAX_ENTRIES, CACHE_EVICTION_AGE_SECONDS,
+                    CACHE_HOT_HIT_THRESHOLD, CACHE_HOT_TTL_SECONDS, CACHE_LSH_BITS,
+                    CACHE_LSH_PROBES, CACHE_LSH_SEED, CACHE_LSH_MAX_CANDIDATES, CACHE_QUANTIZATION, CACHE_RESCORE_CANDIDATES,
+                    EMBEDDING_DIMENSIONS, CACHE_REDIS_TIMEOUT_SECONDS)
+from cache_version import current_version, acurrent_version, is_outdated
+from observability import (record_cache_lookup, record_embedding_fallthrough,
+                           record_cache_evictions, record_cache_size)
 
 USE_REDIS = False
 
 try:
     REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
-    _client = redis.Redis.from_url(REDIS_URL)
+    _client = redis.Redis.from_url(REDIS_URL, socket_timeout=CACHE_REDIS_TIMEOUT_SECONDS,
+                                   socket_connect_timeout=CACHE_REDIS_TIMEOUT_SECONDS)
     _client.ping()  # Check if Redis is available
     USE_REDIS = True
     logging.info(f"Redis is available and will be used for caching. {REDIS_URL}")
 
 except Exception as e:
-    logging.warning(f"Redis is not available: {e}. Caching will not be used.")
+    logging.warning(f"Redis is not available: {e}. Falling back to the in-memory cache.")
     USE_REDIS = False
     _client = {}
 
-logging.info(f"Cache Backend: {'Redis' if USE_REDIS else 'In-Memory'}")
+logging.info(f"Cache Backend: {f'Redis ({CACHE_BACKEND})' if USE_REDIS else 'In-Memory'}")
 
-# Initialize OpenAI client for embeddings
-_openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-EMBEDDING_MODEL = "text-embedding-3-small"
+# Client for the async request path (aget/aset), so cache round trips never block the event loop
+_aclient = redis.asyncio.Redis.from_url(REDIS_URL, socket_timeout=CACHE_REDIS_TIMEOUT_SECONDS,
+                                        socket_connect_timeout=CACHE_REDIS_TIMEOUT_SECONDS) if USE_REDIS else None
 
-def _get_embedding(text: str) -> list[float]:
-    """Generate embedding for the given text using OpenAI."""
+def _key(key: str) -> str:
+    """Generate a cache key."""
+    return f"genai:semantic_cache:{key}"
+
+# In-process index over every cached question embedding, kept in sync with Redis.
+# Without Redis it is the cache itself, bounded and evicting by LRU/LFU.
+EVENTS_CHANNEL = "genai:semantic_cache_events"
+_WORKER_ID = uuid.uuid4().hex
+SCAN_BATCH_SIZE = 500
+if USE_REDIS:
+    _index = SemanticIndex(quantization=CACHE_QUANTIZATION, rescore_candidates=CACHE_RESCORE_CANDIDATES)
+else:
+    _index = SemanticIndex(max_entries=CACHE_MEMORY_MAX_ENTRIES, max_bytes=CACHE_MEMORY_MAX_BYTES,
+                           policy=CACHE_MEMORY_EVICTION_POLICY, quantization=CACHE_QUANTIZATION,
+                           rescore_candidates=CACHE_RESCORE_CANDIDATES)
+
+# Backends that search in Redis itself, used instead of the in-process index:
+# server-side KNN (CACHE_BACKEND=redisearch) or LSH buckets (CACHE_BACKEND=lsh)
+_remote_cache = None
+if USE_REDIS and CACHE_BACKEND == "redisearch":
+    _remote_cache = RediSearchCache(_client)
+elif USE_REDIS and CACHE_BACKEND == "lsh":
+    _remote_cache = LSHCache(_client, CACHE_LSH_BITS, CACHE_LSH_PROBES, CACHE_LSH_SEED,
+                             CACHE_LSH_MAX_CANDIDATES, CACHE_RESCORE_CANDIDATES)
+
+# Capacity bound and hit-count-aware eviction for the Redis-backed cache
+_eviction = RedisEvictionPolicy(_client, CACHE_MAX_ENTRIES, CACHE_HOT_HIT_THRESHOLD,
+                                CACHE_HOT_TTL_SECONDS, CACHE_EVICTION_AGE_SECONDS) if USE_REDIS else None
+
+def _load_entry(key) -> None:
+    """Load a single cached entry from Redis into the in-process index."""
+    pipe = _client.pipeline(transaction=False)
+    pipe.get(key)
+    pipe.pttl(key)
+    cached_data, pttl = pipe.execute()
+    if not cached_data:
+        _index.remove(_decode(key))
+        return
+    _add_to_index(_decode(key), cached_data, pttl)
+
+def _add_to_index(key: str, cached_data: bytes, pttl: int) -> None:
     try:
-        response = _openai_client.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=text
-        )
-        return response.data[0].embedding
+        cached_item = json.loads(cached_data.decode('utf-8'))
     except Exception as e:
-        logging.error(f"Error generating embedding: {e}")
+        logging.error(f"Error processing cached item {key}: {e}")
+        return
+    cached_embedding = cached_item.get("embedding")
+    cached_answer = cached_item.get("answer")
+    if not cached_embedding or not cached_answer:
+        return
+    cached_embedding = decode(cached_embedding)
+    if len(cached_embedding) != EMBEDDING_DIMENSIONS:
+        return  # written by workers on another embedding size, e.g. during a rolling deploy
+    ttl = pttl / 1000 if pttl and pttl > 0 else None
+    _index.add(key, cached_embedding, cached_answer, ttl=ttl, version=cached_item.get("version", ""))
+
+def _decode(key) -> str:
+    return key.decode('utf-8') if isinstance(key, bytes) else key
+
+def _sync_index() -> None:
+    """
+    Reconcile the in-process index with Redis using SCAN (never KEYS). Entries are
+    refreshed in place, so lookups keep hitting during the scan; only once it has
+    completed are the entries Redis no longer has removed. A failed scan changes nothing.
+    """
+    before = frozenset(_index.keys())  # entries added while scanning are newer than the scan, never dropped
+    seen, batch = [], []
+    for key in _client.scan_iter(match=_key("*"), count=SCAN_BATCH_SIZE):
+        batch.append(key)
+        if len(batch) >= SCAN_BATCH_SIZE:
+            seen.extend(_load_batch(batch))
+            batch = []
+    if batch:
+        seen.extend(_load_batch(batch))
+    for key in before.difference(seen):
+        _index.remove(key)
+    logging.info(f"Semantic cache index synced from Redis: {len(_index)} entries")
+
+def _load_batch(keys: list) -> list[str]:
+    """Adds the entries to the index, returns the keys that still existed."""
+    pipe = _client.pipeline(transaction=False)
+    for key in keys:
+        pipe.get(key)
+        pipe.pttl(key)
+    results = pipe.execute()
+    loaded = []
+    for i, key in enumerate(keys):
+        cached_data, pttl = results[2 * i], results[2 * i + 1]
+        if cached_data:
+            _add_to_index(_decode(key), cached_data, pttl)
+            loaded.append(_decode(key))
+    return loaded
+
+def _listen_for_invalidations() -> None:
+    """
+    Keep the index in sync with other workers.
+
+    Writers publish on EVENTS_CHANNEL; expirations, deletes and evictions are
+    picked up from keyspace notifications when the server has them enabled
+    (notify-keyspace-events Egx). Entries also carry their own expiry in the
+    index, so a server without notifications never serves an expired answer.
+    """
+    db = _client.connection_pool.connection_kwargs.get("db", 0)
+    removal_channels = [f"__keyevent@{db}__:{event}" for event in ("expired", "del", "evicted")]
+    subscriber = redis.Redis.from_url(REDIS_URL)  # no read timeout: the subscription is idle between messages
+    while True:
+        try:
+            pubsub = subscriber.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(EVENTS_CHANNEL, *removal_channels)
+            _sync_index()  # resync after (re)subscribing so no event is missed
+            for message in pubsub.listen():
+                channel = _decode(message["channel"])
+                data = _decode(message["data"])
+                if channel == EVENTS_CHANNEL:
+                    action, worker_id, key = data.split(" ", 2)
+                    if worker_id == _WORKER_ID:
+                        continue  # our own write, already in the index
+                    if action == "set":
+                        _load_entry(key)
+                    elif action == "del":
+                        _index.remove(key)
+                elif data.startswith(_key("")):
+                    _index.remove(data)
+                    if channel.endswith(":expired"):
+                        _eviction.forget(data)
+        except Exception as e:
+            logging.warning(f"Semantic cache invalidation listener failed: {e}. Reconnecting...")
+            time.sleep(1)
+
+if USE_REDIS and _remote_cache is None:
+    threading.Thread(target=_listen_for_invalidations, name="semantic-cache-sync", daemon=True).start()
+
+# Exact-match tier: normalized question text -> answer, checked before any embedding call.
+# Values carry the semantic entry key so exact hits count towards that entry's hits.
+_exact_local = TTLCache(max_entries=CACHE_EXACT_MAX_ENTRIES)
+_WHITESPACE = re.compile(r"\s+")
+
+def _normalize(question: str) -> str:
+    """Case-fold, collapse whitespace and strip trailing punctuation."""
+    text = _WHITESPACE.sub(" ", question.casefold()).strip()
+    return text.rstrip(string.punctuation + " ")
+
+def _exact_key(question: str, version: str) -> str:
+    # the version is part of the key, so a version bump makes every older exact entry unreachable
+    question_hash = hashlib.sha256(_normalize(question).encode()).hexdigest()
+    return f"genai:exact_cache:{version}:{question_hash}"
+
+def _exact_local_get(key: str) -> Optional[tuple[str, str]]:
+    cached = _exact_local.get(key)
+    if cached is not None and _remote_cache is None and cached[1] not in _index:
+        # the semantic entry was evicted or invalidated, drop the exact entry with it
+        _exact_local.delete(key)
+        cached = None
+    record_cache_lookup("exact_local", "hit" if cached is not None else "miss")
+    return cached
+
+def _exact_from_redis(key: str, cached_data: Optional[bytes], pttl: int) -> Optional[tuple[str, str]]:
+    if cached_data is None:
+        record_cache_lookup("exact_redis", "miss")
         return None
+    record_cache_lookup("exact_redis", "hit")
+    cached_item = json.loads(cached_data.decode('utf-8'))
+    cached = (cached_item["answer"], cached_item["entry"])
+    _exact_local.set(key, cached, ttl=pttl / 1000 if pttl and pttl > 0 else None)
+    return cached
 
-def _cosine_similarity(vec1: list[float], vec2: list[float]) -> float:
-    """Calculate cosine similarity between two vectors."""
-    vec1_np = np.array(vec1)
-    vec2_np = np.array(vec2)
-    return np.dot(vec1_np, vec2_np) / (np.linalg.norm(vec1_np) * np.linalg.norm(vec2_np))
+def _exact_get(question: str, version: str) -> Optional[tuple[str, str]]:
+    """Look the question up in process first, then in Redis. Returns (answer, entry key)."""
+    key = _exact_key(question, version)
+    cached = _exact_local_get(key)
+    if cached is not None or not USE_REDIS:
+        return cached
+    try:
+        pipe = _client.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.pttl(key)
+        cached_data, pttl = pipe.execute()
+    except redis.RedisError as e:
+        logging.warning(f"Exact-match lookup in Redis failed: {e}")
+        return None
+    return _exact_from_redis(key, cached_data, pttl)
 
-def _key(key: str) -> str:
-    """Generate a cache key."""
-    return f"genai:semantic_cache:{key}"
+async def _aexact_get(question: str, version: str) -> Optional[tuple[str, str]]:
+    key = _exact_key(question, version)
+    cached = _exact_local_get(key)
+    if cached is not None or not USE_REDIS:
+        return cached
+    try:
+        pipe = _aclient.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.pttl(key)
+        cached_data, pttl = await pipe.execute()
+    except redis.RedisError as e:
+        logging.warning(f"Exact-match lookup in Redis failed: {e}")
+        return None
+    return _exact_from_redis(key, cached_data, pttl)
+
+def _exact_set(question: str, answer: str, ttl: int, entry_key: str, version: str) -> str:
+    key = _exact_key(question, version)
+    _exact_local.set(key, (answer, entry_key), ttl=ttl)
+    if USE_REDIS:
+        try:
+            _client.setex(key, ttl, json.dumps({"answer": answer, "entry": entry_key}))
+        except redis.RedisError as e:
+            logging.warning(f"Exact-match write to Redis failed: {e}")
+    return key
+
+async def _aexact_set(question: str, answer: str, ttl: int, entry_key: str, version: str) -> str:
+    key = _exact_key(question, version)
+    _exact_local.set(key, (answer, entry_key), ttl=ttl)
+    if USE_REDIS:
+        try:
+            await _aclient.setex(key, ttl, json.dumps({"answer": answer, "entry": entry_key}))
+        except redis.RedisError as e:
+            logging.warning(f"Exact-match write to Redis failed: {e}")
+    return key
+
+# Entries from older corpus generations are purged in the background once a worker sees a new version
+_seen_version = None
+
+def _purge_outdated(version: str) -> None:
+    outdated = [key for key, entry_version in _index.stale_keys(version) if is_outdated(entry_version, version)]
+    for key in outdated:
+        _index.remove(key)
+    if USE_REDIS:
+        try:
+            for start in range(0, len(outdated), SCAN_BATCH_SIZE):
+                batch = outdated[start:start + SCAN_BATCH_SIZE]
+                _client.delete(*batch)
+                for key in batch:
+                    _eviction.forget(key)
+        except redis.RedisError as e:
+            logging.warning(f"Failed to purge outdated cache entries: {e}")
+    if outdated:
+        logging.info(f"Purged {len(outdated)} semantic cache entries from older corpus generations")
+
+def _check_version(version: Optional[str] = None) -> str:
+    global _seen_version
+    version = version or current_version()
+    if version != _seen_version:
+        if _seen_version is not None and _remote_cache is None:
+            threading.Thread(target=_purge_outdated, args=(version,), name="semantic-cache-purge", daemon=True).start()
+        _seen_version = version
+    return version
+
+def _record_hit(key: str) -> None:
+    if _eviction is None:
+        _index.touch(key)
+        return
+    try:
+        if _eviction.record_hit(key) and _remote_cache is None:
+            # the TTL was extended, refresh our row and tell the other workers to do the same
+            _load_entry(key)
+            _client.publish(EVENTS_CHANNEL, f"set {_WORKER_ID} {key}")
+    except redis.RedisError as e:
+        logging.warning(f"Failed to record cache hit: {e}")
+
+def _record_write(key: str, exact_key: str, ttl: Optional[int] = None) -> None:
+    try:
+        evicted = _eviction.record_set(key, linked=[exact_key], ttl=ttl)
+        for evicted_key, _ in evicted:
+            if _remote_cache is None:
+                _index.remove(evicted_key)
+                _client.publish(EVENTS_CHANNEL, f"del {_WORKER_ID} {evicted_key}")
+        if evicted:
+            logging.info(f"Evicted {len(evicted)} cold semantic cache entries")
+        record_cache_evictions(evicted)
+        record_cache_size(_eviction.size())
+    except redis.RedisError as e:
+        logging.warning(f"Failed to apply cache capacity bound: {e}")
+
+async def _arecord_hit(key: str) -> None:
+    if _eviction is None:
+        _index.touch(key)
+    else:
+        await asyncio.to_thread(_record_hit, key)
+
+def _semantic_hit(match: Optional[tuple[str, str, float]], similarity_threshold: float) -> Optional[tuple[str, str]]:
+    """(key, answer) of a match at or above the threshold, None otherwise. Counts the lookup."""
+    if match is None:
+        record_cache_lookup("semantic", "miss")
+        return None
+    best_match_key, best_match_answer, best_match_score = match
+    
+    # Return the answer if similarity exceeds threshold
+    if best_match_score >= similarity_threshold:
+        logging.info(f"Semantic cache hit! Similarity: {best_match_score:.4f}")
+        record_cache_lookup("semantic", "hit")
+        return best_match_key, best_match_answer
+    elif best_match_score > 0:
+        logging.info(f"Similar question found but below threshold. Similarity: {best_match_score:.4f} < {similarity_threshold}")
+    
+    record_cache_lookup("semantic", "miss")
+    return None
 
-def get(question: str, similarity_threshold: float = 0.95) -> Optional[str]:
+def get(question: str, similarity_threshold: float = 0.95, embedding: Optional[QuestionEmbedding] = None) -> Optional[str]:
     """
-    Get a value from the cache using semantic similarity.
+    Get a value from the cache, trying the exact-match tier before semantic similarity.
     
     Args:
         question: The question to search for
         similarity_threshold: Minimum cosine similarity (0-1) for a cache hit
+        embedding: Request-scoped question embedding, computed here if not given
     
     Returns:
         The cached answer if a similar question is found, None otherwise
     """
-    if not USE_REDIS:
-        logging.warning("Redis is not available. Semantic caching is disabled.")
-        return None
+    # Entries stored under another corpus generation, prompt or model never match
+    version = _check_version()
+    
+    # Exact-match tier needs no embedding call
+    exact_match = _exact_get(question, version)
+    if exact_match is not None:
+        logging.info("Exact-match cache hit")
+        exact_answer, entry_key = exact_match
+        _record_hit(entry_key)
+        return exact_answer
     
     # Generate embedding for the incoming question
-    question_embedding = _get_embedding(question)
+    record_embedding_fallthrough()
+    question_embedding = (embedding or QuestionEmbedding(question)).vector
     if question_embedding is None:
         return None
     
-    # Get all cached question keys
-    cache_keys = _client.keys(_key("*"))
-    
-    if not cache_keys:
+    # Single vectorized lookup, in process or as one KNN query on the server
+    if _remote_cache is not None:
+        match = _remote_cache.search(question_embedding, version=version)
+    else:
+        match = _index.search(question_embedding, version=version)
+    hit = _semantic_hit(match, similarity_threshold)
+    if hit is None:
         return None
+    _record_hit(hit[0])
+    return hit[1]
+
+async def aget(question: str, similarity_threshold: float = 0.95,
+               embedding: Optional[QuestionEmbedding] = None) -> Optional[str]:
+    """
+    Async `get`. Redis lookups and the embedding call are awaited; the remote
+    backends and hit bookkeeping run in the default executor.
+    """
+    version = _check_version(await acurrent_version())
+    exact_match = await _aexact_get(question, version)
+    if exact_match is not None:
+        logging.info("Exact-match cache hit")
+        exact_answer, entry_key = exact_match
+        await _arecord_hit(entry_key)
+        return exact_answer
     
-    best_match_score = -1
-    best_match_answer = None
-    
-    # Search through all cached questions to find the most similar one
-    for key in cache_keys:
-        try:
-            cached_data = _client.get(key)
-            if not cached_data:
-                continue
-            
-            cached_item = json.loads(cached_data.decode('utf-8'))
-            cached_embedding = cached_item.get("embedding")
-            cached_answer = cached_item.get("answer")
-            
-            if not cached_embedding or not cached_answer:
-                continue
-            
-            # Calculate similarity
-            similarity = _cosine_similarity(question_embedding, cached_embedding)
-            
-            if similarity > best_match_score:
-                best_match_score = similarity
-                best_match_answer = cached_answer
-        
-        except Exception as e:
-            logging.error(f"Error processing cached item {key}: {e}")
-            continue
-    
-    # Return the answer if similarity exceeds threshold
-    if best_match_score >= similarity_threshold:
-        logging.info(f"Semantic cache hit! Similarity: {best_match_score:.4f}")
-        return best_match_answer
-    elif best_match_score > 0:
-        logging.info(f"Similar question found but below threshold. Similarity: {best_match_score:.4f} < {similarity_threshold}")
+    record_embedding_fallthrough()
+    question_embedding = await (embedding or QuestionEmbedding(question)).avector()
+    if question_embedding is None:
+        return None
     
-    return None
+    if _remote_cache is not None:
+        match = await asyncio.to_thread(_remote_cache.search, question_embedding, version)
+    else:
+        match = _index.search(question_embedding, version=version)
+    hit = _semantic_hit(match, similarity_threshold)
+    if hit is None:
+        return None
+    await _arecord_hit(hit[0])
+    return hit[1]
+
+def _entry_key(question: str, question_embedding) -> str:
+    # Create a unique key using hash of the question
+    question_hash = hashlib.md5(question.encode()).hexdigest()
+    if _remote_cache is not None:
+        return _remote_cache.key(question_hash, question_embedding)
+    return _key(question_hash)
+
+def _set_in_memory(key: str, question_embedding, answer: str, ttl: int, version: str) -> None:
+    evicted = _index.add(key, question_embedding, answer, ttl=ttl, version=version)
+    record_cache_evictions(evicted)
+    record_cache_size(len(_index))
+
+def _entry(question: str, question_embedding, answer: str, version: str) -> str:
+    # Store question, embedding (base64 float32 bytes), and answer together
+    return json.dumps({
+        "question": question,
+        "embedding": encode(question_embedding),
+        "answer": answer,
+        "version": version
+    })
 
-def set(question: str, answer: str, ttl: int = 3600) -> None:
+def set(question: str, answer: str, ttl: int = 3600, embedding: Optional[QuestionEmbedding] = None) -> None:
     """
     Set a value in the cache with semantic embedding.
+    Fills both the exact-match tier and the semantic tier.
     
     Args:
         question: The question to cache
         answer: The answer to cache
         ttl: Time to live in seconds
+        embedding: Request-scoped question embedding, computed here if not given
     """
+    # Reuse the request's embedding when the pipeline already computed it
+    question_embedding = (embedding or QuestionEmbedding(question)).vector
+    if question_embedding is None:
+        logging.error("Failed to generate embedding for caching")
+        return
+    
+    key = _entry_key(question, question_embedding)
+    version = _check_version()
+    exact_key = _exact_set(question, answer, ttl, key, version)
+    
     if not USE_REDIS:
-        logging.warning("Redis is not available. Semantic caching is disabled.")
+        _set_in_memory(key, question_embedding, answer, ttl, version)
+        return
+    
+    if _remote_cache is not None:
+        _remote_cache.add(key, question, question_embedding, answer, ttl=ttl, version=version)
+        _record_write(key, exact_key, ttl)
         return
     
-    # Generate embedding for the question
-    question_embedding = _get_embedding(question)
+    # the local index is updated first so this worker keeps serving hits during a Redis outage
+    _index.add(key, question_embedding, answer, ttl=ttl, version=version)
+    try:
+        _client.setex(key, ttl, _entry(question, question_embedding, answer, version))
+        _client.publish(EVENTS_CHANNEL, f"set {_WORKER_ID} {key}")
+    except redis.RedisError as e:
+        logging.warning(f"Semantic cache write to Redis failed: {e}")
+        return
+    _record_write(key, exact_key, ttl)
+
+async def aset(question: str, answer: str, ttl: int = 3600, embedding: Optional[QuestionEmbedding] = None) -> None:
+    """Async `set`, awaiting the Redis writes of the exact and semantic tiers."""
+    question_embedding = await (embedding or QuestionEmbedding(question)).avector()
     if question_embedding is None:
         logging.error("Failed to generate embedding for caching")
         return
     
-    # Create a unique key using hash of the question
-    import hashlib
-    question_hash = hashlib.md5(question.encode()).hexdigest()
-    key = _key(question_hash)
+    key = _entry_key(question, question_embedding)
+    version = _check_version(await acurrent_version())
+    exact_key = await _aexact_set(question, answer, ttl, key, version)
     
-    # Store question, embedding, and answer together
-    cache_data = {
-        "question": question,
-        "embedding": question_embedding,
-        "answer": answer
-    }
+    if not USE_REDIS:
+        _set_in_memory(key, question_embedding, answer, ttl, version)
+        return
+    
+    if _remote_cache is not None:
+        await asyncio.to_thread(_remote_cache.add, key, question, question_embedding, answer, ttl, version)
+        await asyncio.to_thread(_record_write, key, exact_key, ttl)
+        return
     
-    _client.setex(key, ttl, json.dumps(cache_data))
\ No newline at end of file
+    _index.add(key, question_embedding, answer, ttl=ttl, version=version)
+    try:
+        await _aclient.setex(key, ttl, _entry(question, question_embedding, answer, version))
+        await _aclient.publish(EVENTS_CHANNEL, f"set {_WORKER_ID} {key}")
+    except redis.RedisError as e:
+        logging.warning(f"Semantic cache write to Redis failed: {e}")
+        return
+    await asyncio.to_thread(_record_write, key, exact_key, ttl)
@@ -0,0 +1,108 @@
+# version stamp for cached answers: corpus generation + prompt template + model
+import time
+import hashlib
+import logging
+import argparse
+import redis
+import redis.asyncio
+from config import DEFAULT_MODEL, CORPUS_GENERATION_REFRESH_SECONDS, CORPUS_GENERATION_MAX_BACKOFF_SECONDS, EMBEDDING_DIMENSIONS
+from router import TEMPLATE
+
+GENERATION_KEY = "genai:corpus_generation"
+
+# the prompt part only changes with a deploy, so it is computed once
+# embedding size is part of it: vectors of different dimensions cannot be compared
+PROMPT_FINGERPRINT = hashlib.sha256(f"{DEFAULT_MODEL}\n{TEMPLATE}\n{EMBEDDING_DIMENSIONS}".encode()).hexdigest()[:12]
+
+_generation = 0
+_next_check = 0.0
+_failures = 0  # consecutive failed reads, the next one is put off exponentially
+
+def _client() -> redis.Redis | None:
+    """cache_store's client (shared pool, socket timeouts), None when Redis is not available."""
+    import cache_store  # imported here, cache_store imports this module
+    return cache_store._client if cache_store.USE_REDIS else None
+
+def _aclient() -> redis.asyncio.Redis | None:
+    """cache_store's client for the event loop."""
+    import cache_store
+    return cache_store._aclient if cache_store.USE_REDIS else None
+
+def _checked(ok: bool) -> None:
+    global _next_check, _failures
+    _failures = 0 if ok else _failures + 1
+    # while Redis is down the reads, each waiting for the socket timeout, get further apart
+    delay = CORPUS_GENERATION_REFRESH_SECONDS * 2 ** min(_failures, 10)
+    _next_check = time.time() + min(delay, CORPUS_GENERATION_MAX_BACKOFF_SECONDS)
+
+def current_generation() -> int:
+    """Corpus generation id, re-read from Redis at most every CORPUS_GENERATION_REFRESH_SECONDS."""
+    global _generation
+    client = _client()
+    if client is None or time.time() < _next_check:
+        return _generation
+    try:
+        _generation = int(client.get(GENERATION_KEY) or 0)
+    except redis.RedisError as e:
+        logging.warning(f"Could not read corpus generation: {e}")
+        _checked(False)
+    else:
+        _checked(True)
+    return _generation
+
+async def acurrent_generation() -> int:
+    """Async `current_generation`, so a slow or unreachable Redis never blocks the event loop."""
+    global _generation, _next_check
+    client = _aclient()
+    if client is None or time.time() < _next_check:
+        return _generation
+    _next_check = time.time() + CORPUS_GENERATION_REFRESH_SECONDS  # one read at a time, the others use the last value
+    try:
+        _generation = int(await client.get(GENERATION_KEY) or 0)
+    except redis.RedisError as e:
+        logging.warning(f"Could not read corpus generation: {e}")
+        _checked(False)
+    else:
+        _checked(True)
+    return _generation
+
+def current_version() -> str:
+    """Version stamp stored with every cached answer and checked on lookup."""
+    return f"{current_generation()}-{PROMPT_FINGERPRINT}"
+
+async def acurrent_version() -> str:
+    """Async `current_version`."""
+    return f"{await acurrent_generation()}-{PROMPT_FINGERPRINT}"
+
+def is_outdated(entry_version: str, version: str) -> bool:
+    """
+    True if the entry belongs to an older corpus generation and can be deleted.
+
+    Entries that only differ in the prompt fingerprint are skipped but kept,
+    so pods on either side of a rolling deploy don't delete each other's answers.
+    """
+    try:
+        return int(entry_version.split("-", 1)[0]) < int(version.split("-", 1)[0])
+    except (AttributeError, ValueError):
+        return True
+
+def bump_generation() -> int:
+    """Start a new corpus generation. O(1): older cache entries simply stop matching."""
+    global _generation
+    client = _client()
+    if client is None:
+        raise redis.ConnectionError("Redis is not available")
+    _generation = int(client.incr(GENERATION_KEY))
+    _checked(True)
+    logging.info(f"Corpus generation bumped to {_generation}")
+    return _generation
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or bump the cache version")
+    parser.add_argument("--bump", action="store_true", help="Start a new corpus generation")
+    args = parser.parse_args()
+    if args.bump:
+        bump_generation()
+    print(f"Cache version: {current_version()}")
+
+# python cache_version.py --bump
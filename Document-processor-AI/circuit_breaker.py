@@ -0,0 +1,53 @@
+# circuit breaker for upstream calls, shared by the sync and async LLM paths
+import time
+import threading
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that keeps failing.
+
+    Closed: calls go through. After `failures` consecutive failed calls it opens
+    and rejects calls for `cooldown` seconds. Then it is half-open: one trial call
+    goes through, its success closes the breaker and its failure reopens it.
+    """
+
+    def __init__(self, failures: int = 5, cooldown: float = 30.0):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() - self._opened_at < self.cooldown else "half_open"
+
+    def allow(self) -> bool:
+        """True if a call may go through now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def release(self) -> None:
+        """Frees the trial slot of a call that ended without an outcome, e.g. cancelled."""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive, self._opened_at, self._trial = 0, None, False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self._trial or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+            self._trial = False
@@ -12,7 +12,92 @@ DEFAULT_MODEL = "gpt-4.1-nano"
 TEMPERATURE = 0.2
 MAX_TOKENS = 512
 
+# LLM call policy (llm_client.py)
+FALLBACK_MODEL = os.getenv("FALLBACK_MODEL", "gpt-4o-mini")  # used while DEFAULT_MODEL's circuit breaker is open
+REQUEST_DEADLINE_SECONDS = 30  # default deadline of an /ask request, clients may send a shorter timeout_ms
+LLM_MAX_RETRIES = 2  # retries of a failed LLM call (rate limits, 5xx, connection errors), within the deadline
+LLM_RETRY_BASE_SECONDS = 0.5  # backoff before retry n is drawn from [0, base * 2**n] ("full jitter")
+LLM_RETRY_MAX_SECONDS = 8  # cap of the backoff
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"  # async path only
+LLM_HEDGE_PERCENTILE = 95  # a duplicate request is sent once a call is slower than this percentile of recent calls
+LLM_HEDGE_MIN_SAMPLES = 20  # recent latencies needed before hedging starts
+LLM_LATENCY_WINDOW = 500  # recent successful calls per model kept for the percentile
+LLM_BREAKER_FAILURES = 5  # consecutive failed calls that open a model's circuit breaker
+LLM_BREAKER_COOLDOWN_SECONDS = 30  # an open breaker lets one trial call through after this
+
+# Streaming (/ask/stream): redaction holds back the unfinished word, runs without whitespace are released past this
+STREAM_MAX_HOLD_CHARS = 256
+
+# Embeddings: text-embedding-3 vectors can be shortened (Matryoshka) and stored as int8 or binary codes
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))  # below the model's 1536, vectors are shortened
+EMBEDDING_DIMENSION_REDUCTION = os.getenv("EMBEDDING_DIMENSION_REDUCTION", "api")  # "api" (dimensions parameter) or "truncate" (slice and renormalize locally)
+EMBEDDING_BATCH_ENABLED = os.getenv("EMBEDDING_BATCH_ENABLED", "true").lower() == "true"  # one request for the question embeddings of concurrent requests
+EMBEDDING_BATCH_MAX_SIZE = 64  # texts per batched request, sent at once when reached
+EMBEDDING_BATCH_MAX_WAIT_MS = 5  # longest a text waits for others to join its batch
+
 # Cache 
 CACHE_TTL_SECONDS = 1800 # 30 minutes
 CACHE_SIMILARITY_THRESHOLD = 0.90  # Minimum cosine similarity for cache hit (0-1 scale)
-VECTOR_TOP_K = 2  # number of top results to retrieve
\ No newline at end of file
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "index")  # "index" (in-process vector index), "redisearch" (server-side KNN) or "lsh" (bucketed keys)
+CACHE_LSH_BITS = 14  # hyperplanes per signature, the cache is split into 2**bits buckets
+CACHE_LSH_PROBES = 128  # neighbor buckets probed besides the query's own (see benchmark_lsh_cache.py)
+CACHE_LSH_SEED = 42  # must be the same on every worker
+CACHE_LSH_MAX_CANDIDATES = 512  # entries scored per lookup at most, in probe order
+CACHE_QUANTIZATION = os.getenv("CACHE_QUANTIZATION", "float32")  # in-process cache index rows: "float32", "int8" or "binary"
+CACHE_RESCORE_CANDIDATES = 8  # quantized matches rescored against float vectors (float16 copies in process, stored float32 for lsh), 0 keeps no float copy (int8 only, binary needs rescoring)
+CACHE_EXACT_MAX_ENTRIES = 10000  # in-process exact-match tier size (normalized question -> answer)
+CORPUS_GENERATION_REFRESH_SECONDS = 5  # how often workers re-read the corpus generation used in cache version stamps
+CORPUS_GENERATION_MAX_BACKOFF_SECONDS = 60  # after failed reads the interval doubles up to this
+CACHE_REDIS_TIMEOUT_SECONDS = 2  # connect/read timeout of the cache's Redis clients, so a hung Redis fails requests fast
+# Redis-backed semantic cache capacity and hot-entry handling
+CACHE_MAX_ENTRIES = 50000  # lowest-priority entries are evicted beyond this
+CACHE_EVICTION_AGE_SECONDS = 3600  # eviction priority is hits + insert time in these units: an entry this much newer outranks one more hit
+CACHE_HOT_HIT_THRESHOLD = 5  # hits after which an entry's TTL is extended
+CACHE_HOT_TTL_SECONDS = 6 * 3600  # TTL given to hot entries
+# In-memory backend limits, used when Redis is unavailable
+CACHE_MEMORY_MAX_ENTRIES = 10000  # max cached questions held in process
+CACHE_MEMORY_MAX_BYTES = 256 * 1024 * 1024  # approximate byte budget (embeddings + answers)
+CACHE_MEMORY_EVICTION_POLICY = "lru"  # "lru" or "lfu"
+VECTOR_TOP_K = 2  # number of top results to retrieve
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "redis")  # "redis" (RediSearch) or "local" (memory-mapped files, single node)
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")  # where the local backend keeps its files
+LOCAL_INDEX_IVF_MIN_ROWS = 50000  # below this the local backend searches exactly, above it builds IVF lists
+LOCAL_INDEX_REBUILD_RATIO = 0.2  # fraction of rows appended or deleted since the last rewrite that triggers a rebuild or compaction
+LOCAL_INDEX_IVF_PROBES = 32  # IVF lists scanned per query (of ~4*sqrt(rows) lists)
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION", "float32")  # codes scanned by the local backend: "float32", "int8" or "binary"
+LOCAL_INDEX_RESCORE_CANDIDATES = 64  # quantized candidates rescored against the memory-mapped float32 rows
+VECTOR_STORE_POOL_SIZE = 20  # max Redis connections shared by vector store queries in a process
+VECTOR_STORE_POOL_TIMEOUT_SECONDS = 5  # a query waits this long for a free connection before failing
+VECTOR_STORE_HEALTH_CHECK_SECONDS = 30  # idle connections are pinged before reuse after this long
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")  # "hybrid" (BM25 + vector, fused by RRF) or "vector"
+BM25_INDEX_DIR = os.getenv("BM25_INDEX_DIR", "bm25_index")  # lexical index written by load_corpus.py
+BM25_MAX_SEGMENTS = 8  # each ingestion run adds a segment, beyond this the smallest are merged
+BM25_MAX_DELETED_RATIO = 0.2  # a segment is compacted once this fraction of its chunks is deleted
+HYBRID_CANDIDATES = 10  # results taken from each retriever before fusion
+PARENT_CANDIDATES_PER_RESULT = 4  # chunks retrieved per parent section returned, hits often share a parent
+RRF_K = 60  # reciprocal rank fusion constant, score = sum(1 / (RRF_K + rank))
+CONTEXT_TOKEN_BUDGET = 1500  # prompt tokens of retrieved context, merged chunks are packed best-ranked first
+# Single-flight (app.py): concurrent misses for the same or a near-identical question (CACHE_SIMILARITY_THRESHOLD) share one pipeline run
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+SINGLE_FLIGHT_LOCK_SECONDS = 60  # a leader's Redis lock expires after this, so a crashed worker frees the question
+SINGLE_FLIGHT_WAIT_SECONDS = 30  # followers run the pipeline themselves after waiting this long for the leader
+# Retrieval result cache (retrieval.py), entries are keyed on the corpus generation
+RETRIEVAL_CACHE_MAX_ENTRIES = 5000  # cached top-k results per tier
+RETRIEVAL_CACHE_TTL_SECONDS = 6 * 3600  # results stay valid until the corpus changes, the TTL only bounds staleness
+RETRIEVAL_CACHE_SIMILARITY_THRESHOLD = 0.97  # near-duplicate queries above this reuse the cached chunks
+
+# Corpus ingestion (load_corpus.py)
+INGEST_PARENT_CHUNK_SIZE = 1000  # characters per parent section, returned as context and stored once
+INGEST_CHUNK_SIZE = 200  # characters per chunk, embedded for search and pointing to its parent section
+INGEST_CHUNK_OVERLAP = 40  # characters shared by neighbouring chunks
+INGEST_BATCH_SIZE = 64  # chunks per embedding request and Redis write
+INGEST_CHECKPOINT_PATH = ".ingest_checkpoint.json"  # progress of an interrupted run, removed when it completes
+INGEST_WORKERS = os.cpu_count() or 1  # processes parsing and chunking PDFs in a multi-file run
+INGEST_MAX_CONCURRENT_REQUESTS = 4  # embedding requests (and their writes) in flight
+INGEST_MAX_REQUESTS_PER_SECOND = 5  # embedding request rate cap, keep below the API rate limit
+
+# Cache warm-up at startup (app.py)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "false").lower() == "true"
+WARMUP_SOURCE = os.getenv("WARMUP_SOURCE", "pipeline.log")  # audit log, or a .txt file with one question per line
+WARMUP_TOP_N = 100  # most frequent questions to warm
+WARMUP_CONCURRENCY = 4  # pipeline runs in flight during warm-up
@@ -0,0 +1,95 @@
+# assemble retrieved chunks into prompt context within a token budget
+import logging
+from functools import lru_cache
+from typing import Optional
+import tiktoken
+from config import DEFAULT_MODEL
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Optional[tiktoken.Encoding]:
+    try:
+        try:
+            return tiktoken.encoding_for_model(DEFAULT_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # the encoding is downloaded on first use, without network fall back to an estimate
+        logging.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+        return None
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens of `text` for DEFAULT_MODEL. Computed once per chunk at ingest time."""
+    encoding = _encoding()
+    return len(encoding.encode(text)) if encoding else max(1, len(text) // 4)
+
+
+class _Span:
+    """A run of text from one page, grown by merging overlapping chunks."""
+
+    def __init__(self, rank: int, text: str, start: Optional[int], tokens: int):
+        self.rank = rank  # best retrieval rank among the merged chunks
+        self.text = text
+        self.start = start
+        self.tokens = tokens
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.text)
+
+    def absorb(self, rank: int, text: str, start: int, tokens: int) -> None:
+        # keep only the part of the next chunk past our end; its tokens are prorated, not re-counted
+        new_text = text[max(0, self.end - start):]
+        if new_text:
+            self.tokens += max(1, round(tokens * len(new_text) / max(len(text), 1)))
+        self.text += new_text
+        self.rank = min(self.rank, rank)
+
+
+def _merge(chunks: list[tuple[str, str, dict]]) -> list[_Span]:
+    """Merge adjacent or overlapping chunks of the same page and drop duplicated text."""
+    by_page: dict[tuple, list] = {}
+    spans = []
+    for rank, (_, text, metadata) in enumerate(chunks):
+        metadata = metadata or {}
+        tokens = metadata.get("tokens") or count_tokens(text)
+        if metadata.get("start") is None:
+            spans.append(_Span(rank, text, None, tokens))
+            continue
+        by_page.setdefault((metadata.get("source"), metadata.get("page")), []).append(
+            (metadata["start"], rank, text, tokens))
+    for page_chunks in by_page.values():
+        page_chunks.sort()
+        span = None
+        for start, rank, text, tokens in page_chunks:
+            if span is not None and start <= span.end:
+                span.absorb(rank, text, start, tokens)
+            else:
+                span = _Span(rank, text, start, tokens)
+                spans.append(span)
+    # chunks without offsets (ingested before offsets were stored) are only de-duplicated by content
+    spans.sort(key=lambda span: span.rank)
+    kept = []
+    for span in spans:
+        if not any(span.text in other.text for other in kept):
+            kept.append(span)
+    return kept
+
+def pack_context(chunks: list[tuple[str, str, dict]], budget: int) -> tuple[str, int]:
+    """
+    Context for the prompt, and its token count, from ranked (chunk id, text, metadata) chunks.
+
+    Overlapping chunks of a page are merged, duplicated text is dropped, and
+    spans are added best-ranked first while they fit in `budget` tokens. Token
+    counts come from the chunk metadata, so packing does no tokenization.
+    """
+    packed, used = [], 0
+    for span in _merge(chunks):
+        if used + span.tokens <= budget:
+            packed.append(span.text)
+            used += span.tokens
+        elif not packed:
+            # the best span alone is over budget: keep the share of it that fits
+            packed.append(span.text[:len(span.text) * budget // span.tokens])
+            used = budget
+    return "\n".join(packed), used
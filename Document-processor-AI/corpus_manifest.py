@@ -0,0 +1,53 @@
+# per-source manifest of the chunks ingested into genai_docs, used to re-ingest only what changed
+import os
+import json
+import hashlib
+import threading
+from typing import Optional
+from config import VECTOR_BACKEND, LOCAL_INDEX_DIR
+from vector_store import redis_client
+
+MANIFEST_PREFIX = "genai:corpus_manifest"
+
+def chunk_id(source: str, text: str) -> str:
+    """Content-derived chunk id: the same text from the same source always maps to the same key."""
+    return hashlib.sha256(f"{source}\n{text}".encode("utf-8")).hexdigest()[:32]
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# the local vector backend keeps its manifests next to its files instead of in Redis
+LOCAL_MANIFEST_PATH = os.path.join(LOCAL_INDEX_DIR, "manifests.json")
+_local_lock = threading.Lock()  # ingestion saves manifests from several threads
+
+def _load_local() -> dict:
+    try:
+        with open(LOCAL_MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def load(source: str) -> Optional[dict]:
+    """{"file_sha256": ..., "chunk_ids": [...], "parent_ids": [...]} recorded by the last ingestion of `source`."""
+    if VECTOR_BACKEND == "local":
+        return _load_local().get(source)
+    data = redis_client().get(f"{MANIFEST_PREFIX}:{source}")
+    return json.loads(data) if data else None
+
+def save(source: str, file_sha256: str, chunk_ids: list[str], parent_ids: list[str] | None = None) -> None:
+    manifest = {"file_sha256": file_sha256, "chunk_ids": list(dict.fromkeys(chunk_ids)),
+                "parent_ids": list(dict.fromkeys(parent_ids or []))}
+    if VECTOR_BACKEND == "local":
+        with _local_lock:
+            manifests = _load_local()
+            manifests[source] = manifest
+            tmp_path = f"{LOCAL_MANIFEST_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifests, f)
+            os.replace(tmp_path, LOCAL_MANIFEST_PATH)
+        return
+    redis_client().set(f"{MANIFEST_PREFIX}:{source}", json.dumps(manifest))
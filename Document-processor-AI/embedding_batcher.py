@@ -0,0 +1,66 @@
+# micro-batching of single-text embedding calls from concurrent requests
+import time
+import asyncio
+from typing import Awaitable, Callable, Optional
+import numpy as np
+from observability import record_embedding_batch
+
+class EmbeddingBatcher:
+    """
+    Collects texts from concurrent callers and embeds them in one request.
+
+    A batch is sent when it holds `max_size` texts, or `max_wait` seconds after
+    its first text arrived, whichever comes first. Identical texts in a batch
+    are embedded once. If the request fails, every caller in the batch gets the
+    error.
+    """
+
+    def __init__(self, embed: Callable[[list[str]], Awaitable[np.ndarray]], max_size: int = 64,
+                 max_wait: float = 0.005):
+        self._embed = embed  # (n, dims) vectors of n texts
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._pending: list[tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sending: set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Vector of one text, embedded together with the texts of other callers."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # batches belong to one event loop, e.g. a new one per asyncio.run
+            self._loop, self._pending, self._timer = loop, [], None
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self._loop.create_task(self._send(batch))
+            self._sending.add(task)  # the loop only keeps weak references to tasks
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: list[tuple[str, asyncio.Future, float]]) -> None:
+        sent = time.perf_counter()
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        record_embedding_batch(len(texts), [(sent - queued) * 1000 for _, _, queued in batch])
+        try:
+            vectors = await self._embed(texts)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        rows = {text: i for i, text in enumerate(texts)}
+        for text, future, _ in batch:
+            if not future.done():  # callers that were cancelled meanwhile
+                future.set_result(vectors[rows[text]])
@@ -0,0 +1,117 @@
+# embedding generation shared by the cache and the retrieval path
+import os
+import logging
+from typing import Optional
+import numpy as np
+from openai import OpenAI, AsyncOpenAI
+from langchain_core.embeddings import Embeddings
+from config import (EMBEDDING_DIMENSIONS, EMBEDDING_DIMENSION_REDUCTION, EMBEDDING_BATCH_ENABLED,
+                    EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_MAX_WAIT_MS)
+from quantization import truncate
+from vector_codec import decode
+from embedding_batcher import EmbeddingBatcher
+
+# Initialize OpenAI clients for embeddings, the async one serves the async request path
+_openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+_async_openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_MODEL_DIMENSIONS = 1536  # full output size of EMBEDDING_MODEL, EMBEDDING_DIMENSIONS may be smaller
+
+def _request(texts) -> dict:
+    # shorter vectors come from the API's `dimensions` parameter, or from slicing full ones here
+    options = {"model": EMBEDDING_MODEL, "input": texts, "encoding_format": "base64"}
+    if EMBEDDING_DIMENSIONS < EMBEDDING_MODEL_DIMENSIONS and EMBEDDING_DIMENSION_REDUCTION == "api":
+        options["dimensions"] = EMBEDDING_DIMENSIONS
+    return options
+
+def _vectors(response) -> np.ndarray:
+    vectors = np.stack([decode(item.embedding) for item in sorted(response.data, key=lambda item: item.index)])
+    if vectors.shape[1] > EMBEDDING_DIMENSIONS:
+        vectors = truncate(vectors, EMBEDDING_DIMENSIONS)
+    return vectors
+
+def _create(texts) -> np.ndarray:
+    """
+    (n, dims) float32 embeddings of the texts. They are requested as base64, so the
+    response carries the float32 bytes and is decoded without building Python floats.
+    """
+    return _vectors(_openai_client.embeddings.create(**_request(texts)))
+
+async def _acreate(texts) -> np.ndarray:
+    """Async `_create`, the event loop keeps serving other requests during the call."""
+    return _vectors(await _async_openai_client.embeddings.create(**_request(texts)))
+
+def get_embedding(text: str) -> Optional[np.ndarray]:
+    """Generate embedding for the given text using OpenAI."""
+    try:
+        return _create(text)[0]
+    except Exception as e:
+        logging.error(f"Error generating embedding: {e}")
+        return None
+
+# question embeddings of concurrent requests share one API request
+_batcher = EmbeddingBatcher(_acreate, EMBEDDING_BATCH_MAX_SIZE,
+                            EMBEDDING_BATCH_MAX_WAIT_MS / 1000) if EMBEDDING_BATCH_ENABLED else None
+
+async def aget_embedding(text: str) -> Optional[np.ndarray]:
+    """Async `get_embedding`, micro-batched with the calls of concurrent requests."""
+    try:
+        if _batcher is not None:
+            return await _batcher.embed(text)
+        return (await _acreate(text))[0]
+    except Exception as e:
+        logging.error(f"Error generating embedding: {e}")
+        return None
+
+async def aget_embeddings(texts: list[str]) -> np.ndarray:
+    """Async `get_embeddings`."""
+    return await _acreate(texts)
+
+def get_embeddings(texts: list[str]) -> np.ndarray:
+    """Embed a batch of texts in one request. Errors are raised, callers decide how to retry."""
+    return _create(texts)
+
+
+class CompactEmbeddings(Embeddings):
+    """LangChain adapter over this module, so the vector store embeds with the same dimensions as the cache."""
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return get_embeddings(texts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return _create(text)[0].tolist()
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return (await _acreate(texts)).tolist()
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await _acreate(text))[0].tolist()
+
+
+class QuestionEmbedding:
+    """
+    Request-scoped embedding of a question.
+
+    Created once per request in run_pipeline and handed to the cache lookup,
+    retrieval and the cache write. The vector is computed on first use, so an
+    exact-match cache hit never pays for an embedding call. The async pipeline
+    awaits `avector()` instead of reading `vector`.
+    """
+
+    def __init__(self, question: str):
+        self.question = question
+        self._vector: Optional[np.ndarray] = None
+        self._computed = False
+
+    @property
+    def vector(self) -> Optional[np.ndarray]:
+        if not self._computed:
+            self._vector = get_embedding(self.question)
+            self._computed = True
+        return self._vector
+
+    async def avector(self) -> Optional[np.ndarray]:
+        if not self._computed:
+            self._vector = await aget_embedding(self.question)
+            self._computed = True
+        return self._vector
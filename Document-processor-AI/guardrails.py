@@ -15,11 +15,11 @@ PII_PATTERNS = [
     (r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b", "[REDACTED_EMAIL]") # email
 ]
 
-def apply_guardrails(text: str) -> str:
+def redact(text: str) -> str:
     """
-    Apply guardrails to the text
+    Replace banned words and PII in the text. Nothing it replaces spans
+    whitespace, which lets stream_guard.py apply it to streamed text in pieces.
     """
-    original_text = text
     # 1. Check for banned words
     for word in BANNED_WORDS:
         if word.lower() in text.lower():
@@ -29,6 +29,14 @@ def apply_guardrails(text: str) -> str:
     # 2. Check for PII
     for pattern, replacement in PII_PATTERNS:
         text = re.sub(pattern, replacement, text)
+    return text
+
+def apply_guardrails(text: str) -> str:
+    """
+    Apply guardrails to the text
+    """
+    original_text = text
+    text = redact(text)
     
     if original_text != text:
         logger.info("Guardrails modified the output")
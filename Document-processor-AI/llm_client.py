@@ -1,9 +1,23 @@
 # llm block for prediction
+import time
+import random
+import asyncio
 import logging
+import threading
+from collections import deque
 from functools import lru_cache
+from typing import Optional
+import numpy as np
+import openai
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import AIMessage
-from config import TEMPERATURE, MAX_TOKENS,OPENAI_API_KEY
+from circuit_breaker import CircuitBreaker
+from observability import (track_llm_in_flight, record_llm_call, record_llm_retry, record_llm_hedge,
+                           record_llm_circuit)
+from config import (TEMPERATURE, MAX_TOKENS, OPENAI_API_KEY, FALLBACK_MODEL, REQUEST_DEADLINE_SECONDS,
+                    LLM_MAX_RETRIES, LLM_RETRY_BASE_SECONDS, LLM_RETRY_MAX_SECONDS, LLM_HEDGE_ENABLED,
+                    LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES, LLM_LATENCY_WINDOW, LLM_BREAKER_FAILURES,
+                    LLM_BREAKER_COOLDOWN_SECONDS)
 
 if OPENAI_API_KEY is None:
     raise RuntimeError("OPENAI_API_KEY is not set")
@@ -16,13 +30,255 @@ def _get_chat(model_name:str) -> ChatOpenAI:
         temperature=TEMPERATURE,
         max_tokens=MAX_TOKENS,
         openai_api_key=OPENAI_API_KEY,
+        timeout=REQUEST_DEADLINE_SECONDS,
+        max_retries=0,  # retries follow the policy below, within the request's deadline
     )
 
-def call(model:str, prompt: str) -> str:
+# Call policy: deadline, retries with jittered backoff, hedging (async path) and a circuit breaker
+# per model that fails over to FALLBACK_MODEL.
+_breakers: dict[str, CircuitBreaker] = {}
+_latencies: dict[str, deque] = {}  # seconds of recent successful calls, per model
+_policy_lock = threading.Lock()
+
+def _breaker(model: str) -> CircuitBreaker:
+    with _policy_lock:
+        return _breakers.setdefault(model, CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECONDS))
+
+def _record_latency(model: str, seconds: float) -> None:
+    with _policy_lock:
+        _latencies.setdefault(model, deque(maxlen=LLM_LATENCY_WINDOW)).append(seconds)
+
+def _hedge_delay(model: str) -> Optional[float]:
+    """Seconds after which a duplicate request is sent, None while there are too few samples."""
+    with _policy_lock:
+        samples = list(_latencies.get(model, ()))
+    if not LLM_HEDGE_ENABLED or len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    return float(np.percentile(samples, LLM_HEDGE_PERCENTILE))
+
+def _candidates(model: str) -> list[str]:
+    return list(dict.fromkeys([model, FALLBACK_MODEL]))
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True  # APIConnectionError includes timeouts
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+
+def _deadline(deadline: Optional[float]) -> float:
+    # deadlines are time.monotonic() values
+    return deadline if deadline is not None else time.monotonic() + REQUEST_DEADLINE_SECONDS
+
+def _content(response: AIMessage) -> str:
+    logging.info(f"Response: {response.content}")
+    return response.content.strip()
+
+def _invoke(model: str, prompt: str, deadline: float) -> str:
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Deadline exceeded before calling {model}")
+        t0 = time.monotonic()
+        try:
+            response: AIMessage = _get_chat(model).invoke(prompt, timeout=remaining)
+        except Exception as e:
+            delay = _backoff(attempt)
+            if attempt == LLM_MAX_RETRIES or not _retryable(e) or time.monotonic() + delay >= deadline:
+                raise
+            logging.warning(f"{model} call failed ({e}), retrying in {delay:.2f}s")
+            record_llm_retry(model)
+            time.sleep(delay)
+            continue
+        _record_latency(model, time.monotonic() - t0)
+        return _content(response)
+
+def call(model:str, prompt: str, deadline: Optional[float] = None) -> str:
     # prompt --> assembled prompt from router.py
     # model --> model name from router.py
+    # deadline --> time.monotonic() by which the answer is needed, REQUEST_DEADLINE_SECONDS from now if not given
+    # sync path (CLI, cache warm-up): retries and fail-over, no hedging
     logging.info(f"Calling {model} with prompt: {prompt}")
-    chat = _get_chat(model)
-    response: AIMessage = chat.invoke(prompt)
-    logging.info(f"Response: {response.content}")
-    return response.content.strip()
+    deadline = _deadline(deadline)
+    error = None
+    for candidate in _candidates(model):
+        breaker = _breaker(candidate)
+        if not breaker.allow():
+            record_llm_call(candidate, "circuit_open")
+            continue
+        try:
+            answer = _invoke(candidate, prompt, deadline)
+        except TimeoutError as e:
+            _failed(candidate, breaker, e, "deadline")  # counts, or a half-open trial would hold its slot forever
+            raise
+        except Exception as e:
+            error = _failed(candidate, breaker, e)
+            continue
+        except BaseException:
+            breaker.release()  # cancelled or interrupted: no outcome either way
+            raise
+        _succeeded(candidate, breaker)
+        return answer
+    raise error or RuntimeError(f"No LLM available: circuit breakers of {_candidates(model)} are open")
+
+def _failed(model: str, breaker: CircuitBreaker, error: Exception, result: str = "error") -> Exception:
+    logging.warning(f"{model} call failed: {error}")
+    breaker.record_failure()
+    record_llm_call(model, result)
+    record_llm_circuit(model, breaker.state != "closed")
+    return error
+
+def _succeeded(model: str, breaker: CircuitBreaker) -> None:
+    breaker.record_success()
+    record_llm_call(model, "success")
+    record_llm_circuit(model, False)
+
+async def _ainvoke_once(model: str, prompt: str) -> AIMessage:
+    t0 = time.monotonic()
+    with track_llm_in_flight():
+        response: AIMessage = await _get_chat(model).ainvoke(prompt)
+    _record_latency(model, time.monotonic() - t0)
+    return response
+
+async def _ainvoke_hedged(model: str, prompt: str) -> AIMessage:
+    """
+    One request, plus a duplicate once the first is slower than the hedge percentile.
+    The first successful response wins and the other request is cancelled.
+    """
+    primary = asyncio.create_task(_ainvoke_once(model, prompt))
+    tasks = [primary]
+    try:  # cancelling this coroutine (deadline) cancels both requests
+        done, _ = await asyncio.wait(tasks, timeout=_hedge_delay(model))
+        if done:
+            return primary.result()
+        record_llm_hedge(model, "fired")
+        hedge = asyncio.create_task(_ainvoke_once(model, prompt))
+        tasks.append(hedge)
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    record_llm_hedge(model, "hedge_won" if task is hedge else "primary_won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def _ainvoke(model: str, prompt: str, deadline: float) -> str:
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Deadline exceeded before calling {model}")
+        try:
+            response = await asyncio.wait_for(_ainvoke_hedged(model, prompt), remaining)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Deadline exceeded while calling {model}")
+        except Exception as e:
+            delay = _backoff(attempt)
+            if attempt == LLM_MAX_RETRIES or not _retryable(e) or time.monotonic() + delay >= deadline:
+                raise
+            logging.warning(f"{model} call failed ({e}), retrying in {delay:.2f}s")
+            record_llm_retry(model)
+            await asyncio.sleep(delay)
+            continue
+        return _content(response)
+
+async def acall(model: str, prompt: str, deadline: Optional[float] = None) -> str:
+    # async variant for the /ask path, many calls can be in flight on one worker; adds hedging to call's policy
+    logging.info(f"Calling {model} with prompt: {prompt}")
+    deadline = _deadline(deadline)
+    error = None
+    for candidate in _candidates(model):
+        breaker = _breaker(candidate)
+        if not breaker.allow():
+            record_llm_call(candidate, "circuit_open")
+            continue
+        try:
+            answer = await _ainvoke(candidate, prompt, deadline)
+        except TimeoutError as e:
+            _failed(candidate, breaker, e, "deadline")  # counts, or a half-open trial would hold its slot forever
+            raise
+        except Exception as e:
+            error = _failed(candidate, breaker, e)
+            continue
+        except BaseException:
+            breaker.release()  # cancelled or interrupted: no outcome either way
+            raise
+        _succeeded(candidate, breaker)
+        return answer
+    raise error or RuntimeError(f"No LLM available: circuit breakers of {_candidates(model)} are open")
+
+async def _first_text(chunks) -> str:
+    async for chunk in chunks:
+        if chunk.content:
+            return chunk.content
+    return ""
+
+async def _aopen_stream(model: str, prompt: str, deadline: float):
+    """Starts a stream and waits for its first text, retried like _ainvoke: nothing has been sent yet."""
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Deadline exceeded before calling {model}")
+        chunks = _get_chat(model).astream(prompt)
+        try:
+            first = await asyncio.wait_for(_first_text(chunks), remaining)
+        except asyncio.TimeoutError:
+            await chunks.aclose()
+            raise TimeoutError(f"Deadline exceeded while calling {model}")
+        except Exception as e:
+            await chunks.aclose()
+            delay = _backoff(attempt)
+            if attempt == LLM_MAX_RETRIES or not _retryable(e) or time.monotonic() + delay >= deadline:
+                raise
+            logging.warning(f"{model} stream failed ({e}), retrying in {delay:.2f}s")
+            record_llm_retry(model)
+            await asyncio.sleep(delay)
+            continue
+        return chunks, first
+
+async def astream(model: str, prompt: str, deadline: Optional[float] = None):
+    # yields the answer text as the model generates it, for /ask/stream
+    # same policy as acall until the first text arrives (retries, breaker, fallback model, no hedging);
+    # after that a failure can only end the stream. The deadline covers the whole stream.
+    logging.info(f"Streaming {model} with prompt: {prompt}")
+    deadline = _deadline(deadline)
+    error = None
+    for candidate in _candidates(model):
+        breaker = _breaker(candidate)
+        if not breaker.allow():
+            record_llm_call(candidate, "circuit_open")
+            continue
+        with track_llm_in_flight():
+            try:
+                chunks, first = await _aopen_stream(candidate, prompt, deadline)
+            except TimeoutError as e:
+                _failed(candidate, breaker, e, "deadline")
+                raise
+            except Exception as e:
+                error = _failed(candidate, breaker, e)
+                continue
+            except BaseException:
+                breaker.release()  # cancelled or interrupted: no outcome either way
+                raise
+            _succeeded(candidate, breaker)
+            try:
+                if first:
+                    yield first
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), deadline - time.monotonic())
+                    except StopAsyncIteration:
+                        return
+                    except asyncio.TimeoutError:
+                        record_llm_call(candidate, "deadline")
+                        raise TimeoutError(f"Deadline exceeded while streaming {candidate}")
+                    if chunk.content:
+                        yield chunk.content
+            finally:
+                await chunks.aclose()
+    raise error or RuntimeError(f"No LLM available: circuit breakers of {_candidates(model)} are open")
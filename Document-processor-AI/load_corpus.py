@@ -1,29 +1,317 @@
-# file to load the data to vector store (one time run)
-from vector_store import add_documents
+# file to load the data to vector store
+# a single PDF is streamed in checkpointed batches, many PDFs are parsed across a process pool
+# chunk ids are content hashes, so re-running only embeds new chunks and deletes removed ones
+# small chunks are embedded for search, the larger parent section they belong to is stored once for context
+import os
+import glob
+import json
+import asyncio
+import time
+import logging
+import argparse
+import resource
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterator, Optional
+import redis
+import corpus_manifest
+from bm25_index import BM25Index
+from vector_store import add_embedded, add_parents, delete_ids, delete_parents, existing_ids, optimize_index
+from embeddings import get_embeddings
+from context_packer import count_tokens
+from cache_version import bump_generation
+from config import (BM25_INDEX_DIR, BM25_MAX_SEGMENTS, BM25_MAX_DELETED_RATIO, INGEST_PARENT_CHUNK_SIZE, INGEST_CHUNK_SIZE, INGEST_CHUNK_OVERLAP, INGEST_BATCH_SIZE, INGEST_CHECKPOINT_PATH,
+                    INGEST_WORKERS, INGEST_MAX_CONCURRENT_REQUESTS, INGEST_MAX_REQUESTS_PER_SECOND)
 from langchain_community.document_loaders.parsers.pdf import PyPDFParser
-from langchain_core.documents.base import Blob
+from langchain_core.documents.base import Blob, Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-blob = Blob.from_path("agentic_ai_demo.pdf")
-parser = PyPDFParser()
-documents = parser.lazy_parse(blob)
+# lexical index for hybrid retrieval, fed with the same chunk ids as the vector store
+lexical_index = BM25Index(BM25_INDEX_DIR, max_segments=BM25_MAX_SEGMENTS, max_deleted_ratio=BM25_MAX_DELETED_RATIO)
 
-docs = []
-for doc in documents:
-    docs.append(doc)
-print(docs)
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=40)
-chunks = text_splitter.split_documents(docs)
+def iter_sections(path: str, parent_size: int = INGEST_PARENT_CHUNK_SIZE, chunk_size: int = INGEST_CHUNK_SIZE,
+                  chunk_overlap: int = INGEST_CHUNK_OVERLAP) -> Iterator[tuple[Document, list[Document]]]:
+    """Parent sections of a PDF with their chunks, one page parsed and split at a time."""
+    # start offsets let retrieval merge neighbouring sections of a page back together
+    parent_splitter = RecursiveCharacterTextSplitter(chunk_size=parent_size, chunk_overlap=0, add_start_index=True)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                                   add_start_index=True)
+    for page in PyPDFParser().lazy_parse(Blob.from_path(path)):
+        for section in parent_splitter.split_documents([page]):
+            chunks = text_splitter.split_documents([section])
+            for chunk in chunks:
+                chunk.metadata["start_index"] += section.metadata["start_index"]
+            yield section, chunks
 
-for i, chunk in enumerate(chunks):
-    print(f"Chunk {i+1}: {chunk.page_content}...")
-    print("-"*100)
-# add the documents
-add_documents([chunk.page_content for chunk in chunks])
+def chunk_metadata(source: str, chunk: Document) -> dict:
+    """Metadata stored with a chunk: where it sits in the source, and its token count for context packing."""
+    return {"source": source, "page": chunk.metadata.get("page"), "start": chunk.metadata.get("start_index"),
+            "tokens": count_tokens(chunk.page_content)}
 
-print("Documents added to vector store")
+Record = tuple[str, str, dict]  # (id, text, metadata)
 
+def iter_records(path: str) -> Iterator[tuple[Record, list[Record]]]:
+    """Each parent section of a PDF with its chunks, as (id, text, metadata) records."""
+    source = os.path.abspath(path)
+    for section, chunks in iter_sections(path):
+        parent_id = corpus_manifest.chunk_id(source, section.page_content)
+        # chunk ids are namespaced by their parent, so a changed section gets new chunks
+        yield ((parent_id, section.page_content, chunk_metadata(source, section)),
+               [(corpus_manifest.chunk_id(parent_id, chunk.page_content), chunk.page_content,
+                 {**chunk_metadata(source, chunk), "parent_id": parent_id}) for chunk in chunks])
 
+def batched(items, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
+def _fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
 
+def load_checkpoint(checkpoint_path: str, source: str) -> int:
+    """Chunks of `source` already written by an interrupted run, 0 if it changed since."""
+    try:
+        with open(checkpoint_path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return 0
+    if checkpoint.get("source") != source or checkpoint.get("fingerprint") != _fingerprint(source):
+        return 0
+    return int(checkpoint.get("chunks_done", 0))
 
+def save_checkpoint(checkpoint_path: str, source: str, chunks_done: int) -> None:
+    # write-then-rename, so a crash mid-write never leaves a truncated checkpoint
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"source": source, "fingerprint": _fingerprint(source), "chunks_done": chunks_done}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def _unchanged(path: str) -> tuple[str, str, Optional[dict], bool]:
+    """(source, file digest, previous manifest, whether the file is unchanged since that manifest)."""
+    source = os.path.abspath(path)
+    digest = corpus_manifest.file_digest(path)
+    manifest = corpus_manifest.load(source)
+    return source, digest, manifest, manifest is not None and manifest["file_sha256"] == digest
+
+def _remove_stale(source: str, digest: str, manifest: Optional[dict], ids: list[str], parent_ids: list[str]) -> int:
+    """Delete chunks and sections the previous ingestion wrote but the file no longer has, then record the new manifest."""
+    stale = sorted(set(manifest["chunk_ids"]) - set(ids)) if manifest else []
+    delete_ids(stale)
+    lexical_index.record(deleted=stale)
+    delete_parents(sorted(set(manifest.get("parent_ids", [])) - set(parent_ids)) if manifest else [])
+    corpus_manifest.save(source, digest, ids, parent_ids)
+    return len(stale)
+
+def ingest(path: str, batch_size: int = INGEST_BATCH_SIZE, checkpoint_path: str = INGEST_CHECKPOINT_PATH,
+           resume: bool = True) -> int:
+    """
+    Embed and write the new or changed chunks of a PDF batch by batch, and
+    delete the chunks it no longer contains. An unchanged file is skipped
+    without parsing it.
+
+    The next batch is embedded while the previous one is written to Redis, and
+    the checkpoint is advanced after every write, so an interrupted run picks up
+    at the first unwritten batch.
+
+    Returns:
+        Number of chunks written or deleted by this run
+    """
+    source, digest, manifest, unchanged = _unchanged(path)
+    if unchanged:
+        print(f"Unchanged since last ingestion, skipped {path}")
+        return 0
+    skip = load_checkpoint(checkpoint_path, path) if resume else 0
+    if skip:
+        logging.info(f"Resuming {path} after {skip} chunks")
+    done, written = 0, 0
+    ids, parent_ids, seen = [], {}, set()
+    t0 = time.time()
+
+    def write(parents, chunks, vectors, chunks_done):
+        # sections first, so every stored chunk can be expanded to its parent
+        add_parents(parents)
+        add_embedded([text for _, text, _ in chunks], vectors, metadatas=[metadata for _, _, metadata in chunks],
+                     ids=[id_ for id_, _, _ in chunks])
+        lexical_index.record(chunks)
+        save_checkpoint(checkpoint_path, path, chunks_done)
+
+    records = ((parent, chunk) for parent, chunks in iter_records(path) for chunk in chunks)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer") as writer:
+        pending = None
+        for batch in batched(records, batch_size):
+            batch_ids = [chunk[0] for _, chunk in batch]
+            ids.extend(batch_ids)
+            parent_ids.update((parent[0], None) for parent, _ in batch)
+            done += len(batch)
+            if done <= skip:
+                continue
+            # content ids make writes idempotent: chunks already stored are never embedded again
+            present = existing_ids(batch_ids)
+            new = {chunk[0]: (parent, chunk) for parent, chunk in batch if chunk[0] not in present and chunk[0] not in seen}
+            seen.update(batch_ids)
+            if not new:
+                continue
+            chunks = [chunk for _, chunk in new.values()]
+            parents = list({parent[0]: parent for parent, _ in new.values()}.values())
+            vectors = get_embeddings([text for _, text, _ in chunks])
+            if pending is not None:
+                pending.result()  # one write in flight, at most two batches held in memory
+            pending = writer.submit(write, parents, chunks, vectors, done)
+            written += len(new)
+            logging.info(f"Processed {done} chunks, embedded {written} ({done / max(time.time() - t0, 1e-9):.1f} chunks/sec)")
+        if pending is not None:
+            pending.result()
+
+    deleted = _remove_stale(source, digest, manifest, ids, list(parent_ids))
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    elapsed = time.time() - t0
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Ingested {path}: {written} chunks written, {deleted} deleted, {done - written} unchanged in {elapsed:.1f}s "
+          f"({done / max(elapsed, 1e-9):.1f} chunks/sec, peak RSS {peak_rss_mb:.0f} MB)")
+    return written + deleted
+
+def find_pdfs(source: str) -> list[str]:
+    """PDFs under a directory, matching a glob, or the file itself."""
+    if os.path.isdir(source):
+        source = os.path.join(source, "**", "*.pdf")
+    return sorted(glob.glob(source, recursive=True))
+
+def chunk_records(path: str) -> list[tuple[Record, list[Record]]]:
+    """Parent sections of one PDF with their chunks, run in the parsing process pool."""
+    return list(iter_records(path))
+
+
+class RequestLimiter:
+    """Caps embedding requests in flight and their start rate."""
+
+    def __init__(self, max_concurrent: int, per_second: float):
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        async with self._lock:
+            delay = self._next_start - time.monotonic()
+            self._next_start = max(self._next_start, time.monotonic()) + self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __aexit__(self, *exc):
+        self._semaphore.release()
+
+
+async def _ingest_file(path: str, pool: ProcessPoolExecutor, files: asyncio.Semaphore,
+                       limiter: RequestLimiter, batch_size: int) -> Optional[tuple[int, int]]:
+    """(chunks written, chunks deleted), or None if the file is unchanged."""
+    # the file slot bounds how many parsed-but-unwritten files are held in memory
+    async with files:
+        source, digest, manifest, unchanged = await asyncio.to_thread(_unchanged, path)
+        if unchanged:
+            return None
+        sections = await asyncio.get_running_loop().run_in_executor(pool, chunk_records, path)
+        ids = [chunk[0] for _, chunks in sections for chunk in chunks]
+        present = await asyncio.to_thread(existing_ids, ids)
+        new = {chunk[0]: chunk for _, chunks in sections for chunk in chunks if chunk[0] not in present}
+        # sections first, so every stored chunk can be expanded to its parent
+        new_parents = {chunk[2]["parent_id"] for chunk in new.values()}
+        await asyncio.to_thread(add_parents, [parent for parent, _ in sections if parent[0] in new_parents])
+
+        async def embed_and_write(batch):
+            async with limiter:
+                chunks = [new[id_] for id_ in batch]
+                batch_texts = [text for _, text, _ in chunks]
+                vectors = await asyncio.to_thread(get_embeddings, batch_texts)
+                await asyncio.to_thread(add_embedded, batch_texts, vectors, [m for _, _, m in chunks], batch)
+                await asyncio.to_thread(lexical_index.record, chunks)
+
+        await asyncio.gather(*(embed_and_write(batch) for batch in batched(new, batch_size)))
+        parent_ids = [parent[0] for parent, _ in sections]
+        deleted = await asyncio.to_thread(_remove_stale, source, digest, manifest, ids, parent_ids)
+        return len(new), deleted
+
+async def _ingest_many(paths: list[str], workers: int, batch_size: int, max_concurrent: int,
+                       per_second: float) -> dict[str, Optional[tuple[int, int]] | Exception]:
+    limiter = RequestLimiter(max_concurrent, per_second)
+    files = asyncio.Semaphore(workers * 2)
+    results: dict[str, Optional[tuple[int, int]] | Exception] = {}
+
+    async def run(index, path):
+        t0 = time.time()
+        try:
+            results[path] = await _ingest_file(path, pool, files, limiter, batch_size)
+            if results[path] is None:
+                print(f"[{index}/{len(paths)}] unchanged {path}")
+            else:
+                written, deleted = results[path]
+                print(f"[{index}/{len(paths)}] ok        {path}: {written} written, {deleted} deleted in {time.time() - t0:.1f}s")
+        except Exception as e:
+            # one bad file does not stop the run, it is reported in the summary
+            results[path] = e
+            print(f"[{index}/{len(paths)}] failed    {path}: {e}")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        await asyncio.gather(*(run(i, path) for i, path in enumerate(paths, 1)))
+    return results
+
+def ingest_many(paths: list[str], workers: int = INGEST_WORKERS, batch_size: int = INGEST_BATCH_SIZE,
+                max_concurrent: int = INGEST_MAX_CONCURRENT_REQUESTS,
+                per_second: float = INGEST_MAX_REQUESTS_PER_SECOND) -> int:
+    """
+    Ingest many PDFs: parsing and chunking run across a process pool, embedding
+    and writes go through a bounded async stage capped at `max_concurrent`
+    requests in flight and `per_second` requests started per second.
+
+    Returns:
+        Number of chunks written or deleted
+    """
+    t0 = time.time()
+    results = asyncio.run(_ingest_many(paths, workers, batch_size, max_concurrent, per_second))
+    elapsed = time.time() - t0
+    changes = [result for result in results.values() if isinstance(result, tuple)]
+    written = sum(w for w, _ in changes)
+    deleted = sum(d for _, d in changes)
+    unchanged = sum(1 for result in results.values() if result is None)
+    failed = [path for path, result in results.items() if isinstance(result, Exception)]
+    print(f"Ingested {len(changes)} changed files ({unchanged} unchanged, {len(failed)} failed) in {elapsed:.1f}s: "
+          f"{written} chunks written, {deleted} deleted "
+          f"({written / max(elapsed, 1e-9):.1f} chunks/sec, {len(paths) / max(elapsed, 1e-9):.2f} files/sec)")
+    for path in failed:
+        print(f"  failed: {path}: {results[path]}")
+    return written + deleted
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Load PDFs into the vector store")
+    parser.add_argument("--source", type=str, default="agentic_ai_demo.pdf", help="PDF file, directory or glob to ingest")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Chunks per embedding request and Redis write")
+    parser.add_argument("--checkpoint", type=str, default=INGEST_CHECKPOINT_PATH, help="Checkpoint file used to resume a single-file run")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and ingest from the first chunk")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Parsing processes for a multi-file run")
+    parser.add_argument("--concurrency", type=int, default=INGEST_MAX_CONCURRENT_REQUESTS, help="Embedding requests in flight")
+    parser.add_argument("--rate", type=float, default=INGEST_MAX_REQUESTS_PER_SECOND, help="Embedding requests started per second")
+    args = parser.parse_args()
+
+    paths = find_pdfs(args.source)
+    if not paths:
+        parser.error(f"No PDFs found at {args.source}")
+    if len(paths) == 1:
+        changed = ingest(paths[0], args.batch_size, args.checkpoint, resume=not args.restart)
+    else:
+        changed = ingest_many(paths, args.workers, args.batch_size, args.concurrency, args.rate)
+
+    if changed:
+        optimize_index()
+        lexical_index.commit()
+        # cached answers were produced from the previous corpus, start a new generation
+        try:
+            bump_generation()
+            print("Cache version bumped")
+        except redis.RedisError as e:
+            print(f"Cache version not bumped, Redis is unavailable: {e}")
+
+# python load_corpus.py --source agentic_ai_demo.pdf --batch-size 64
+# python load_corpus.py --source "corpus/**/*.pdf" --workers 8 --concurrency 4 --rate 5
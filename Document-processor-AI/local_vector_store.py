@@ -0,0 +1,431 @@
+# local vector store backend: memory-mapped float32 embeddings with a sidecar chunk store
+import os
+import glob
+import json
+import mmap
+import logging
+import threading
+from typing import Optional
+import numpy as np
+from quantization import code_layout, quantize, approximate_scores, top_candidates
+
+META_FILE = "meta.json"  # row count, dimensions, deleted rows, file generation, revision; replaced atomically
+# data files carry the generation in their name, so a rebuild never rewrites files a reader has mapped
+EMBEDDINGS_FILE = "embeddings.{generation}.f32"  # (rows, dim) unit-length float32, appended in place
+CHUNKS_FILE = "chunks.{generation}.jsonl"  # {"id", "text", "metadata"} per row
+OFFSETS_FILE = "offsets.{generation}.i64"  # byte offset of each row in the chunks file, plus the end offset
+IVF_CENTROIDS_FILE = "ivf_centroids.{generation}.npy"
+IVF_LISTS_FILE = "ivf_lists.{generation}.npy"  # first row of each list; rows are stored grouped by list
+# rows appended after the build, assigned to the existing lists: first row of each list, then the rows by list
+IVF_TAIL_FILE = "ivf_tail.{generation}.{rows}.npy"
+CODES_FILE = "codes.{generation}.bin"  # int8 or binary codes per row, scanned instead of the floats when quantized
+SCALES_FILE = "scales.{generation}.f32"  # per-row int8 code scale
+GENERATION_FILES = (EMBEDDINGS_FILE, CHUNKS_FILE, OFFSETS_FILE, IVF_CENTROIDS_FILE, IVF_LISTS_FILE, CODES_FILE,
+                    SCALES_FILE)
+OPEN_RETRIES = 3  # re-reads of meta.json when a rewrite retires a generation while it is being mapped
+
+
+class _Mapping:
+    """One published version of the files, replaced as a whole so readers never see a mix."""
+
+    def __init__(self, meta: dict, matrix=None, codes=None, offsets=None, chunks=None, ivf=None, tail=None):
+        self.meta = meta
+        self.matrix: Optional[np.ndarray] = matrix
+        self.codes: Optional[tuple[np.ndarray, np.ndarray]] = codes  # (codes, scales) when quantized
+        self.offsets: Optional[np.ndarray] = offsets
+        self.chunks: Optional[mmap.mmap] = chunks
+        self.ivf: Optional[tuple[np.ndarray, np.ndarray]] = ivf
+        self.tail: Optional[tuple[np.ndarray, np.ndarray]] = tail  # (first row of each list, rows) assigned since the build
+        self.deleted = np.zeros(meta["count"], dtype=bool)
+        self.deleted[meta["deleted"]] = True
+
+    def row(self, row: int) -> dict:
+        return json.loads(self.chunks[int(self.offsets[row]):int(self.offsets[row + 1])])
+
+
+class LocalVectorStore:
+    """
+    Chunk embeddings in a flat float32 file that every worker maps read-only,
+    so the pages are shared through the OS page cache instead of copied per process.
+
+    Small corpora are searched exactly with one matrix-vector product. Once an
+    IVF index is built, a lookup scores the centroids, scans only the `probes`
+    closest lists and then the rows appended since the build. `optimize`
+    assigns appended rows to the existing lists and only rewrites the files
+    once the rows changed since the last rewrite pass a given fraction.
+
+    With `quantization` set to "int8" or "binary", lookups scan a codes file
+    4x or 32x smaller than the floats and rescore the best `rescore_candidates`
+    against the float rows, so only the codes need to stay in the page cache.
+    A new scheme applies to an existing index from its next IVF build.
+    """
+
+    def __init__(self, path: str, probes: int = 32, quantization: str = "float32", rescore_candidates: int = 64):
+        code_layout(1, quantization)
+        self.path = path
+        self.probes = probes
+        self.quantization = quantization
+        self.rescore_candidates = rescore_candidates
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # add, delete and build_ivf of this process, one at a time
+        self._meta_stamp: Optional[tuple] = None
+        self._mapping = _Mapping({"generation": 0, "count": 0, "dim": 0, "deleted": [], "ivf_rows": 0,
+                                  "quantization": quantization})
+        self._ids: Optional[dict[str, int]] = None  # id -> row, only built by the writer
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def _meta(self) -> dict:
+        return self._mapping.meta
+
+    def _file(self, name: str, generation: Optional[int] = None) -> str:
+        generation = self._meta["generation"] if generation is None else generation
+        return os.path.join(self.path, name.format(generation=generation))
+
+    # -- reading -----------------------------------------------------------
+
+    def _refresh(self) -> None:
+        """Re-map the files if a writer published a new meta.json since the last call."""
+        for _ in range(OPEN_RETRIES):
+            try:
+                stat = os.stat(self._file(META_FILE))
+            except FileNotFoundError:
+                return
+            # every publish is a new file (os.replace), the inode changes even within one mtime tick
+            stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if stamp == self._meta_stamp:
+                return
+            try:
+                with self._lock:
+                    self._map(stamp)
+                return
+            except FileNotFoundError:
+                continue  # a newer rewrite retired the generation being mapped: read its meta.json
+        logging.warning(f"Local index in {self.path} changed while it was mapped, serving generation "
+                        f"{self._meta['generation']} until the next lookup")
+
+    def _map(self, stamp: tuple) -> None:
+        with open(self._file(META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        count, dim, generation = meta["count"], meta["dim"], meta["generation"]
+        scheme = meta.get("quantization", "float32")
+        matrix = offsets = chunks = ivf = codes = None
+        if count and scheme != "float32":
+            columns, dtype = code_layout(dim, scheme)
+            codes = (np.memmap(self._file(CODES_FILE, generation), dtype=dtype, mode="r", shape=(count, columns)),
+                     np.memmap(self._file(SCALES_FILE, generation), dtype=np.float32, mode="r", shape=(count,)))
+        if count:
+            matrix = np.memmap(self._file(EMBEDDINGS_FILE, generation), dtype=np.float32,
+                               mode="r", shape=(count, dim))
+            offsets = np.memmap(self._file(OFFSETS_FILE, generation), dtype=np.int64,
+                                mode="r", shape=(count + 1,))
+            with open(self._file(CHUNKS_FILE, generation), "rb") as f:
+                chunks = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        tail = None
+        if meta["ivf_rows"]:
+            ivf = (np.load(self._file(IVF_CENTROIDS_FILE, generation), mmap_mode="r"),
+                   np.load(self._file(IVF_LISTS_FILE, generation)))
+            if meta.get("ivf_tail"):
+                lists = len(ivf[0])
+                packed = np.load(self._tail_file(generation, meta["ivf_tail"]))
+                tail = (packed[:lists + 1], packed[lists + 1:])
+        # one assignment: a concurrent search uses either the old or the new mapping
+        self._mapping = _Mapping(meta, matrix, codes, offsets, chunks, ivf, tail)
+        self._meta_stamp = stamp
+
+    def _tail_file(self, generation: int, rows: int) -> str:
+        return os.path.join(self.path, IVF_TAIL_FILE.format(generation=generation, rows=rows))
+
+    def __len__(self) -> int:
+        self._refresh()
+        return self._meta["count"] - len(self._meta["deleted"])
+
+    @property
+    def revision(self) -> int:
+        """Counter bumped by every published change (add, delete, rewrite), for caches of search results."""
+        self._refresh()
+        return self._meta.get("revision", 0)
+
+    def _ranges(self, mapping: _Mapping, query: np.ndarray) -> tuple[list[tuple[int, int]], np.ndarray]:
+        """
+        Row ranges to scan: everything, or the closest IVF lists plus the rows appended since
+        the build that were not assigned to a list yet. Also the assigned rows of those lists.
+        """
+        count = mapping.meta["count"]
+        if mapping.ivf is None:
+            return [(0, count)], np.zeros(0, dtype=np.int64)
+        centroids, starts = mapping.ivf
+        lists = np.sort(np.argsort(-(centroids @ query))[:self.probes])
+        ranges = [(int(starts[i]), int(starts[i + 1])) for i in lists]
+        if mapping.tail is None:
+            return ranges + [(mapping.meta["ivf_rows"], count)], np.zeros(0, dtype=np.int64)
+        tail_starts, tail_rows = mapping.tail
+        assigned = np.concatenate([tail_rows[tail_starts[i]:tail_starts[i + 1]] for i in lists])
+        return ranges + [(mapping.meta["ivf_tail"], count)], assigned
+
+    def search(self, embedding, k: int) -> list[tuple[dict, float]]:
+        """
+        Returns:
+            (chunk record, cosine similarity) of the k closest chunks, best first
+        """
+        self._refresh()
+        mapping = self._mapping
+        if mapping.matrix is None:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        # contiguous slices of the mapped file, no copy of the rows before the product;
+        # rows assigned to a list after the build are gathered, there are few of them
+        ranges, assigned = self._ranges(mapping, query)
+        ranges = [(start, end) for start, end in ranges if end > start]
+        rows = np.concatenate([np.arange(start, end) for start, end in ranges] + [assigned])
+        if mapping.codes is None:
+            scores = np.concatenate([mapping.matrix[start:end] @ query for start, end in ranges]
+                                    + [mapping.matrix[assigned] @ query])
+        else:
+            codes, scales = mapping.codes
+            scheme = mapping.meta["quantization"]
+            scores = np.concatenate([approximate_scores(codes[start:end], scales[start:end], query, scheme)
+                                     for start, end in ranges]
+                                    + [approximate_scores(codes[assigned], scales[assigned], query, scheme)])
+        scores[mapping.deleted[rows]] = -np.inf
+        top = top_candidates(scores, k if mapping.codes is None else max(k, self.rescore_candidates))
+        if mapping.codes is not None and len(top):
+            # float rescoring reads only the candidate rows of the mapped file
+            rows = rows[top]
+            order = np.sort(rows)
+            scores = np.empty(len(rows), dtype=np.float32)
+            scores[np.argsort(rows)] = mapping.matrix[order] @ query
+            top = top_candidates(scores, k)
+        return [(mapping.row(int(rows[i])), float(scores[i])) for i in top]
+
+    # -- writing (one writer process at a time, e.g. load_corpus.py; its threads take _write_lock) --
+
+    def _id_rows(self) -> dict[str, int]:
+        self._refresh()
+        if self._ids is None:
+            mapping = self._mapping
+            deleted = set(mapping.meta["deleted"])
+            self._ids = {mapping.row(row)["id"]: row for row in range(mapping.meta["count"]) if row not in deleted}
+        return self._ids
+
+    def _publish(self, meta: dict) -> None:
+        meta = dict(meta, revision=self._meta.get("revision", 0) + 1)
+        tmp_path = self._file(f"{META_FILE}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._file(META_FILE))
+        self._refresh()
+
+    def existing_ids(self, ids: list[str]) -> set[str]:
+        with self._write_lock:
+            rows = self._id_rows()
+            return {id_ for id_ in ids if id_ in rows}
+
+    def _append(self, meta: dict, ids: list[str], texts: list[str], matrix: np.ndarray,
+                metadatas: list[dict]) -> None:
+        # data first, meta.json last: readers only ever see rows the meta count covers
+        new = meta["count"] == 0
+        generation = meta["generation"]
+        lines = [json.dumps({"id": id_, "text": text, "metadata": metadata}).encode("utf-8") + b"\n"
+                 for id_, text, metadata in zip(ids, texts, metadatas)]
+        with open(self._file(CHUNKS_FILE, generation), "wb" if new else "ab") as f:
+            start = f.tell()
+            f.writelines(lines)
+        with open(self._file(OFFSETS_FILE, generation), "wb" if new else "ab") as f:
+            if new:
+                np.zeros(1, dtype=np.int64).tofile(f)
+            (start + np.cumsum([len(line) for line in lines], dtype=np.int64)).tofile(f)
+        with open(self._file(EMBEDDINGS_FILE, generation), "wb" if new else "ab") as f:
+            matrix.tofile(f)
+        if meta["quantization"] != "float32":
+            codes, scales = quantize(matrix, meta["quantization"])
+            with open(self._file(CODES_FILE, generation), "wb" if new else "ab") as f:
+                codes.tofile(f)
+            with open(self._file(SCALES_FILE, generation), "wb" if new else "ab") as f:
+                scales.tofile(f)
+        meta["count"] += len(ids)
+        meta["dim"] = matrix.shape[1]
+
+    def add(self, ids: list[str], texts: list[str], vectors, metadatas: Optional[list[dict]] = None) -> list[str]:
+        """Append chunks; an id that is already stored is replaced."""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        with self._write_lock:
+            self._add(ids, texts, matrix, metadatas)
+        return list(ids)
+
+    def _add(self, ids: list[str], texts: list[str], matrix: np.ndarray, metadatas: Optional[list[dict]]) -> None:
+        rows = self._id_rows()
+        meta = dict(self._meta, deleted=list(self._meta["deleted"]))
+        meta.setdefault("quantization", "float32")  # indexes written before quantization existed
+        if not meta["count"]:
+            meta["quantization"] = self.quantization
+        if meta["count"] and meta["dim"] != matrix.shape[1]:
+            raise ValueError(f"Embedding dimensions {matrix.shape[1]} do not match the index ({meta['dim']})")
+        meta["deleted"].extend(rows[id_] for id_ in ids if id_ in rows)
+        first_row = meta["count"]
+        self._append(meta, ids, texts, matrix, metadatas or [{}] * len(ids))
+        rows.update((id_, first_row + offset) for offset, id_ in enumerate(ids))
+        self._publish(meta)
+
+    def delete(self, ids: list[str]) -> None:
+        with self._write_lock:
+            rows = self._id_rows()
+            meta = dict(self._meta, deleted=list(self._meta["deleted"]))
+            meta["deleted"].extend(rows.pop(id_) for id_ in ids if id_ in rows)
+            self._publish(meta)
+
+    def build_ivf(self, lists: Optional[int] = None, iterations: int = 10, seed: int = 0) -> None:
+        """
+        Drop deleted rows and (re)build the IVF lists with spherical k-means.
+        Rows are rewritten grouped by list under a new generation, so each probed
+        list is one contiguous read and readers switch over on their next lookup.
+        """
+        with self._write_lock:
+            self._rewrite(lists, iterations, seed)
+
+    def optimize(self, min_ivf_rows: int, rebuild_ratio: float) -> str:
+        """
+        After ingestion, do the least work that keeps lookups bounded:
+
+        - from `min_ivf_rows` live rows, build the IVF lists, or rebuild them once the
+          rows appended and deleted since the build exceed `rebuild_ratio` of the live rows;
+          below that, assign the appended rows to the existing lists
+        - below `min_ivf_rows`, drop deleted rows once they exceed `rebuild_ratio` of all rows
+
+        Returns:
+            "build", "assign", "compact" or "none"
+        """
+        with self._write_lock:
+            self._refresh()
+            meta = self._meta
+            live = meta["count"] - len(meta["deleted"])
+            if live >= min_ivf_rows:
+                changed = meta["count"] - meta["ivf_rows"] + len(meta["deleted"])
+                if not meta["ivf_rows"] or changed > rebuild_ratio * live:
+                    self._rewrite(None, 10, 0)
+                    return "build"
+                if meta["count"] > max(meta.get("ivf_tail", 0), meta["ivf_rows"]):
+                    self._assign_tail()
+                    return "assign"
+            elif len(meta["deleted"]) > rebuild_ratio * meta["count"]:
+                self._rewrite(None, 10, 0, ivf=False)
+                return "compact"
+            return "none"
+
+    def _assign_tail(self) -> None:
+        """Assign the rows appended since the build to the nearest existing list, without moving any row."""
+        mapping = self._mapping
+        meta = mapping.meta
+        centroids, _ = mapping.ivf
+        start, end = meta["ivf_rows"], meta["count"]
+        assign = np.concatenate([np.argmax(np.asarray(mapping.matrix[i:min(i + 65536, end)]) @ centroids.T, axis=1)
+                                 for i in range(start, end, 65536)])
+        order = np.argsort(assign, kind="stable")
+        starts = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+        np.save(self._tail_file(meta["generation"], end), np.concatenate([starts, start + order]).astype(np.int64))
+        retired = meta.get("retired_tail", 0)
+        self._publish(dict(meta, deleted=list(meta["deleted"]), ivf_tail=end, retired_tail=meta.get("ivf_tail", 0)))
+        if retired:
+            os.remove(self._tail_file(meta["generation"], retired))
+        logging.info(f"Assigned {end - start} chunks to {len(centroids)} existing IVF lists")
+
+    def _rewrite(self, lists: Optional[int], iterations: int, seed: int, ivf: bool = True) -> None:
+        self._refresh()
+        mapping = self._mapping
+        live = np.flatnonzero(~mapping.deleted)
+        if not len(live):
+            return
+        matrix = np.asarray(mapping.matrix[live])
+        order = np.arange(len(live))
+        if ivf:
+            lists = lists or max(1, int(4 * np.sqrt(len(live))))
+            rng = np.random.default_rng(seed)
+            sample = matrix[rng.choice(len(live), min(len(live), lists * 64), replace=False)]
+            centroids = sample[rng.choice(len(sample), min(lists, len(sample)), replace=False)].copy()
+            for _ in range(iterations):
+                assign = np.argmax(sample @ centroids.T, axis=1)
+                for i in range(len(centroids)):
+                    members = sample[assign == i]
+                    if len(members):
+                        centroid = members.sum(axis=0)
+                        centroids[i] = centroid / (np.linalg.norm(centroid) or 1.0)
+            assign = np.concatenate([np.argmax(matrix[i:i + 65536] @ centroids.T, axis=1)
+                                     for i in range(0, len(matrix), 65536)])
+            order = np.argsort(assign, kind="stable")
+        records = [mapping.row(int(live[row])) for row in order]
+
+        old_generation = mapping.meta["generation"]
+        meta = {"generation": old_generation + 1, "count": 0, "dim": matrix.shape[1], "deleted": [],
+                "ivf_rows": len(order) if ivf else 0, "quantization": self.quantization,
+                "retired": old_generation}
+        self._append(meta, [r["id"] for r in records], [r["text"] for r in records], matrix[order],
+                     [r["metadata"] for r in records])
+        if ivf:
+            np.save(self._file(IVF_CENTROIDS_FILE, meta["generation"]), centroids)
+            np.save(self._file(IVF_LISTS_FILE, meta["generation"]),
+                    np.searchsorted(assign[order], np.arange(len(centroids) + 1)).astype(np.int64))
+        self._ids = None
+        retired = mapping.meta.get("retired")
+        self._publish(meta)
+        # the generation retired by the previous rewrite goes now: readers had a whole rewrite to move off it
+        if retired is not None:
+            paths = [self._file(name, retired) for name in GENERATION_FILES]
+            for path in paths + glob.glob(self._tail_file(retired, "*")):
+                if os.path.exists(path):
+                    os.remove(path)
+        if ivf:
+            logging.info(f"Built IVF index over {len(order)} chunks with {len(centroids)} lists")
+        else:
+            logging.info(f"Compacted the local index to {len(order)} chunks")
+
+
+PARENTS_FILE = "parents.jsonl"  # log of added and deleted parent sections
+
+
+class LocalParentStore:
+    """
+    Parent sections for the local backend, in an append-only log next to the
+    vector files. Readers replay it into a dict whenever the file changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.join(path, PARENTS_FILE)
+        self._lock = threading.Lock()
+        self._stamp: Optional[tuple] = None
+        self._parents: dict[str, tuple[str, dict]] = {}
+        os.makedirs(path, exist_ok=True)
+
+    def _refresh(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            parents = {}
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if "add" in entry:
+                        parent_id, text, metadata = entry["add"]
+                        parents[parent_id] = (text, metadata)
+                    else:
+                        parents.pop(entry["del"], None)
+            self._parents, self._stamp = parents, stamp
+
+    def get(self, ids: list[str]) -> dict[str, tuple[str, dict]]:
+        """Parent id -> (text, metadata) of the stored ones among `ids`."""
+        self._refresh()
+        return {id_: self._parents[id_] for id_ in ids if id_ in self._parents}
+
+    def add(self, parents: list[tuple[str, str, dict]]) -> None:
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps({"add": list(parent)}) + "\n" for parent in parents)
+
+    def delete(self, ids: list[str]) -> None:
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps({"del": id_}) + "\n" for id_ in ids)
@@ -0,0 +1,209 @@
+# semantic cache backend partitioned into locality-sensitive-hash buckets
+import heapq
+import logging
+from typing import Optional
+import numpy as np
+from cache_version import is_outdated
+from quantization import approximate_scores, quantize, top_candidates
+from vector_codec import decode, to_bytes
+
+KEY_PREFIX = "genai:semantic_cache"
+MEMBERS_PREFIX = "genai:semantic_cache_members"
+
+
+class LSHPartitioner:
+    """
+    Random-hyperplane signatures for embeddings.
+
+    The hyperplanes come from a fixed seed, so every worker assigns the same
+    question to the same bucket.
+    """
+
+    def __init__(self, bits: int, seed: int):
+        self.bits = bits
+        self._seed = seed
+        self._planes: Optional[np.ndarray] = None
+
+    def _project(self, embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        if self._planes is None or self._planes.shape[1] != vec.shape[0]:
+            rng = np.random.default_rng(self._seed)
+            self._planes = rng.standard_normal((self.bits, vec.shape[0]), dtype=np.float32)
+        return self._planes @ vec
+
+    def bucket(self, embedding) -> str:
+        return self._format(self._project(embedding) > 0)
+
+    def probe_buckets(self, embedding, probes: int) -> list[str]:
+        """
+        The query's own bucket followed by `probes` neighbor buckets.
+
+        Neighbors are visited in order of how close the query lies to the
+        hyperplanes whose bits they flip (multi-probe LSH): a near-duplicate
+        question most likely differs in those bits.
+        """
+        projection = self._project(embedding)
+        signature = projection > 0
+        order = np.argsort(np.abs(projection))
+        margins = np.abs(projection)[order]
+        buckets = [self._format(signature)]
+        # enumerate flip sets by increasing total margin with the shift/expand heap
+        heap = [(float(margins[0]), (0,))] if self.bits else []
+        while heap and len(buckets) <= probes:
+            score, flips = heapq.heappop(heap)
+            neighbor = signature.copy()
+            neighbor[order[list(flips)]] ^= True
+            buckets.append(self._format(neighbor))
+            last = flips[-1]
+            if last + 1 < self.bits:
+                heapq.heappush(heap, (score - float(margins[last]) + float(margins[last + 1]), flips[:-1] + (last + 1,)))
+                heapq.heappush(heap, (score + float(margins[last + 1]), flips + (last + 1,)))
+        return buckets
+
+    @staticmethod
+    def _format(signature: np.ndarray) -> str:
+        return "".join("1" if bit else "0" for bit in signature)
+
+
+class LSHCache:
+    """
+    Entries are hashes under genai:semantic_cache:{bucket}:{hash}, and each
+    bucket keeps a member set. A lookup reads the probed buckets in probe order
+    and stops at `max_candidates` entries, so its cost is bounded however large
+    the cache grows. The {bucket} hash tag keeps a bucket and its entries in the
+    same Redis Cluster slot.
+
+    Candidates are scored from the int8 codes each entry stores next to its
+    float32 embedding (a quarter of the bytes), the best `rescore_candidates`
+    are rescored against their embeddings, and only the winner's answer is read.
+    """
+
+    def __init__(self, client, bits: int, probes: int, seed: int, max_candidates: int,
+                 rescore_candidates: int = 8):
+        self._client = client
+        self._probes = probes
+        self._max_candidates = max_candidates
+        self._rescore = rescore_candidates
+        self.partitioner = LSHPartitioner(bits, seed)
+
+    @staticmethod
+    def _members_key(bucket: str) -> str:
+        return f"{MEMBERS_PREFIX}:{{{bucket}}}"
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def key(self, question_hash: str, embedding) -> str:
+        return f"{KEY_PREFIX}:{{{self.partitioner.bucket(embedding)}}}:{question_hash}"
+
+    def add(self, key: str, question: str, embedding, answer: str, ttl: Optional[int] = None,
+            version: str = "") -> None:
+        bucket = key.split("{", 1)[1].split("}", 1)[0]
+        members_key = self._members_key(bucket)
+        vec = self._unit(embedding)
+        codes, scales = quantize(vec, "int8")
+        pipe = self._client.pipeline(transaction=False)
+        pipe.delete(key)
+        pipe.hset(key, mapping={"question": question, "answer": answer, "version": version,
+                                "embedding": to_bytes(vec), "codes": codes[0].tobytes(),
+                                "scale": scales[:1].tobytes()})
+        if ttl is not None:
+            pipe.expire(key, ttl)
+        pipe.sadd(members_key, key)
+        if ttl is not None:
+            # the member set lives as long as its longest-lived entry
+            pipe.expire(members_key, ttl, nx=True)
+            pipe.expire(members_key, ttl, gt=True)
+        pipe.execute()
+
+    def _candidates(self, buckets: list[str]) -> list[tuple[str, str]]:
+        """(bucket, key) of up to `max_candidates` members of the buckets, in probe order."""
+        pipe = self._client.pipeline(transaction=False)
+        for bucket in buckets:
+            pipe.scard(self._members_key(bucket))
+        sizes = pipe.execute()
+        # most likely buckets first; the one that crosses the budget is sampled
+        pipe, read, budget = self._client.pipeline(transaction=False), [], self._max_candidates
+        for bucket, size in zip(buckets, sizes):
+            if budget <= 0:
+                break
+            if not size:
+                continue
+            if size <= budget:
+                pipe.smembers(self._members_key(bucket))
+            else:
+                pipe.srandmember(self._members_key(bucket), budget)
+            read.append(bucket)
+            budget -= size
+        if not read:
+            return []
+        return [(bucket, key.decode("utf-8")) for bucket, keys in zip(read, pipe.execute()) for key in keys]
+
+    def search(self, embedding, version: Optional[str] = None) -> Optional[tuple[str, str, float]]:
+        """
+        Find the closest cached question within the probed buckets. When
+        `version` is given, entries from other versions never match, and those
+        from older corpus generations are deleted as they are found.
+
+        Returns:
+            (key, answer, cosine similarity) of the best match, or None if the buckets are empty
+        """
+        members = self._candidates(self.partitioner.probe_buckets(embedding, self._probes))
+        if not members:
+            return None
+
+        pipe = self._client.pipeline(transaction=False)
+        for _, key in members:
+            pipe.hmget(key, "codes", "scale", "version")
+        keys, codes, scales, stale, outdated = [], [], [], [], []
+        for (bucket, key), fields in zip(members, pipe.execute(raise_on_error=False)):
+            if isinstance(fields, Exception):
+                # not a hash: an entry written in an older format
+                logging.error(f"Error processing cached item {key}: {fields}")
+                stale.append((bucket, key))
+                outdated.append(key)
+                continue
+            entry_codes, scale, entry_version = fields
+            if entry_codes is None:
+                stale.append((bucket, key))
+                continue
+            entry_version = entry_version.decode("utf-8") if entry_version is not None else None
+            if version is not None and entry_version != version:
+                if is_outdated(entry_version, version):
+                    stale.append((bucket, key))
+                    outdated.append(key)
+                continue
+            keys.append(key)
+            codes.append(np.frombuffer(entry_codes, dtype=np.int8))
+            scales.append(np.frombuffer(scale, dtype=np.float32)[0])
+        if stale:
+            # expired, evicted and outdated entries are dropped from their bucket lazily
+            pipe = self._client.pipeline(transaction=False)
+            for bucket, key in stale:
+                pipe.srem(self._members_key(bucket), key)
+            for key in outdated:
+                pipe.delete(key)
+            pipe.execute()
+        if not keys:
+            return None
+
+        query = self._unit(embedding)
+        scores = approximate_scores(np.asarray(codes), np.asarray(scales, dtype=np.float32), query, "int8")
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        if self._rescore:
+            top = top_candidates(scores, self._rescore)
+            pipe = self._client.pipeline(transaction=False)
+            for i in top:
+                pipe.hget(keys[i], "embedding")
+            rescored = [(float(decode(vector) @ query), int(i))
+                        for i, vector in zip(top, pipe.execute()) if vector is not None]
+            if rescored:
+                score, best = max(rescored)
+        answer = self._client.hget(keys[best], "answer")
+        if answer is None:
+            return None
+        return keys[best], answer.decode("utf-8"), score
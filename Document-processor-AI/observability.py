@@ -1,11 +1,35 @@
 #logging and observability module
 import logging
-from prometheus_client import start_http_server, Counter, Histogram
+import contextvars
+from contextlib import contextmanager
+from prometheus_client import start_http_server, Counter, Gauge, Histogram
 
 # metrics
 REQUEST_COUNTER = Counter("genai_requests_total", "Total number of requests received")
 LLM_LATENCY = Histogram("genai_llm_latency_ms", "LLM call latency in milliseconds")
 RETRIEVAL_LATENCY = Histogram("genai_retrieval_latency_ms", "Retrieval latency in milliseconds")
+CACHE_LOOKUPS = Counter("genai_cache_lookups_total", "Cache lookups by tier and result", ["tier", "result"])
+CACHE_ENTRIES = Gauge("genai_cache_entries", "Entries currently held by the semantic cache")
+CACHE_EVICTIONS = Counter("genai_cache_evictions_total", "Semantic cache entries evicted to stay within budget")
+CACHE_EVICTED_AGE = Histogram("genai_cache_evicted_entry_age_seconds", "Age of semantic cache entries at eviction",
+                              buckets=(60, 300, 900, 1800, 3600, 7200, 21600, 86400, float("inf")))
+WARMUP_QUESTIONS = Gauge("genai_cache_warmup_questions", "Cache warm-up progress by state", ["state"])
+VECTOR_STORE_POOL = Gauge("genai_vector_store_pool_connections", "Vector store Redis connections by state", ["state"])
+EMBEDDING_FALLTHROUGH = Counter("genai_cache_embedding_fallthrough_total", "Cache lookups that needed an embedding call after missing the exact-match tier")
+CONTEXT_TOKENS = Histogram("genai_context_tokens", "Tokens of retrieved context packed into the prompt",
+                           buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, float("inf")))
+TIME_TO_FIRST_TOKEN = Histogram("genai_time_to_first_token_ms", "Time from request to the first streamed answer text, by source (cache, llm)",
+                                ["source"], buckets=(50, 100, 250, 500, 750, 1000, 1500, 2500, 5000, 10000, float("inf")))
+EMBEDDING_BATCH_SIZE = Histogram("genai_embedding_batch_size", "Texts per micro-batched embeddings request",
+                                 buckets=(1, 2, 4, 8, 16, 32, 64, 128, float("inf")))
+EMBEDDING_QUEUE_DELAY = Histogram("genai_embedding_queue_delay_ms", "Time a text waited for its embeddings batch to be sent, in milliseconds",
+                                  buckets=(0.5, 1, 2, 3, 5, 10, 20, 50, float("inf")))
+SINGLE_FLIGHT = Counter("genai_single_flight_total", "Answer-cache misses by single-flight role (leader, follower_local, follower_remote, fallback)", ["role"])
+LLM_CALLS = Counter("genai_llm_calls_total", "LLM calls by model and result (success, error, deadline, circuit_open)", ["model", "result"])
+LLM_RETRIES = Counter("genai_llm_retries_total", "LLM requests retried after a retryable error", ["model"])
+LLM_HEDGES = Counter("genai_llm_hedges_total", "Hedged LLM requests by outcome (fired, primary_won, hedge_won)", ["model", "outcome"])
+LLM_CIRCUIT_OPEN = Gauge("genai_llm_circuit_open", "1 while the model's circuit breaker rejects calls", ["model"])
+LLM_IN_FLIGHT = Gauge("genai_llm_calls_in_flight", "LLM calls currently awaiting a response on this worker")
 
 def log(question, model_input,model_output, guardrail_output=None, model="unknown", latency_ms=None, user_id =None, retrieved_context=None):
 
@@ -13,7 +37,7 @@ def log(question, model_input,model_output, guardrail_output=None, model="unknow
 
     logging.info("---------AUDIT LOG---------")
     logging.info(f"User ID: {user_id}") # user id is not used in the pipeline but it is good to have it
-    logging.info(f"Question: {question}")
+    logging.info(f"{'Warm-up question' if _warmup_run.get() else 'Question'}: {question}")
     logging.info(f"Model Input: {model_input}")
     logging.info(f"Model Output: {model_output}")
     if guardrail_output:
@@ -23,12 +47,84 @@ def log(question, model_input,model_output, guardrail_output=None, model="unknow
     
     logging.info(f"Retrieved Context: {retrieved_context}")
 
+# set while a cache warm-up run is in progress, see warmup.warm_cache
+_warmup_run = contextvars.ContextVar("warmup_run", default=False)
+
+@contextmanager
+def warmup_run():
+    # pipeline runs inside are logged as warm-up, so warmup.questions_from_log does not rank them as traffic
+    token = _warmup_run.set(True)
+    try:
+        yield
+    finally:
+        _warmup_run.reset(token)
+
+def log_cache_hit(question):
+    logging.info(f"{'Warm-up cache hit' if _warmup_run.get() else 'Semantic cache hit'} for question: {question}")
+
 def record_metric(metric_name, value):
     if metric_name == "llm_latency_ms":
         LLM_LATENCY.observe(value)
     elif metric_name == "retrieval_latency_ms":
         RETRIEVAL_LATENCY.observe(value)
 
+def record_cache_lookup(tier, result):
+    # tier: exact_local / exact_redis / semantic, result: hit / miss
+    CACHE_LOOKUPS.labels(tier=tier, result=result).inc()
+
+def record_cache_size(entries):
+    CACHE_ENTRIES.set(entries)
+
+def record_cache_evictions(evicted):
+    # evicted: list of (key, age in seconds)
+    for _, age in evicted:
+        CACHE_EVICTIONS.inc()
+        CACHE_EVICTED_AGE.observe(age)
+
+def record_warmup(total, done, warmed, failed):
+    WARMUP_QUESTIONS.labels(state="total").set(total)
+    WARMUP_QUESTIONS.labels(state="done").set(done)
+    WARMUP_QUESTIONS.labels(state="warmed").set(warmed)
+    WARMUP_QUESTIONS.labels(state="failed").set(failed)
+
+def record_pool_usage(in_use, available, max_connections):
+    VECTOR_STORE_POOL.labels(state="in_use").set(in_use)
+    VECTOR_STORE_POOL.labels(state="available").set(available)
+    VECTOR_STORE_POOL.labels(state="max").set(max_connections)
+
+def record_embedding_fallthrough():
+    EMBEDDING_FALLTHROUGH.inc()
+
+def record_context_tokens(tokens):
+    CONTEXT_TOKENS.observe(tokens)
+
+def record_time_to_first_token(source, ms):
+    TIME_TO_FIRST_TOKEN.labels(source=source).observe(ms)
+
+def record_embedding_batch(size, delays_ms):
+    EMBEDDING_BATCH_SIZE.observe(size)
+    for delay in delays_ms:
+        EMBEDDING_QUEUE_DELAY.observe(delay)
+
+def record_single_flight(role):
+    SINGLE_FLIGHT.labels(role=role).inc()
+
+def record_llm_call(model, result):
+    LLM_CALLS.labels(model=model, result=result).inc()
+
+def record_llm_retry(model):
+    LLM_RETRIES.labels(model=model).inc()
+
+def record_llm_hedge(model, outcome):
+    LLM_HEDGES.labels(model=model, outcome=outcome).inc()
+
+def record_llm_circuit(model, is_open):
+    LLM_CIRCUIT_OPEN.labels(model=model).set(1 if is_open else 0)
+
+def track_llm_in_flight():
+    # context manager around one LLM call
+    return LLM_IN_FLIGHT.track_inprogress()
+
 def start_metrics_server(port=8000):
     start_http_server(port)
     logging.info(f" Prometheus Metrics server started on port {port}, at link http://localhost:{port}/metrics")
\ No newline at end of file
@@ -0,0 +1,59 @@
+# the RAG pipeline for one question: cache lookup, retrieval, LLM call, guardrails, cache write.
+# Importing it starts no servers and configures no logging, so main.py and warmup.py share it.
+import time
+import logging
+
+from cache_store import get as cache_get, set as cache_set
+from retrieval import retrieve_context
+from embeddings import QuestionEmbedding
+from router import build_prompt
+from llm_client import call as llm_call
+from postprocess import secure_output
+from config import CACHE_TTL_SECONDS, CACHE_SIMILARITY_THRESHOLD
+from guardrails import apply_guardrails
+from observability import log, log_cache_hit, record_metric
+
+def run_pipeline(question: str):
+    logging.info(f"Starting pipeline for question: {question}")
+    # embedding is computed at most once and shared by cache lookup, retrieval and cache write
+    question_embedding = QuestionEmbedding(question)
+
+    #step 1 : Check cache with semantic similarity
+    cached = cache_get(question, similarity_threshold=CACHE_SIMILARITY_THRESHOLD, embedding=question_embedding)
+    if cached:
+        log_cache_hit(question)
+        return cached
+    
+    #step 2 : Retrieve context
+    start_retrieve = time.time()
+    context = retrieve_context(question, embedding=question_embedding)
+    retrival_latency = int( (time.time() - start_retrieve)*1000) # in milliseconds
+    logging.info(f"Retrieval latency: {retrival_latency}ms")
+    logging.info("Retrieved context:")
+    record_metric("retrieval_latency_ms", retrival_latency)
+    logging.info(context)
+    
+    # step 3 : Route Prompt to model
+    model, prompt = build_prompt(question, context)
+    logging.info("Assembled prompt:")
+    logging.info(prompt)
+
+    
+    # step 4 : Call LLM
+    start_llm = time.time()
+    answer = llm_call(model, prompt)
+    llm_latency = int( (time.time() - start_llm)*1000) # in milliseconds
+    logging.info(f"LLM latency: {llm_latency}ms")
+    record_metric("llm_latency_ms", llm_latency)
+
+    post_processed = secure_output(answer)
+
+    # step 5 : Apply guardrails
+    secured = apply_guardrails(post_processed)
+
+    #observability logs
+    log(question, prompt, post_processed,secured , model=model, latency_ms=retrival_latency + llm_latency, retrieved_context=context)
+
+    cache_set(question, secured, CACHE_TTL_SECONDS, embedding=question_embedding)
+    logging.info(f"Cached answer for question: {question}")
+    return secured
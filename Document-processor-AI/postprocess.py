@@ -5,8 +5,11 @@ PII_REGEX = re.compile(r"(\d{3}-\d{2}-\d{4})")  # example 123-45-6789
 #email address for regex
 EMAIL_REGEX = re.compile(r"(\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b)")
 
-def secure_output(text: str) -> str:
+def redact_pii(text: str) -> str:
+    # no match spans whitespace, so streamed text can be redacted piece by piece (stream_guard.py)
     text = PII_REGEX.sub("[REDACTED]", text)
-    text = EMAIL_REGEX.sub("[REDACTED]", text)
-    return text.strip()
+    return EMAIL_REGEX.sub("[REDACTED]", text)
+
+def secure_output(text: str) -> str:
+    return redact_pii(text).strip()
 
@@ -0,0 +1,66 @@
+# embedding compaction: Matryoshka truncation and int8 / binary codes scored before float rescoring
+import numpy as np
+
+QUANTIZATION_SCHEMES = ("float32", "int8", "binary")
+SCORE_BLOCK_ROWS = 256  # int8 rows converted per step, keeps the temporary float32 copy in cache
+
+def truncate(vectors, dims: int) -> np.ndarray:
+    """
+    First `dims` components of each vector, renormalized. Matryoshka-trained models
+    (text-embedding-3) put most of the signal first, so this is what the API's
+    `dimensions` parameter returns.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)[..., :dims]
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+def code_layout(dim: int, scheme: str) -> tuple[int, type]:
+    """(columns, dtype) of the codes of one `dim`-dimensional vector."""
+    if scheme == "float32":
+        return dim, np.float32
+    if scheme == "int8":
+        return dim, np.int8
+    if scheme == "binary":
+        return (dim + 7) // 8, np.uint8
+    raise ValueError(f"Unknown quantization '{scheme}', expected one of {QUANTIZATION_SCHEMES}")
+
+def quantize(vectors, scheme: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Codes of unit-length vectors and a per-row scale (int8 only, 1.0 otherwise).
+    int8 maps each row's largest component to 127; binary keeps the sign bits.
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.ones(len(vectors), dtype=np.float32)
+    code_layout(vectors.shape[1], scheme)
+    if scheme == "int8":
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+        return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    if scheme == "binary":
+        return np.packbits(vectors > 0, axis=1), scales
+    return vectors, scales
+
+def approximate_scores(codes: np.ndarray, scales: np.ndarray, query: np.ndarray, scheme: str) -> np.ndarray:
+    """Cosine similarity of a unit-length query to every coded row, estimated from the codes."""
+    if scheme == "float32":
+        return codes @ query
+    if scheme == "int8":
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores * scales
+    bits = np.packbits(query > 0)
+    words = codes
+    if codes.shape[1] % 8 == 0 and codes.flags.c_contiguous:
+        # 64 bits per popcount instead of 8
+        words, bits = codes.view(np.uint64), bits.view(np.uint64)
+    hamming = np.bitwise_count(words ^ bits).sum(axis=1, dtype=np.int64)
+    # angle between sign patterns, the random-hyperplane estimate of the cosine
+    return np.cos(np.pi * hamming / len(query)).astype(np.float32)
+
+def top_candidates(scores: np.ndarray, count: int) -> np.ndarray:
+    """Positions of the `count` best finite scores, best first."""
+    count = min(count, int(np.isfinite(scores).sum()))
+    if count <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, count - 1)[:count]
+    return top[np.argsort(-scores[top])]
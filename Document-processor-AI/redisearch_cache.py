@@ -0,0 +1,71 @@
+# semantic cache backend using server-side KNN search on RediSearch (via redisvl)
+import logging
+from typing import Optional
+import numpy as np
+from redisvl.index import SearchIndex
+from redisvl.query import VectorQuery
+from redisvl.query.filter import Tag
+
+INDEX_NAME = "genai_semantic_cache"
+KEY_PREFIX = "genai:semantic_cache_vec"
+
+
+class RediSearchCache:
+    """
+    Cache entries stored as HASHes with a binary FLOAT32 vector field.
+
+    A lookup is a single FT.SEARCH ... KNN 1 query that returns the answer
+    and its distance together, so no embeddings leave Redis.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._index: Optional[SearchIndex] = None
+
+    def key(self, question_hash: str, embedding=None) -> str:
+        return f"{KEY_PREFIX}:{question_hash}"
+
+    def _get_index(self, dims: int) -> SearchIndex:
+        # the index is created lazily so its dimensions follow the embedding model
+        if self._index is None:
+            index = SearchIndex.from_dict({
+                "index": {"name": INDEX_NAME, "prefix": KEY_PREFIX, "storage_type": "hash"},
+                "fields": [
+                    {"name": "version", "type": "tag"},
+                    {"name": "embedding", "type": "vector",
+                     "attrs": {"dims": dims, "distance_metric": "cosine", "algorithm": "hnsw", "datatype": "float32"}},
+                ],
+            }, redis_client=self._client)
+            index.create(overwrite=False)
+            logging.info(f"RediSearch semantic cache index '{INDEX_NAME}' ready ({dims} dims)")
+            self._index = index
+        return self._index
+
+    def add(self, key: str, question: str, embedding, answer: str, ttl: Optional[int] = None,
+            version: str = "") -> None:
+        vec = np.asarray(embedding, dtype=np.float32)
+        record = {"question": question, "answer": answer, "version": version, "embedding": vec.tobytes()}
+        self._get_index(vec.shape[0]).load([record], keys=[key], ttl=ttl)
+
+    def search(self, embedding, version: Optional[str] = None) -> Optional[tuple[str, str, float]]:
+        """
+        Find the closest cached question on the server, among entries stored
+        under `version` when given.
+
+        Returns:
+            (key, answer, cosine similarity) of the best match, or None if nothing is cached
+        """
+        vec = np.asarray(embedding, dtype=np.float32)
+        query = VectorQuery(
+            vector=vec.tobytes(),
+            vector_field_name="embedding",
+            return_fields=["answer"],
+            filter_expression=Tag("version") == version if version is not None else None,
+            num_results=1,
+        )
+        results = self._get_index(vec.shape[0]).query(query)
+        if not results or not results[0].get("answer"):
+            return None
+        best = results[0]
+        # RediSearch reports cosine distance, 1 - distance is the similarity
+        return best["id"], best["answer"], 1.0 - float(best["vector_distance"])
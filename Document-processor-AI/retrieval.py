@@ -1,17 +1,161 @@
 # logic for Retrieval
-from vector_store import retrieve
-from config import VECTOR_TOP_K
+import json
+import asyncio
+import os
+import logging
+import hashlib
+from typing import Optional
+from vector_store import retrieve_chunks, expand_to_parents, aretrieve_chunks, aexpand_to_parents, corpus_revision
+from config import (VECTOR_TOP_K, RETRIEVAL_CACHE_MAX_ENTRIES, RETRIEVAL_CACHE_TTL_SECONDS,
+                    RETRIEVAL_CACHE_SIMILARITY_THRESHOLD, RETRIEVAL_MODE, BM25_INDEX_DIR, HYBRID_CANDIDATES, RRF_K,
+                    CONTEXT_TOKEN_BUDGET, PARENT_CANDIDATES_PER_RESULT, CACHE_QUANTIZATION,
+                    CACHE_RESCORE_CANDIDATES)
+from embeddings import QuestionEmbedding
+from ttl_cache import TTLCache
+from semantic_index import SemanticIndex
+from bm25_index import BM25Index
+from context_packer import pack_context
+from cache_version import current_generation, acurrent_generation
+from observability import record_cache_lookup, record_context_tokens
 
-def retrieve_context(query: str, k: int = VECTOR_TOP_K) -> str:
+# Retrieval result cache, consulted after an answer cache miss.
+# Exact tier: (corpus generation, k, normalized query) -> chunks.
+# Similar tier: query embeddings of near-duplicate questions, keyed and stamped with "{generation}:{k}".
+# The generation combines the Redis counter with the counters of the index files this worker searches,
+# so writes that never reach Redis (local backend, BM25 commits, Redis down) still invalidate it.
+_exact_results = TTLCache(max_entries=RETRIEVAL_CACHE_MAX_ENTRIES, default_ttl=RETRIEVAL_CACHE_TTL_SECONDS)
+_similar_results = SemanticIndex(max_entries=RETRIEVAL_CACHE_MAX_ENTRIES, quantization=CACHE_QUANTIZATION,
+                                 rescore_candidates=CACHE_RESCORE_CANDIDATES)
+
+# Lexical side of hybrid retrieval, built by load_corpus.py. Without it retrieval is vector-only.
+_lexical = BM25Index(BM25_INDEX_DIR)
+_lexical_missing_logged = False
+
+def _hybrid() -> bool:
+    """True if queries use the lexical index; warns once when hybrid is configured but the index is missing."""
+    global _lexical_missing_logged
+    if RETRIEVAL_MODE != "hybrid":
+        return False
+    if len(_lexical):
+        _lexical_missing_logged = False
+        return True
+    if not _lexical_missing_logged:
+        logging.error(f"RETRIEVAL_MODE=hybrid but there is no BM25 index in {os.path.abspath(BM25_INDEX_DIR)}: "
+                      f"serving vector-only results. Run load_corpus.py with this BM25_INDEX_DIR or point it "
+                      f"at the index ingestion wrote.")
+        _lexical_missing_logged = True
+    return False
+
+def reciprocal_rank_fusion(rankings: list[list[tuple[str, str, dict]]], k: int,
+                           rrf_k: int = RRF_K) -> list[tuple[str, str, dict]]:
+    """Merge ranked (chunk id, text, metadata) lists by summed 1 / (rrf_k + rank) and keep the top k."""
+    scores, chunks = {}, {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, 1):
+            scores[chunk[0]] = scores.get(chunk[0], 0.0) + 1.0 / (rrf_k + rank)
+            chunks.setdefault(chunk[0], chunk)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [chunks[chunk_id] for chunk_id in best]
+
+def _search(query: str, k: int, vector) -> list[tuple[str, str, dict]]:
+    # chunks are ranked, then replaced by their k best distinct parent sections
+    chunks = k * PARENT_CANDIDATES_PER_RESULT
+    if not _hybrid():
+        return expand_to_parents(retrieve_chunks(query, chunks, embedding=vector), k)
+    candidates = max(chunks, HYBRID_CANDIDATES)
+    dense = retrieve_chunks(query, candidates, embedding=vector)
+    lexical = [chunk[:3] for chunk in _lexical.search(query, candidates)]
+    return expand_to_parents(reciprocal_rank_fusion([dense, lexical], chunks), k)
+
+async def _asearch(query: str, k: int, vector) -> list[tuple[str, str, dict]]:
+    chunks = k * PARENT_CANDIDATES_PER_RESULT
+    if not _hybrid():
+        return await aexpand_to_parents(await aretrieve_chunks(query, chunks, embedding=vector), k)
+    candidates = max(chunks, HYBRID_CANDIDATES)
+    # the dense and lexical searches run concurrently
+    dense, lexical = await asyncio.gather(aretrieve_chunks(query, candidates, embedding=vector),
+                                          asyncio.to_thread(_lexical.search, query, candidates))
+    lexical = [chunk[:3] for chunk in lexical]
+    return await aexpand_to_parents(reciprocal_rank_fusion([dense, lexical], chunks), k)
+
+def _corpus_generation(generation: int) -> str:
+    return f"{generation}.{_lexical.generation}.{corpus_revision()}"
+
+def _exact_key(query: str, k: int, generation: str) -> tuple[str, int, str]:
+    normalized = " ".join(query.casefold().split())
+    return generation, k, hashlib.sha256(normalized.encode()).hexdigest()
+
+def _cached_chunks(query: str, k: int, generation: str, vector) -> Optional[list[tuple[str, str, dict]]]:
+    chunks = _exact_results.get(_exact_key(query, k, generation))
+    record_cache_lookup("retrieval_exact", "hit" if chunks is not None else "miss")
+    if chunks is not None or vector is None:
+        return chunks
+    match = _similar_results.search(vector, version=f"{generation}:{k}")
+    if match is None or match[2] < RETRIEVAL_CACHE_SIMILARITY_THRESHOLD:
+        record_cache_lookup("retrieval_similar", "miss")
+        return None
+    record_cache_lookup("retrieval_similar", "hit")
+    _similar_results.touch(match[0])
+    return [tuple(chunk) for chunk in json.loads(match[1])]
+
+def retrieve_chunks_cached(query: str, k: int = VECTOR_TOP_K,
+                           embedding: QuestionEmbedding | None = None) -> list[tuple[str, str, dict]]:
+    """
+    (id, text, metadata) of the top-k parent sections for the query, served from the retrieval
+    cache when the same or a near-duplicate query was answered under the current corpus.
+    """
+    generation = _corpus_generation(current_generation())
+    vector = embedding.vector if embedding else None
+    chunks = _cached_chunks(query, k, generation, vector)
+    if chunks is not None:
+        return chunks
+    chunks = _search(query, k, vector)
+    _remember_chunks(query, k, generation, vector, chunks)
+    return chunks
+
+async def aretrieve_chunks_cached(query: str, k: int = VECTOR_TOP_K,
+                                  embedding: QuestionEmbedding | None = None) -> list[tuple[str, str, dict]]:
+    """Async `retrieve_chunks_cached`."""
+    generation = _corpus_generation(await acurrent_generation())
+    vector = await embedding.avector() if embedding else None
+    chunks = _cached_chunks(query, k, generation, vector)
+    if chunks is not None:
+        return chunks
+    chunks = await _asearch(query, k, vector)
+    _remember_chunks(query, k, generation, vector, chunks)
+    return chunks
+
+def _remember_chunks(query: str, k: int, generation: str, vector, chunks: list[tuple[str, str, dict]]) -> None:
+    exact_key = _exact_key(query, k, generation)
+    _exact_results.set(exact_key, chunks)
+    if vector is not None:
+        # one entry per generation and k, like the exact tier: a query cached for another k stays usable
+        _similar_results.add(":".join(map(str, exact_key)), vector, json.dumps(chunks),
+                             ttl=RETRIEVAL_CACHE_TTL_SECONDS, version=f"{generation}:{k}")
+
+def retrieve_context(query: str, k: int = VECTOR_TOP_K, embedding: QuestionEmbedding | None = None,
+                     budget: int = CONTEXT_TOKEN_BUDGET) -> str:
     """
     Retrieve context from the vector store based on the query.
     
     Args:
         query (str): The query to search for.
         k (int): The number of top results to return.
+        embedding (QuestionEmbedding): Request-scoped query embedding to reuse.
+        budget (int): Token budget of the context; overlapping chunks are merged before packing.
     
     Returns:
         str: The retrieved context as a single string.
     """
-    results = retrieve(query, k)
-    return "\n".join(results) 
+    results = retrieve_chunks_cached(query, k, embedding=embedding)
+    context, tokens = pack_context(results, budget)
+    record_context_tokens(tokens)
+    return context
+
+async def aretrieve_context(query: str, k: int = VECTOR_TOP_K, embedding: QuestionEmbedding | None = None,
+                            budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """Async `retrieve_context`, for the async request path."""
+    results = await aretrieve_chunks_cached(query, k, embedding=embedding)
+    context, tokens = pack_context(results, budget)
+    record_context_tokens(tokens)
+    return context
@@ -0,0 +1,262 @@
+# in-process vector index used by the semantic cache
+import time
+import threading
+from typing import Optional
+import numpy as np
+from quantization import code_layout, quantize, approximate_scores, top_candidates
+
+EVICTION_POLICIES = ("lru", "lfu")
+
+
+class SemanticIndex:
+    """
+    Contiguous float32 matrix of normalized question embeddings.
+
+    Rows are normalized once on insert, so a lookup is a single
+    matrix-vector product followed by an argmax. When `max_entries` or
+    `max_bytes` is set, expired rows and then the least recently (lru) or
+    least frequently (lfu) used rows are evicted to stay within budget.
+
+    With `quantization` set to "int8" or "binary" the matrix holds codes
+    instead of floats. A lookup scores the codes, then rescores the best
+    `rescore_candidates` against a float16 copy of the vectors; with 0 no copy
+    is kept and the int8 estimate (within ~1e-3 of the cosine) is final. Binary
+    codes only estimate the angle coarsely, so they require rescoring.
+    """
+
+    def __init__(self, initial_capacity: int = 1024, max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None, policy: str = "lru", quantization: str = "float32",
+                 rescore_candidates: int = 0):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy '{policy}', expected one of {EVICTION_POLICIES}")
+        code_layout(1, quantization)
+        if quantization == "binary" and rescore_candidates <= 0:
+            raise ValueError("Binary quantization needs rescore_candidates > 0, its scores are too coarse "
+                             "to compare with a similarity threshold")
+        self._lock = threading.RLock()
+        self._capacity = initial_capacity
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._policy = policy
+        self._quantization = quantization
+        self._rescore = rescore_candidates if quantization != "float32" else 0
+        self._matrix: Optional[np.ndarray] = None  # (capacity, code columns), allocated on first add
+        self._floats: Optional[np.ndarray] = None  # (capacity, dim) float16 rescoring copy, when rescoring
+        self._dim = 0
+        # per-row bookkeeping, kept in arrays parallel to the matrix rows
+        self._columns = {
+            "expires_at": np.zeros(initial_capacity, dtype=np.float64),
+            "created_at": np.zeros(initial_capacity, dtype=np.float64),
+            "last_access": np.zeros(initial_capacity, dtype=np.float64),
+            "hits": np.zeros(initial_capacity, dtype=np.int64),
+            "nbytes": np.zeros(initial_capacity, dtype=np.int64),
+            "version": np.zeros(initial_capacity, dtype=np.int64),
+            "scale": np.zeros(initial_capacity, dtype=np.float32),  # int8 code scale
+        }
+        self._version_ids: dict[str, int] = {}  # version stamps interned to small ints
+        self._total_bytes = 0
+        self._keys: list[str] = []
+        self._answers: list[str] = []
+        self._positions: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._positions
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate bytes held by live entries (vectors, answers and keys)."""
+        return self._total_bytes
+
+    @staticmethod
+    def normalize(embedding) -> np.ndarray:
+        """Return the embedding as a unit-length float32 vector."""
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def _grow(self, dim: int) -> None:
+        columns, dtype = code_layout(dim, self._quantization)
+        if self._matrix is None:
+            self._dim = dim
+            self._matrix = np.zeros((self._capacity, columns), dtype=dtype)
+            if self._rescore:
+                self._floats = np.zeros((self._capacity, dim), dtype=np.float16)
+            return
+        size = len(self._keys)
+        self._capacity *= 2
+        matrix = np.zeros((self._capacity, columns), dtype=dtype)
+        matrix[:size] = self._matrix[:size]
+        self._matrix = matrix
+        if self._floats is not None:
+            floats = np.zeros((self._capacity, dim), dtype=np.float16)
+            floats[:size] = self._floats[:size]
+            self._floats = floats
+        for name, column in self._columns.items():
+            grown = np.zeros(self._capacity, dtype=column.dtype)
+            grown[:size] = column[:size]
+            self._columns[name] = grown
+
+    def _version_id(self, version: str) -> int:
+        return self._version_ids.setdefault(version, len(self._version_ids))
+
+    def add(self, key: str, embedding, answer: str, ttl: Optional[float] = None,
+            version: str = "") -> list[tuple[str, float]]:
+        """
+        Insert or replace an entry. `ttl` is in seconds, None means no expiry.
+        `version` is the cache version stamp the answer was produced under.
+
+        Returns:
+            (key, age in seconds) of the entries evicted to make room
+        """
+        vec = self.normalize(embedding)
+        codes, scales = quantize(vec, self._quantization)
+        now = time.time()
+        nbytes = codes.nbytes + (2 * vec.size if self._rescore else 0) + len(answer.encode("utf-8")) + len(key)
+        with self._lock:
+            if self._matrix is not None and vec.shape[0] != self._dim:
+                raise ValueError(f"Embedding dimensions {vec.shape[0]} do not match the index ({self._dim})")
+            if self._matrix is None or (key not in self._positions and len(self._keys) == self._capacity):
+                self._grow(vec.shape[0])
+            row = self._positions.get(key)
+            if row is None:
+                row = len(self._keys)
+                self._positions[key] = row
+                self._keys.append(key)
+                self._answers.append(answer)
+                self._columns["hits"][row] = 0
+                self._columns["created_at"][row] = now
+            else:
+                self._answers[row] = answer
+                self._total_bytes -= int(self._columns["nbytes"][row])
+            self._matrix[row] = codes[0]
+            self._columns["scale"][row] = scales[0]
+            if self._floats is not None:
+                self._floats[row] = vec
+            self._columns["expires_at"][row] = now + ttl if ttl is not None else np.inf
+            self._columns["last_access"][row] = now
+            self._columns["nbytes"][row] = nbytes
+            self._columns["version"][row] = self._version_id(version)
+            self._total_bytes += nbytes
+            return self._enforce_budget(protect=key)
+
+    def remove(self, key: str) -> bool:
+        """Remove an entry by moving the last row into its slot."""
+        with self._lock:
+            row = self._positions.pop(key, None)
+            if row is None:
+                return False
+            self._total_bytes -= int(self._columns["nbytes"][row])
+            last = len(self._keys) - 1
+            if row != last:
+                last_key = self._keys[last]
+                self._matrix[row] = self._matrix[last]
+                if self._floats is not None:
+                    self._floats[row] = self._floats[last]
+                for column in self._columns.values():
+                    column[row] = column[last]
+                self._keys[row] = last_key
+                self._answers[row] = self._answers[last]
+                self._positions[last_key] = row
+            self._keys.pop()
+            self._answers.pop()
+            return True
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            return list(self._keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+            self._answers.clear()
+            self._positions.clear()
+            self._total_bytes = 0
+
+    def touch(self, key: str) -> None:
+        """Record a cache hit on an entry, for LRU/LFU eviction."""
+        with self._lock:
+            row = self._positions.get(key)
+            if row is not None:
+                self._columns["hits"][row] += 1
+                self._columns["last_access"][row] = time.time()
+
+    def _over_budget(self) -> bool:
+        if self._max_entries is not None and len(self._keys) > self._max_entries:
+            return True
+        return self._max_bytes is not None and self._total_bytes > self._max_bytes
+
+    def _evict(self, key: str, now: float) -> tuple[str, float]:
+        age = now - float(self._columns["created_at"][self._positions[key]])
+        self.remove(key)
+        return key, age
+
+    def _enforce_budget(self, protect: Optional[str] = None) -> list[tuple[str, float]]:
+        evicted = []
+        if not self._over_budget():
+            return evicted
+        now = time.time()
+        # expired rows go first, whatever the policy
+        size = len(self._keys)
+        expired = np.flatnonzero(self._columns["expires_at"][:size] <= now)
+        for key in [self._keys[row] for row in expired]:
+            if key != protect:
+                evicted.append(self._evict(key, now))
+        while self._over_budget() and len(self._keys) > 1:
+            size = len(self._keys)
+            last_access = self._columns["last_access"][:size].copy()
+            hits = self._columns["hits"][:size].copy()
+            if protect in self._positions:
+                last_access[self._positions[protect]] = np.inf
+                hits[self._positions[protect]] = np.iinfo(np.int64).max
+            if self._policy == "lfu":
+                # fewest hits first, oldest access breaks ties
+                row = int(np.lexsort((last_access, hits))[0])
+            else:
+                row = int(np.argmin(last_access))
+            key = self._keys[row]
+            if key == protect:
+                break
+            evicted.append(self._evict(key, now))
+        return evicted
+
+    def stale_keys(self, version: str) -> list[tuple[str, str]]:
+        """(key, entry version) of entries stored under any version other than `version`."""
+        with self._lock:
+            size = len(self._keys)
+            names = {version_id: name for name, version_id in self._version_ids.items()}
+            rows = np.flatnonzero(self._columns["version"][:size] != self._version_id(version))
+            return [(self._keys[row], names[int(self._columns["version"][row])]) for row in rows]
+
+    def search(self, embedding, version: Optional[str] = None) -> Optional[tuple[str, str, float]]:
+        """
+        Find the closest live entry to the given embedding.
+        When `version` is given, entries stored under other versions never match.
+
+        Returns:
+            (key, answer, cosine similarity) of the best match, or None if the index is empty
+        """
+        query = self.normalize(embedding)
+        with self._lock:
+            size = len(self._keys)
+            if size == 0:
+                return None
+            scores = approximate_scores(self._matrix[:size], self._columns["scale"][:size], query,
+                                        self._quantization)
+            scores[self._columns["expires_at"][:size] <= time.time()] = -np.inf
+            if version is not None:
+                scores[self._columns["version"][:size] != self._version_id(version)] = -np.inf
+            if self._rescore:
+                candidates = top_candidates(scores, self._rescore)
+                if not len(candidates):
+                    return None
+                exact = self._floats[candidates].astype(np.float32) @ query
+                row, score = int(candidates[np.argmax(exact)]), float(exact.max())
+            else:
+                row = int(np.argmax(scores))
+                score = float(scores[row])
+                if score == -np.inf:
+                    return None
+            return self._keys[row], self._answers[row], score
@@ -0,0 +1,195 @@
+# single-flight coalescing of concurrent answer-cache misses, within a worker and across workers through Redis
+import json
+import uuid
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Optional
+import numpy as np
+import redis
+from lsh_cache import LSHPartitioner
+from semantic_index import SemanticIndex
+from vector_codec import decode, to_bytes
+from observability import record_single_flight
+
+LOCK_PREFIX = "genai:single_flight:lock"
+RESULT_PREFIX = "genai:single_flight:result"
+QUESTIONS_PREFIX = "genai:single_flight:questions"  # {version}:{bucket} HASH: in-flight question key -> float32 embedding
+QUESTION_BITS = 6  # in-flight questions are split into 2**bits LSH buckets for near-duplicate matching
+QUESTION_PROBES = 6  # neighbor buckets a miss reads besides its own
+QUESTION_SEED = 42  # the same on every worker, so a question lands in the same bucket everywhere
+POLL_SECONDS = 1.0  # how often a remote follower checks that its leader still holds the lock
+
+
+class SingleFlight:
+    """
+    Runs the work for a question once while identical or near-identical questions are in flight.
+
+    The first request for a normalized question leads: it runs `work` and hands its answer
+    to the requests that arrive meanwhile, for the same question or one whose embedding is
+    at least `threshold` similar. Within a worker followers await the leader's future; across
+    workers the leader holds a Redis lock (expiring after `lock_ttl`, so a crashed leader
+    frees it) and publishes the answer on a channel. Leaders register their embedding in an
+    LSH bucket, so a miss reads the few buckets a near-duplicate would be in, not every
+    in-flight question. A follower that gets no answer within `wait_timeout`, or learns that
+    its leader failed, runs `work` itself.
+    """
+
+    def __init__(self, client=None, threshold: float = 0.95, lock_ttl: float = 60, wait_timeout: float = 30):
+        self._client = client  # redis.asyncio client, None to coalesce within this worker only
+        self.threshold = threshold
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self._futures: dict[str, asyncio.Future] = {}
+        self._index = SemanticIndex()
+        self._partitioner = LSHPartitioner(QUESTION_BITS, QUESTION_SEED)
+
+    @staticmethod
+    def key(question: str, version: str) -> str:
+        # answers from different corpus generations or prompts are never shared
+        normalized = " ".join(question.casefold().split()).rstrip("?!. ")
+        return hashlib.sha256(f"{version}\n{normalized}".encode()).hexdigest()
+
+    async def run(self, question: str, vector: Optional[np.ndarray], version: str,
+                  work: Callable[[], Awaitable[str]]) -> str:
+        """The answer to the question, from the in-flight leader or from `work`."""
+        key = self.key(question, version)
+        leader = self._local_leader(key, vector, version)
+        if leader is not None:
+            record_single_flight("follower_local")
+            try:
+                answer = await asyncio.wait_for(asyncio.shield(leader), self.wait_timeout)
+            except asyncio.TimeoutError:
+                answer = None
+            return answer if answer is not None else await self._fallback(work)
+
+        # lead in this worker; the answer may still come from another worker's leader
+        future = asyncio.get_running_loop().create_future()
+        self._futures[key] = future
+        if vector is not None:
+            self._index.add(key, vector, "", version=version)
+        try:
+            answer = await self._resolve(key, vector, version, work)
+            future.set_result(answer)
+            return answer
+        finally:
+            if not future.done():
+                future.set_result(None)  # failed or cancelled, local followers run the work themselves
+            del self._futures[key]
+            self._index.remove(key)
+
+    def _local_leader(self, key: str, vector, version: str) -> Optional[asyncio.Future]:
+        if key in self._futures:
+            return self._futures[key]
+        if vector is None or not len(self._index):
+            return None
+        match = self._index.search(vector, version=version)
+        return self._futures.get(match[0]) if match and match[2] >= self.threshold else None
+
+    async def _resolve(self, key: str, vector, version: str, work: Callable[[], Awaitable[str]]) -> str:
+        if self._client is None:
+            record_single_flight("leader")
+            return await work()
+        token = uuid.uuid4().hex
+        try:
+            leader_key = await self._remote_leader(vector, version)
+            if leader_key is None and await self._client.set(f"{LOCK_PREFIX}:{key}", token, nx=True,
+                                                             px=int(self.lock_ttl * 1000)):
+                return await self._lead(key, vector, version, token, work)
+            leader_key = leader_key or key
+        except redis.RedisError as e:
+            logging.warning(f"Single-flight coordination through Redis failed: {e}")
+            record_single_flight("leader")
+            return await work()
+        return await self._follow(leader_key, work)
+
+    @staticmethod
+    def _questions_key(version: str, bucket: str) -> str:
+        return f"{QUESTIONS_PREFIX}:{version}:{bucket}"
+
+    async def _remote_leader(self, vector, version: str) -> Optional[str]:
+        """Key of a near-duplicate question led by another worker, if any."""
+        if vector is None:
+            return None
+        buckets = [self._questions_key(version, bucket)
+                   for bucket in self._partitioner.probe_buckets(vector, QUESTION_PROBES)]
+        pipe = self._client.pipeline(transaction=False)
+        for questions_key in buckets:
+            pipe.hgetall(questions_key)
+        best, best_score = None, self.threshold
+        query = SemanticIndex.normalize(vector)
+        for questions_key, entries in zip(buckets, await pipe.execute()):
+            for field, value in entries.items():
+                score = float(SemanticIndex.normalize(decode(value)) @ query)
+                if score >= best_score:
+                    best, best_score = (questions_key, field.decode("utf-8")), score
+        if best is None:
+            return None
+        questions_key, best_key = best
+        if not await self._client.exists(f"{LOCK_PREFIX}:{best_key}"):
+            await self._client.hdel(questions_key, best_key)  # left behind by a leader that crashed
+            return None
+        return best_key
+
+    async def _lead(self, key: str, vector, version: str, token: str, work: Callable[[], Awaitable[str]]) -> str:
+        record_single_flight("leader")
+        answer, questions_key = None, None
+        try:
+            if vector is not None:
+                questions_key = self._questions_key(version, self._partitioner.bucket(vector))
+                lock_ms = int(self.lock_ttl * 1000)
+                pipe = self._client.pipeline(transaction=False)
+                pipe.hset(questions_key, key, to_bytes(vector))
+                # the bucket lives as long as its longest-held lock
+                pipe.pexpire(questions_key, lock_ms, nx=True)
+                pipe.pexpire(questions_key, lock_ms, gt=True)
+                await pipe.execute()
+            answer = await work()
+            return answer
+        finally:
+            await self._finish(key, token, answer, questions_key)
+
+    async def _finish(self, key: str, token: str, answer: Optional[str], questions_key: Optional[str] = None) -> None:
+        # followers that subscribed late read the result key, the others get the message
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            pipe.set(f"{RESULT_PREFIX}:{key}", json.dumps({"answer": answer}), px=int(self.wait_timeout * 1000))
+            pipe.publish(f"{RESULT_PREFIX}:{key}", json.dumps({"answer": answer}))
+            if questions_key is not None:
+                pipe.hdel(questions_key, key)
+            await pipe.execute()
+            if await self._client.get(f"{LOCK_PREFIX}:{key}") == token.encode():
+                await self._client.delete(f"{LOCK_PREFIX}:{key}")
+        except redis.RedisError as e:
+            logging.warning(f"Failed to publish single-flight result: {e}")
+
+    async def _follow(self, key: str, work: Callable[[], Awaitable[str]]) -> str:
+        record_single_flight("follower_remote")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        data = None
+        pubsub = self._client.pubsub()
+        try:
+            await pubsub.subscribe(f"{RESULT_PREFIX}:{key}")
+            data = await self._client.get(f"{RESULT_PREFIX}:{key}")  # the leader may have finished already
+            while data is None and deadline - loop.time() > 0:
+                message = await pubsub.get_message(ignore_subscribe_messages=True,
+                                                   timeout=min(POLL_SECONDS, deadline - loop.time()))
+                if message is not None:
+                    data = message["data"]
+                elif not await self._client.exists(f"{LOCK_PREFIX}:{key}"):
+                    data = await self._client.get(f"{RESULT_PREFIX}:{key}")
+                    break  # the leader is gone, with or without a result
+        except redis.RedisError as e:
+            logging.warning(f"Waiting for the single-flight leader failed: {e}")
+        finally:
+            try:
+                await pubsub.aclose()
+            except redis.RedisError:
+                pass
+        answer = json.loads(data)["answer"] if data else None
+        return answer if answer is not None else await self._fallback(work)
+
+    async def _fallback(self, work: Callable[[], Awaitable[str]]) -> str:
+        record_single_flight("fallback")
+        return await work()
@@ -0,0 +1,46 @@
+# output redaction for streamed answers, applied before any token leaves the server
+import re
+from postprocess import redact_pii
+from guardrails import redact
+from config import STREAM_MAX_HOLD_CHARS
+
+_UNFINISHED_WORD = re.compile(r"\s*\S*\Z")  # and the whitespace before it, the answer is stripped at the end
+
+class StreamGuard:
+    """
+    Incremental secure_output + apply_guardrails over a token stream.
+
+    No PII pattern or banned word spans whitespace, so text before the last
+    whitespace seen can be redacted and released; only the unfinished word is
+    held back. A run without whitespace is released once it exceeds
+    STREAM_MAX_HOLD_CHARS, which bounds the lookahead. Up to that bound the
+    concatenated output equals redacting the whole answer at once.
+    """
+
+    def __init__(self, max_hold: int = STREAM_MAX_HOLD_CHARS):
+        self.max_hold = max_hold
+        self._pending = ""
+        self._started = False
+
+    def feed(self, text: str) -> str:
+        """Redacted text that is safe to send after appending `text`, possibly empty."""
+        self._pending += text
+        cut = _UNFINISHED_WORD.search(self._pending).start()
+        if cut == 0 and len(self._pending) > self.max_hold:
+            cut = len(self._pending)
+        return self._release(cut)
+
+    def flush(self) -> str:
+        """Redacted rest of the stream, called once generation has finished."""
+        return self._release(len(self._pending)).rstrip()
+
+    def _release(self, cut: int) -> str:
+        if cut == 0:
+            return ""
+        text, self._pending = self._pending[:cut], self._pending[cut:]
+        text = redact(redact_pii(text))
+        if not self._started:
+            # secure_output strips the answer, so leading whitespace is never sent
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
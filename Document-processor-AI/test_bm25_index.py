@@ -0,0 +1,131 @@
+"""
+Checks for the BM25 index: scoring, incremental commits, deletions, merges and fusion (no Redis or OpenAI needed).
+"""
+
+import os
+os.environ.setdefault("OPENAI_API_KEY", "test")  # retrieval imports the embeddings client, which refuses to start without one
+
+import math
+from collections import Counter
+import bm25_index
+from bm25_index import BM25Index, tokenize
+from retrieval import reciprocal_rank_fusion
+
+DOCS = [("a", "redis vector search with redis streams", {}), ("b", "vector databases store embeddings", {}),
+        ("c", "bm25 ranks documents by term frequency", {}), ("d", "streams of events in kafka", {})]
+
+
+def reference_scores(docs, query, k1=1.2, b=0.75):
+    counts = {chunk_id: Counter(tokenize(text)) for chunk_id, text, _ in docs}
+    avg_length = sum(sum(c.values()) for c in counts.values()) / len(counts)
+    scores = {}
+    for chunk_id, c in counts.items():
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in other for other in counts.values())
+            if c[term]:
+                idf = math.log(1 + (len(counts) - df + 0.5) / (df + 0.5))
+                score += idf * c[term] * (k1 + 1) / (c[term] + k1 * (1 - b + b * sum(c.values()) / avg_length))
+        if score:
+            scores[chunk_id] = score
+    return scores
+
+
+def test_scores_match_bm25(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.record(DOCS)
+    assert index.commit() and len(index) == 4
+    results = index.search("redis streams", k=10)
+    expected = reference_scores(DOCS, "redis streams")
+    assert [r[0] for r in results] == sorted(expected, key=expected.get, reverse=True) == ["a", "d"]
+    for chunk_id, _, _, score in results:
+        assert math.isclose(score, expected[chunk_id], rel_tol=1e-5)
+    assert index.search("unknown words", k=10) == [] and not index.commit()  # nothing logged, nothing written
+
+
+def test_commit_only_writes_the_change(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.record(DOCS[:3])
+    index.commit()
+    first = os.stat(tmp_path / "chunks.s0.jsonl")
+    index.record([DOCS[3]], deleted=["a"])
+    index.commit()
+    assert os.stat(tmp_path / "chunks.s0.jsonl").st_ino == first.st_ino  # the old segment is not rewritten
+    assert sum(1 for _ in open(tmp_path / "chunks.s1.jsonl")) == 1  # the new one holds the added chunk only
+    assert [r[0] for r in index.search("redis streams", k=10)] == ["d"]
+    assert len(index) == 3 and not (tmp_path / bm25_index.DOCS_FILE).exists()
+
+
+def test_readded_chunks_replace_their_old_copy(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.record(DOCS)
+    index.commit()
+    index.record([("a", "completely new text", {"page": 2})])
+    index.commit()
+    assert index.search("completely", k=5)[0][:3] == ("a", "completely new text", {"page": 2})
+    assert index.search("redis", k=5) == [] and len(index) == 4
+
+
+def test_deleted_segments_are_compacted_and_small_ones_merged(tmp_path):
+    index = BM25Index(str(tmp_path), max_segments=2, max_deleted_ratio=0.5)
+    for chunk in DOCS:  # one commit per chunk: the smallest segments are merged beyond two
+        index.record([chunk])
+        index.commit()
+    assert len(index._meta["segments"]) <= 2 and len(index) == 4
+    assert {r[0] for r in index.search("vector streams", k=10)} == {"a", "b", "d"}
+    index.record(deleted=["a", "b", "d"])
+    index.commit()
+    assert all(len(entry["deleted"]) <= 0.5 * entry["docs"] for entry in index._meta["segments"])
+    assert [r[0] for r in index.search("bm25 vector streams", k=10)] == ["c"] and len(index) == 1
+    index.record(deleted=["c"])
+    index.commit()
+    assert len(index) == 0 and index._meta["segments"] == []
+
+
+def test_reader_survives_retired_segments(tmp_path):
+    writer, reader = BM25Index(str(tmp_path), max_segments=1), BM25Index(str(tmp_path))
+    writer.record(DOCS[:2])
+    writer.commit()
+    assert {r[0] for r in reader.search("vector", k=5)} == {"a", "b"}
+    for chunk in DOCS[2:]:  # merges retire the segments the reader has mapped, and later delete their files
+        writer.record([chunk])
+        writer.commit()
+    assert {r[0] for r in reader.search("vector streams kafka", k=5)} == {"a", "b", "d"}
+    files = [pattern.format(segment=name) for pattern in bm25_index.SEGMENT_FILES for name in ("s2", "s4")]
+    assert sorted(os.listdir(tmp_path)) == sorted(files + ["meta.json"])  # the live segment and the one just retired
+
+    # a commit that lands while a reader opens a generation: the reader re-reads the meta file
+    opened = bm25_index._Segment
+    calls = []
+
+    def racing_segment(index, name):
+        calls.append(name)
+        if len(calls) == 1:
+            raise FileNotFoundError(name)
+        return opened(index, name)
+
+    late = BM25Index(str(tmp_path))
+    bm25_index._Segment = racing_segment
+    try:
+        assert len(late.search("kafka", k=5)) == 1 and len(calls) >= 2
+    finally:
+        bm25_index._Segment = opened
+
+
+def test_rrf_merges_by_rank():
+    dense = [("x", "", {}), ("y", "", {}), ("z", "", {})]
+    lexical = [("z", "", {}), ("w", "", {})]
+    fused = reciprocal_rank_fusion([dense, lexical], k=3, rrf_k=60)
+    assert [chunk[0] for chunk in fused] == ["z", "x", "y"]  # found by both ranks first
+    assert len(reciprocal_rank_fusion([dense, lexical], k=10)) == 4
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for test in (test_scores_match_bm25, test_commit_only_writes_the_change, test_readded_chunks_replace_their_old_copy,
+                 test_deleted_segments_are_compacted_and_small_ones_merged, test_reader_survives_retired_segments):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    test_rrf_merges_by_rank()
+    print("BM25 index checks passed")
@@ -0,0 +1,118 @@
+"""
+Checks for the Redis semantic cache capacity bound against fakeredis (no Redis or OpenAI needed).
+"""
+
+import time
+from types import SimpleNamespace
+import fakeredis
+import cache_eviction
+from cache_eviction import RedisEvictionPolicy, EXPIRES_KEY, HITS_KEY, META_KEY, PRIORITY_KEY
+
+
+def make_policy(max_entries=3, hot_hits=2, hot_ttl=600):
+    return RedisEvictionPolicy(fakeredis.FakeRedis(), max_entries, hot_hits, hot_ttl, age_seconds=3600)
+
+
+def write(policy, key, ttl=60, linked=()):
+    policy._client.set(key, "entry", ex=ttl)
+    for k in linked:
+        policy._client.set(k, "exact", ex=ttl)
+    return policy.record_set(key, linked=list(linked), ttl=ttl)
+
+
+def at(monkeypatch, now):
+    # the policy's clock only, fakeredis keeps real time for TTLs
+    monkeypatch.setattr(cache_eviction, "time", SimpleNamespace(time=lambda: now))
+
+
+def test_record_set_evicts_the_lowest_priority_entry_with_its_linked_keys(monkeypatch):
+    policy = make_policy()
+    start = time.time()
+    for i, key in enumerate(["a", "b", "c"]):
+        at(monkeypatch, start + i)
+        assert write(policy, key, linked=[f"exact:{key}"]) == []
+    policy.record_hit("a")
+    at(monkeypatch, start + 10)
+    evicted = write(policy, "d")
+    assert [key for key, _ in evicted] == ["b"]  # fewest hits, oldest of those
+    assert 8 < evicted[0][1] < 10  # its age
+    assert not policy._client.exists("b") and not policy._client.exists("exact:b")
+    assert policy._client.exists("exact:a")
+    assert policy.size() == 3
+    assert policy._client.hget(META_KEY, "b") is None
+
+
+def test_fresh_entries_outrank_old_ones_with_a_single_hit(monkeypatch):
+    policy = make_policy(max_entries=2)
+    start = time.time()
+    at(monkeypatch, start)
+    write(policy, "old")
+    policy.record_hit("old")
+    at(monkeypatch, start + 2 * 3600)
+    write(policy, "fresh")
+    at(monkeypatch, start + 2 * 3600 + 1)
+    evicted = write(policy, "newest")
+    # with hits alone the fresh entry (0 hits) would go before the old one (1 hit)
+    assert [key for key, _ in evicted] == ["old"]
+
+
+def test_the_entry_just_written_is_never_evicted(monkeypatch):
+    policy = make_policy(max_entries=1)
+    at(monkeypatch, time.time())
+    write(policy, "a")
+    for _ in range(3):
+        policy.record_hit("a")
+    # "b" has the lowest priority but was just written
+    assert [key for key, _ in write(policy, "b")] == ["a"]
+    assert policy._client.exists("b")
+
+
+def test_record_hit_extends_the_ttl_of_hot_entries():
+    policy = make_policy(hot_hits=2, hot_ttl=600)
+    write(policy, "a", ttl=60, linked=["exact:a"])
+    assert policy.record_hit("a") is False
+    assert policy._client.ttl("a") <= 60
+    assert policy.record_hit("a") is True
+    assert policy._client.ttl("a") > 60 and policy._client.ttl("exact:a") > 60
+    assert policy.record_hit("a") is False  # only when the threshold is crossed
+    assert policy._client.zscore(HITS_KEY, "a") == 3
+
+
+def test_prune_expired_forgets_gone_entries_and_reschedules_extended_ones():
+    policy = make_policy()
+    now = time.time()
+    write(policy, "gone", ttl=60)
+    write(policy, "extended", ttl=60)
+    policy._client.delete("gone")  # as if its TTL had run out
+    policy._client.expire("extended", 600)  # as if it became hot
+    policy._prune_expired(now + 120)
+    client = policy._client
+    assert client.zscore(HITS_KEY, "gone") is None and client.zscore(PRIORITY_KEY, "gone") is None
+    assert client.zscore(EXPIRES_KEY, "gone") is None and client.hget(META_KEY, "gone") is None
+    assert client.zscore(EXPIRES_KEY, "extended") > now + 500
+    assert policy.size() == 1
+
+
+def test_expired_entries_do_not_count_against_the_budget(monkeypatch):
+    policy = make_policy(max_entries=2)
+    start = time.time()
+    at(monkeypatch, start)
+    write(policy, "a")
+    write(policy, "b")
+    policy._client.delete("a")
+    at(monkeypatch, start + 120)  # past a's expiry time
+    assert write(policy, "c") == []
+    assert policy.size() == 2
+
+
+if __name__ == "__main__":
+    import pytest
+    for test in (test_record_set_evicts_the_lowest_priority_entry_with_its_linked_keys,
+                 test_fresh_entries_outrank_old_ones_with_a_single_hit,
+                 test_the_entry_just_written_is_never_evicted,
+                 test_expired_entries_do_not_count_against_the_budget):
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            test(monkeypatch)
+    test_record_hit_extends_the_ttl_of_hot_entries()
+    test_prune_expired_forgets_gone_entries_and_reschedules_extended_ones()
+    print("Cache eviction checks passed")
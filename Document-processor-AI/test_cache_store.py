@@ -0,0 +1,165 @@
+"""
+Checks for the answer cache's tiers, run in process or against fakeredis (no Redis or OpenAI needed).
+"""
+
+import os
+os.environ.setdefault("OPENAI_API_KEY", "test")  # the embeddings refuse to import without one
+
+import time
+import asyncio
+import fakeredis
+import numpy as np
+import cache_store
+from cache_eviction import HITS_KEY, RedisEvictionPolicy
+import embeddings
+import retrieval
+from embeddings import QuestionEmbedding
+from semantic_index import SemanticIndex
+from ttl_cache import TTLCache
+
+
+class FakeEmbedding:
+    """A request's question embedding, counting how often the vector is read."""
+
+    def __init__(self, vector):
+        self._vector = vector
+        self.reads = 0
+
+    @property
+    def vector(self):
+        self.reads += 1
+        return self._vector
+
+    async def avector(self):
+        return self.vector
+
+
+class OffLoopClient:
+    """A sync Redis client that fails when called on a running event loop, where it would block every request."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return getattr(self._client, name)
+        raise AssertionError(f"sync Redis call {name} on the event loop")
+
+
+def isolate(monkeypatch, client=None):
+    """cache_store with fresh tiers, in process or on the given (fake) Redis; returns the settable version."""
+    version = ["1-p"]
+    monkeypatch.setattr(cache_store, "USE_REDIS", client is not None)
+    monkeypatch.setattr(cache_store, "_client", client if client is not None else {})
+    monkeypatch.setattr(cache_store, "_remote_cache", None)
+    monkeypatch.setattr(cache_store, "_eviction", None)
+    monkeypatch.setattr(cache_store, "_index", SemanticIndex(max_entries=100))
+    monkeypatch.setattr(cache_store, "_exact_local", TTLCache(max_entries=100))
+    monkeypatch.setattr(cache_store, "_seen_version", None)
+    monkeypatch.setattr(cache_store, "current_version", lambda: version[0])
+    return version
+
+
+def unit(seed, dim=16):
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_exact_tier_answers_without_an_embedding(monkeypatch):
+    isolate(monkeypatch)
+    cache_store.set("What is RAG?", "retrieval augmented generation", ttl=60, embedding=FakeEmbedding(unit(0)))
+
+    # the same question up to case, spacing and trailing punctuation never reads the embedding
+    embedding = FakeEmbedding(unit(1))
+    assert cache_store.get("  what is   RAG ", 0.9, embedding=embedding) == "retrieval augmented generation"
+    assert embedding.reads == 0
+
+    # any other question falls through to the semantic tier
+    embedding = FakeEmbedding(unit(2))
+    assert cache_store.get("What is a vector store?", 0.9, embedding=embedding) is None
+    assert embedding.reads == 1
+
+
+def test_exact_tier_is_scoped_to_the_cache_version(monkeypatch):
+    version = isolate(monkeypatch)
+    cache_store.set("What is RAG?", "old answer", ttl=60, embedding=FakeEmbedding(unit(0)))
+    version[0] = "2-p"
+    embedding = FakeEmbedding(unit(3))
+    assert cache_store.get("What is RAG?", 0.9, embedding=embedding) is None
+    assert embedding.reads == 1
+
+
+def test_a_request_embeds_its_question_once(monkeypatch):
+    isolate(monkeypatch)
+    calls, searched = [], []
+    monkeypatch.setattr(embeddings, "get_embedding", lambda text: calls.append(text) or unit(4))
+    monkeypatch.setattr(retrieval, "_search", lambda query, k, vector: searched.append(vector) or [("c1", "text", {})])
+    monkeypatch.setattr(retrieval, "_exact_results", TTLCache(max_entries=100))
+    monkeypatch.setattr(retrieval, "_similar_results", SemanticIndex(max_entries=100))
+
+    # what run_pipeline does on a miss: cache lookup, retrieval, cache write
+    embedding = QuestionEmbedding("What is RAG?")
+    assert cache_store.get("What is RAG?", 0.9, embedding=embedding) is None
+    retrieval.retrieve_chunks_cached("What is RAG?", k=1, embedding=embedding)
+    cache_store.set("What is RAG?", "an answer", ttl=60, embedding=embedding)
+    assert calls == ["What is RAG?"]
+    assert searched[0] is embedding.vector  # retrieval searched with the lookup's vector
+
+
+def test_a_new_generation_purges_older_entries(monkeypatch):
+    client = fakeredis.FakeRedis()
+    version = isolate(monkeypatch, client)
+    monkeypatch.setattr(cache_store, "_eviction", RedisEvictionPolicy(client, 100, 5, 600))
+    # same generation, another prompt: a pod on the other side of a rolling deploy
+    version[0] = "2-q"
+    cache_store.set("Other prompt?", "kept", ttl=60, embedding=FakeEmbedding(unit(5)))
+    version[0] = "1-p"
+    cache_store.set("What is RAG?", "old answer", ttl=60, embedding=FakeEmbedding(unit(6)))
+    old_key, kept_key = cache_store._entry_key("What is RAG?", None), cache_store._entry_key("Other prompt?", None)
+    assert client.exists(old_key) and old_key in cache_store._index
+
+    version[0] = "2-p"
+    assert cache_store.get("What is RAG?", 0.9, embedding=FakeEmbedding(unit(6))) is None  # stamped 1-p
+    deadline = time.time() + 5
+    while old_key in cache_store._index and time.time() < deadline:
+        time.sleep(0.01)  # the purge runs in a background thread
+    assert old_key not in cache_store._index
+    assert not client.exists(old_key) and client.zscore(HITS_KEY, old_key) is None
+    assert kept_key in cache_store._index and client.exists(kept_key)
+
+
+def test_async_path_reaches_redis_without_blocking_the_loop(monkeypatch):
+    server = fakeredis.FakeServer()
+    client = OffLoopClient(fakeredis.FakeRedis(server=server))
+    isolate(monkeypatch, client)
+    monkeypatch.setattr(cache_store, "_aclient", fakeredis.FakeAsyncRedis(server=server))
+    monkeypatch.setattr(cache_store, "_eviction", RedisEvictionPolicy(client, 100, 5, 600))
+
+    async def get_version():
+        return "1-p"
+
+    monkeypatch.setattr(cache_store, "acurrent_version", get_version)
+    vector = unit(7)
+
+    async def main():
+        await cache_store.aset("What is RAG?", "an answer", ttl=60, embedding=FakeEmbedding(vector))
+        cache_store._exact_local = TTLCache(max_entries=100)  # as on another worker: only Redis has the entry
+        exact = await cache_store.aget("what is rag", 0.9, embedding=FakeEmbedding(unit(8)))
+        similar = await cache_store.aget("Explain RAG", 0.9, embedding=FakeEmbedding(vector))
+        return exact, similar
+
+    assert asyncio.run(main()) == ("an answer", "an answer")
+    key = cache_store._entry_key("What is RAG?", vector)
+    assert client.exists(key) and client.zscore(HITS_KEY, key) == 2  # bookkeeping ran off the loop
+
+
+if __name__ == "__main__":
+    import pytest
+    for test in (test_exact_tier_answers_without_an_embedding, test_exact_tier_is_scoped_to_the_cache_version,
+                 test_a_request_embeds_its_question_once, test_a_new_generation_purges_older_entries,
+                 test_async_path_reaches_redis_without_blocking_the_loop):
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            test(monkeypatch)
+    print("Cache store checks passed")
@@ -0,0 +1,40 @@
+"""
+Checks for token-budgeted context packing (no Redis or OpenAI needed).
+"""
+
+from context_packer import pack_context
+
+PAGE = "Agentic systems plan, call tools and check their own results before answering. " * 4
+
+
+def chunk(id_, start, end, page=0, source="a.pdf"):
+    return id_, PAGE[start:end], {"source": source, "page": page, "start": start, "tokens": (end - start) // 4}
+
+
+def test_overlapping_chunks_are_merged():
+    # ranked out of page order, overlapping by 20 characters
+    context, tokens = pack_context([chunk("b", 80, 200), chunk("a", 0, 100)], budget=1000)
+    assert context == PAGE[0:200]
+    assert tokens == 25 + 25  # the second chunk only adds its 100 characters past the overlap
+
+
+def test_duplicates_are_dropped():
+    same_text = [chunk("a", 0, 100), ("legacy", PAGE[10:50], {}), chunk("c", 0, 100, source="copy.pdf")]
+    context, _ = pack_context(same_text, budget=1000)
+    assert context == PAGE[0:100]
+
+
+def test_budget_keeps_best_ranked_spans():
+    chunks = [("a", "first", {"tokens": 30}), ("b", "second", {"tokens": 30}), ("c", "third", {"tokens": 10})]
+    context, tokens = pack_context(chunks, budget=45)
+    assert context == "first\nthird" and tokens == 40
+
+    context, tokens = pack_context([chunk("a", 0, 200)], budget=10)
+    assert context == PAGE[0:40] and tokens == 10
+
+
+if __name__ == "__main__":
+    test_overlapping_chunks_are_merged()
+    test_duplicates_are_dropped()
+    test_budget_keeps_best_ranked_spans()
+    print("Context packing checks passed")
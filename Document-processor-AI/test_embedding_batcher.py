@@ -0,0 +1,52 @@
+"""
+Checks for micro-batched embedding calls (no Redis or OpenAI needed).
+"""
+
+import asyncio
+import numpy as np
+from embedding_batcher import EmbeddingBatcher
+
+
+class FakeEmbeddings:
+    def __init__(self, fail=False):
+        self.requests = []
+        self.fail = fail
+
+    async def __call__(self, texts):
+        self.requests.append(texts)
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("rate limited")
+        return np.array([[len(text), i] for i, text in enumerate(texts)], dtype=np.float32)
+
+
+def embed_all(batcher, texts):
+    async def main():
+        return await asyncio.gather(*(batcher.embed(text) for text in texts))
+    return asyncio.run(main())
+
+
+def test_concurrent_texts_share_requests():
+    fake = FakeEmbeddings()
+    batcher = EmbeddingBatcher(fake, max_size=4, max_wait=0.05)
+    texts = ["a", "bb", "ccc", "bb", "dddd", "eeeee", "ffffff"]
+    vectors = embed_all(batcher, texts)
+    assert fake.requests == [["a", "bb", "ccc"], ["dddd", "eeeee", "ffffff"]]  # full at 4, duplicates embedded once
+    assert [int(vector[0]) for vector in vectors] == [len(text) for text in texts]
+    # a later call on a new event loop starts a new batch
+    assert int(embed_all(batcher, ["gg"])[0][0]) == 2 and fake.requests[-1] == ["gg"]
+
+
+def test_errors_reach_every_caller():
+    batcher = EmbeddingBatcher(FakeEmbeddings(fail=True), max_size=8, max_wait=0.001)
+
+    async def main():
+        return await asyncio.gather(*(batcher.embed(text) for text in ["a", "b"]), return_exceptions=True)
+
+    assert [str(result) for result in asyncio.run(main())] == ["rate limited"] * 2
+
+
+if __name__ == "__main__":
+    test_concurrent_texts_share_requests()
+    test_errors_reach_every_caller()
+    print("Embedding batcher checks passed")
@@ -0,0 +1,47 @@
+"""
+Checks for hybrid retrieval: chunk ids of dense hits and their fusion with BM25 hits (no Redis or OpenAI needed).
+"""
+
+import os
+os.environ.setdefault("OPENAI_API_KEY", "test")  # llm_client and the embeddings refuse to import without one
+
+from langchain_core.documents import Document
+import vector_store
+from retrieval import reciprocal_rank_fusion
+
+
+def dense_results(chunks):
+    # what RedisVectorStore.similarity_search_by_vector returns: metadata only, Document.id is None
+    return [Document(page_content=text, metadata={**metadata, "chunk_id": chunk_id}) for chunk_id, text, metadata in chunks]
+
+
+def test_dense_hits_keep_distinct_ids_through_fusion(monkeypatch):
+    dense = [(f"d{i}", f"dense text {i}", {"source": "a.pdf", "parent_id": f"p{i}"}) for i in range(4)]
+    lexical = [("d1", "dense text 1", {"source": "a.pdf", "parent_id": "p1"}),
+               ("b0", "lexical text 0", {"source": "b.pdf"}), ("b1", "lexical text 1", {"source": "b.pdf"})]
+    monkeypatch.setattr(vector_store, "_local", None)
+    monkeypatch.setattr(vector_store, "_with_store", lambda search: dense_results(dense))
+    hits = vector_store.retrieve_chunks("q", k=4, embedding=[0.0] * 8)
+    assert hits == dense  # ids come from the stored metadata, which keeps nothing else added
+
+    fused = reciprocal_rank_fusion([hits, lexical], k=10)
+    assert sorted(chunk_id for chunk_id, _, _ in fused) == ["b0", "b1", "d0", "d1", "d2", "d3"]
+    assert fused[0][0] == "d1"  # ranked by both
+    # chunks without a stored parent stand for themselves and are not merged
+    parents = {f"p{i}": (f"section {i}", {"source": "a.pdf"}) for i in range(4)}
+    assert len(vector_store._replace_by_parents(fused, parents, k=10)) == 6
+
+
+def test_chunks_without_a_stored_id_stay_distinct(monkeypatch):
+    monkeypatch.setattr(vector_store, "_local", None)
+    monkeypatch.setattr(vector_store, "_with_store",
+                        lambda search: [Document(page_content=f"text {i}") for i in range(3)])
+    assert len({chunk_id for chunk_id, _, _ in vector_store.retrieve_chunks("q", k=3, embedding=[0.0] * 8)}) == 3
+
+
+if __name__ == "__main__":
+    import pytest
+    for test in (test_dense_hits_keep_distinct_ids_through_fusion, test_chunks_without_a_stored_id_stay_distinct):
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            test(monkeypatch)
+    print("Hybrid retrieval checks passed")
@@ -0,0 +1,150 @@
+"""
+Checks for the LLM call policy: hedging, retries, fail-over and deadlines (no Redis or OpenAI needed).
+"""
+
+import os
+os.environ.setdefault("OPENAI_API_KEY", "test")  # llm_client refuses to import without one
+
+import time
+import asyncio
+import httpx
+import openai
+from langchain_core.messages import AIMessage, AIMessageChunk
+import llm_client
+from circuit_breaker import CircuitBreaker
+
+
+class FakeChat:
+    def __init__(self, delays=(), errors=()):
+        self.delays = list(delays)  # seconds per call, the last one repeats
+        self.errors = list(errors)  # exceptions raised by the first calls
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.delays[min(self.calls, len(self.delays)) - 1] if self.delays else 0)
+        if self.errors:
+            raise self.errors.pop(0)
+        return AIMessage(content=f" answer {self.calls} ")
+
+    async def astream(self, prompt):
+        answer = await self.ainvoke(prompt)
+        for word in answer.content.split(" "):
+            await asyncio.sleep(0.01)
+            yield AIMessageChunk(content=word)
+
+    def invoke(self, prompt, timeout=None):
+        if self.errors:
+            self.calls += 1
+            raise self.errors.pop(0)
+        return asyncio.run(self.ainvoke(prompt))
+
+
+def use_chats(monkeypatch, chats):
+    # pytest's monkeypatch undoes these after each test
+    monkeypatch.setattr(llm_client, "_get_chat", chats.__getitem__)
+    monkeypatch.setattr(llm_client, "_breakers", {})
+    monkeypatch.setattr(llm_client, "_latencies", {})
+    monkeypatch.setattr(llm_client, "_backoff", lambda attempt: 0.0)
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+def test_slow_call_is_hedged(monkeypatch):
+    chat = FakeChat(delays=[0.5, 0.01])
+    use_chats(monkeypatch, {"primary": chat})
+    llm_client._latencies["primary"] = llm_client.deque([0.01] * llm_client.LLM_HEDGE_MIN_SAMPLES)
+    t0 = time.monotonic()
+    assert asyncio.run(llm_client.acall("primary", "q")) == "answer 2"  # the hedge answered first
+    assert time.monotonic() - t0 < 0.3 and chat.calls == 2
+
+
+def test_no_hedge_without_enough_samples(monkeypatch):
+    chat = FakeChat(delays=[0.05])
+    use_chats(monkeypatch, {"primary": chat})
+    assert asyncio.run(llm_client.acall("primary", "q")) == "answer 1" and chat.calls == 1
+
+
+def test_retryable_errors_are_retried(monkeypatch):
+    chat = FakeChat(errors=[connection_error()])
+    use_chats(monkeypatch, {"primary": chat})
+    assert asyncio.run(llm_client.acall("primary", "q")) == "answer 2"
+    assert llm_client.call("primary", "q") == "answer 3"
+
+
+def test_open_breaker_fails_over(monkeypatch):
+    primary, fallback = FakeChat(errors=[ValueError("bad request")]), FakeChat()
+    use_chats(monkeypatch, {"primary": primary, llm_client.FALLBACK_MODEL: fallback})
+    llm_client._breakers["primary"] = CircuitBreaker(failures=1, cooldown=60)
+    assert asyncio.run(llm_client.acall("primary", "q")) == "answer 1"  # not retried, answered by the fallback
+    assert asyncio.run(llm_client.acall("primary", "q")) == "answer 2"  # breaker open, primary skipped
+    assert primary.calls == 1 and fallback.calls == 2
+
+
+def test_deadline_is_enforced(monkeypatch):
+    use_chats(monkeypatch, {"primary": FakeChat(delays=[1.0])})
+    t0 = time.monotonic()
+    try:
+        asyncio.run(llm_client.acall("primary", "q", deadline=time.monotonic() + 0.1))
+    except TimeoutError:
+        assert time.monotonic() - t0 < 0.5
+    else:
+        raise AssertionError("expected TimeoutError")
+
+
+def test_half_open_trial_always_ends(monkeypatch):
+    use_chats(monkeypatch, {"primary": FakeChat(delays=[1.0])})
+    breaker = llm_client._breakers["primary"] = CircuitBreaker(failures=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    try:  # the trial call runs out of time: counted as a failure, the breaker opens again
+        asyncio.run(llm_client.acall("primary", "q", deadline=time.monotonic() + 0.05))
+    except TimeoutError:
+        pass
+    assert breaker.state == "open"
+    time.sleep(0.06)
+
+    async def cancelled_trial():
+        task = asyncio.create_task(llm_client.acall("primary", "q"))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(cancelled_trial())  # no outcome: the next call gets the trial
+    assert breaker.state == "half_open" and breaker.allow()
+
+
+def stream(model, deadline=None):
+    async def main():
+        return [text async for text in llm_client.astream(model, "q", deadline=deadline)]
+    return asyncio.run(main())
+
+
+def test_stream_retries_and_fails_over_before_the_first_text(monkeypatch):
+    primary, fallback = FakeChat(errors=[connection_error(), ValueError("bad request")]), FakeChat()
+    use_chats(monkeypatch, {"primary": primary, llm_client.FALLBACK_MODEL: fallback})
+    assert stream("primary") == ["answer", "1"]  # retried once, then answered by the fallback
+    assert primary.calls == 2 and llm_client._breaker("primary").state == "closed"
+
+
+def test_stream_deadline_is_enforced(monkeypatch):
+    use_chats(monkeypatch, {"primary": FakeChat(delays=[1.0])})
+    t0 = time.monotonic()
+    try:
+        stream("primary", deadline=time.monotonic() + 0.1)
+    except TimeoutError:
+        assert time.monotonic() - t0 < 0.5
+    else:
+        raise AssertionError("expected TimeoutError")
+
+
+if __name__ == "__main__":
+    import pytest
+    for test in (test_slow_call_is_hedged, test_no_hedge_without_enough_samples, test_retryable_errors_are_retried,
+                 test_open_breaker_fails_over, test_deadline_is_enforced, test_half_open_trial_always_ends,
+                 test_stream_retries_and_fails_over_before_the_first_text, test_stream_deadline_is_enforced):
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            test(monkeypatch)
+    print("LLM client checks passed")
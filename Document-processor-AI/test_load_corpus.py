@@ -0,0 +1,151 @@
+"""
+Checks for corpus ingestion against an in-memory store, with text files standing in for PDFs (no Redis or OpenAI needed).
+"""
+
+import os
+os.environ.setdefault("OPENAI_API_KEY", "test")  # the embeddings refuse to import without one
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_core.documents.base import Document
+import corpus_manifest
+import load_corpus
+from bm25_index import BM25Index
+
+
+class FakeStore:
+    """The vector store functions load_corpus calls, over dicts; counts embedded texts."""
+
+    def __init__(self):
+        self.chunks, self.parents, self.embedded = {}, {}, []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+    def add_embedded(self, texts, vectors, metadatas=None, ids=None):
+        self.chunks.update(zip(ids, texts))
+
+    def add_parents(self, parents):
+        self.parents.update((id_, text) for id_, text, _ in parents)
+
+    def existing_ids(self, ids):
+        return {id_ for id_ in ids if id_ in self.chunks}
+
+    def delete_ids(self, ids):
+        for id_ in ids:
+            self.chunks.pop(id_, None)
+
+    def delete_parents(self, ids):
+        for id_ in ids:
+            self.parents.pop(id_, None)
+
+
+def text_sections(path, *args, **kwargs):
+    # one section and chunk per line; a line "FAIL" makes parsing fail like a broken PDF
+    with open(path, encoding="utf-8") as f:
+        for line in filter(None, (line.strip() for line in f)):
+            if line == "FAIL":
+                raise ValueError(f"cannot parse {path}")
+            yield (Document(page_content=line, metadata={"page": 0, "start_index": 0}),
+                   [Document(page_content=line, metadata={"page": 0, "start_index": 0})])
+
+
+def isolate(monkeypatch, tmp_path) -> FakeStore:
+    store = FakeStore()
+    for name in ("add_embedded", "add_parents", "existing_ids", "delete_ids", "delete_parents"):
+        monkeypatch.setattr(load_corpus, name, getattr(store, name))
+    monkeypatch.setattr(load_corpus, "get_embeddings", store.embed)
+    monkeypatch.setattr(load_corpus, "iter_sections", text_sections)
+    monkeypatch.setattr(load_corpus, "lexical_index", BM25Index(str(tmp_path / "bm25")))
+    manifests = {}
+    monkeypatch.setattr(corpus_manifest, "load", manifests.get)
+    monkeypatch.setattr(corpus_manifest, "save", lambda source, digest, ids, parent_ids=None: manifests.__setitem__(
+        source, {"file_sha256": digest, "chunk_ids": list(ids), "parent_ids": list(parent_ids or [])}))
+    return store
+
+
+def write_files(tmp_path, files: dict) -> list[str]:
+    paths = []
+    for name, lines in files.items():
+        path = tmp_path / name
+        path.write_text("\n".join(lines), encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def test_ingest_many_reports_failed_files_without_stopping(monkeypatch, tmp_path):
+    store = isolate(monkeypatch, tmp_path)
+    # the parsing pool runs in threads here, the patched parser is not visible to worker processes
+    monkeypatch.setattr(load_corpus, "ProcessPoolExecutor", ThreadPoolExecutor)
+    paths = write_files(tmp_path, {"a.pdf": ["alpha one", "alpha two"], "b.pdf": ["FAIL"],
+                                   "c.pdf": ["gamma one", "gamma two", "gamma three"]})
+    assert load_corpus.ingest_many(paths, workers=2, batch_size=2, max_concurrent=2, per_second=0) == 5
+    assert sorted(store.chunks.values()) == ["alpha one", "alpha two", "gamma one", "gamma three", "gamma two"]
+    load_corpus.lexical_index.commit()
+    assert [hit[1] for hit in load_corpus.lexical_index.search("gamma three", 1)] == ["gamma three"]
+
+    # a second run skips the unchanged files and retries the failed one
+    assert load_corpus.ingest_many(paths, workers=2, batch_size=2, max_concurrent=2, per_second=0) == 0
+    assert len(store.embedded) == 5
+
+
+def test_reingestion_writes_only_what_changed(monkeypatch, tmp_path):
+    store = isolate(monkeypatch, tmp_path)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    path, = write_files(tmp_path, {"doc.pdf": ["first section", "second section", "third section"]})
+    assert load_corpus.ingest(path, batch_size=2, checkpoint_path=checkpoint) == 3
+    load_corpus.lexical_index.commit()
+    ids = dict(zip(store.chunks.values(), store.chunks))
+
+    # unchanged file: skipped before parsing
+    monkeypatch.setattr(load_corpus, "iter_sections", None)
+    assert load_corpus.ingest(path, batch_size=2, checkpoint_path=checkpoint) == 0
+    monkeypatch.setattr(load_corpus, "iter_sections", text_sections)
+
+    # one section edited, one removed: only the new chunk is embedded, the old ones are deleted
+    write_files(tmp_path, {"doc.pdf": ["first section", "second section, edited"]})
+    store.embedded.clear()
+    assert load_corpus.ingest(path, batch_size=2, checkpoint_path=checkpoint) == 3
+    assert store.embedded == ["second section, edited"]
+    assert sorted(store.chunks.values()) == ["first section", "second section, edited"]
+    assert ids["first section"] in store.chunks  # content ids: the kept chunk was not rewritten
+    assert sorted(store.parents.values()) == ["first section", "second section, edited"]
+    assert load_corpus.lexical_index.commit()
+    assert [hit[0] for hit in load_corpus.lexical_index.search("third", 5)] == []
+    assert not os.path.exists(checkpoint)
+
+
+def test_request_limiter_caps_concurrency_and_rate():
+    limiter = load_corpus.RequestLimiter(max_concurrent=2, per_second=50)
+    running, peak, starts = [0], [0], []
+
+    async def request():
+        async with limiter:
+            starts.append(time.monotonic())
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.1)  # longer than the 20ms between starts, so requests overlap
+            running[0] -= 1
+
+    async def main():
+        await asyncio.gather(*(request() for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak[0] == 2
+    gaps = np.diff(sorted(starts))
+    assert (gaps >= 0.018).all()  # at most 50 starts per second
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    import pytest
+    with pytest.MonkeyPatch.context() as monkeypatch, tempfile.TemporaryDirectory() as path:
+        test_ingest_many_reports_failed_files_without_stopping(monkeypatch, Path(path))
+    with pytest.MonkeyPatch.context() as monkeypatch, tempfile.TemporaryDirectory() as path:
+        test_reingestion_writes_only_what_changed(monkeypatch, Path(path))
+    test_request_limiter_caps_concurrency_and_rate()
+    print("Corpus ingestion checks passed")
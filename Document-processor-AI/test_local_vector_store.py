@@ -0,0 +1,158 @@
+"""
+Checks for the local memory-mapped vector store backend (no Redis or OpenAI needed).
+"""
+
+import tempfile
+import threading
+import numpy as np
+from local_vector_store import LocalVectorStore, LocalParentStore
+
+
+def test_local_vector_store():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, 16)).astype(np.float32)
+    ids = [f"c{i}" for i in range(len(vectors))]
+
+    with tempfile.TemporaryDirectory() as path:
+        writer = LocalVectorStore(path)
+        reader = LocalVectorStore(path)  # another worker mapping the same files
+        writer.add(ids[:300], [f"text {i}" for i in range(300)], vectors[:300])
+        writer.add(ids[300:], [f"text {i}" for i in range(300, 500)], vectors[300:], [{"source": "b.pdf"}] * 200)
+        assert len(reader) == 500
+
+        record, score = reader.search(vectors[42] * 3, k=1)[0]
+        assert record["id"] == "c42" and record["text"] == "text 42"
+        assert abs(score - 1.0) < 1e-5
+        assert reader.search(vectors[420], k=1)[0][0]["metadata"] == {"source": "b.pdf"}
+
+        # deleted chunks never match, re-adding an id replaces it; readers see every write as a new revision
+        revision = reader.revision
+        writer.delete(["c42"])
+        assert reader.search(vectors[42], k=1)[0][0]["id"] != "c42"
+        assert reader.revision == revision + 1
+        writer.add(["c7"], ["replaced"], vectors[7:8])
+        assert reader.search(vectors[7], k=1)[0][0]["text"] == "replaced"
+        assert reader.revision == revision + 2
+        assert writer.existing_ids(["c7", "c42", "missing"]) == {"c7"}
+
+        # after an IVF build, exact matches are still found and new rows are searched too
+        writer.build_ivf(lists=8)
+        reader.probes = 2
+        assert len(reader) == 499
+        assert all(reader.search(vectors[i], k=1)[0][0]["id"] == f"c{i}" for i in (0, 150, 499))
+        writer.add(["new"], ["new text"], -vectors[:1])
+        assert reader.search(-vectors[0], k=1)[0][0]["id"] == "new"
+
+
+def test_local_vector_store_quantized():
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((400, 64)).astype(np.float32)
+    for scheme in ("int8", "binary"):
+        with tempfile.TemporaryDirectory() as path:
+            writer = LocalVectorStore(path, quantization=scheme, rescore_candidates=16)
+            reader = LocalVectorStore(path, rescore_candidates=16)  # the scheme is read from the index
+            writer.add([f"c{i}" for i in range(400)], [f"text {i}" for i in range(400)], vectors)
+            record, score = reader.search(vectors[42], k=1)[0]
+            assert record["id"] == "c42" and abs(score - 1.0) < 1e-5  # rescored with the float rows
+            writer.delete(["c42"])
+            assert "c42" not in [r["id"] for r, _ in reader.search(vectors[42], k=3)]
+            writer.build_ivf(lists=4)
+            assert all(reader.search(vectors[i], k=1)[0][0]["id"] == f"c{i}" for i in (0, 150, 399))
+
+
+def test_local_parent_store():
+    with tempfile.TemporaryDirectory() as path:
+        writer = LocalParentStore(path)
+        reader = LocalParentStore(path)
+        assert reader.get(["p1"]) == {}
+        writer.add([("p1", "section one", {"page": 0}), ("p2", "section two", {"page": 1})])
+        assert reader.get(["p2", "p1", "missing"]) == {"p2": ("section two", {"page": 1}),
+                                                      "p1": ("section one", {"page": 0})}
+        writer.delete(["p1"])
+        assert reader.get(["p1", "p2"]) == {"p2": ("section two", {"page": 1})}
+
+
+def test_local_vector_store_concurrent_writers():
+    with tempfile.TemporaryDirectory() as path:
+        store = LocalVectorStore(path)
+
+        def write(thread):  # like load_corpus, which adds from several threads
+            rng = np.random.default_rng(thread)
+            for batch in range(10):
+                ids = [f"t{thread}-{batch}-{i}" for i in range(16)]
+                store.add(ids, ids, rng.standard_normal((16, 8)))
+
+        threads = [threading.Thread(target=write, args=(thread,)) for thread in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(store) == len(LocalVectorStore(path)) == 640
+
+
+def test_local_vector_store_optimize():
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((700, 16)).astype(np.float32)
+    ids = [f"c{i}" for i in range(len(vectors))]
+    with tempfile.TemporaryDirectory() as path:
+        writer, reader = LocalVectorStore(path), LocalVectorStore(path, probes=64)
+        # below the IVF threshold, deleted rows are dropped only past the ratio
+        writer.add(ids[:100], ids[:100], vectors[:100])
+        writer.delete(ids[:10])
+        assert writer.optimize(min_ivf_rows=500, rebuild_ratio=0.2) == "none"
+        writer.delete(ids[10:30])
+        assert writer.optimize(min_ivf_rows=500, rebuild_ratio=0.2) == "compact"
+        assert writer._meta["count"] == len(reader) == 70 and writer._meta["deleted"] == []
+
+        writer.add(ids[100:600], ids[100:600], vectors[100:600])
+        assert writer.optimize(min_ivf_rows=500, rebuild_ratio=0.2) == "build"
+        generation = writer._meta["generation"]
+        # a small change is assigned to the existing lists, no row is rewritten
+        writer.add(ids[600:650], ids[600:650], vectors[600:650])
+        assert writer.optimize(min_ivf_rows=500, rebuild_ratio=0.2) == "assign"
+        assert writer._meta["generation"] == generation and writer._meta["ivf_tail"] == writer._meta["count"]
+        assert all(reader.search(vectors[i], k=1)[0][0]["id"] == f"c{i}" for i in (40, 300, 610, 649))
+        writer.add(ids[650:660], ids[650:660], vectors[650:660])  # not assigned yet, scanned linearly
+        assert reader.search(vectors[655], k=1)[0][0]["id"] == "c655"
+        # past the ratio the lists are rebuilt
+        writer.add(ids[660:], ids[660:], vectors[660:])
+        writer.delete(ids[100:200])
+        assert writer.optimize(min_ivf_rows=500, rebuild_ratio=0.2) == "build"
+        assert writer._meta["generation"] == generation + 1 and writer._meta["count"] == len(reader) == 570
+        assert reader.search(vectors[150], k=1)[0][0]["id"] != "c150"
+
+
+def test_local_vector_store_reader_survives_a_rewrite():
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((200, 8)).astype(np.float32)
+    with tempfile.TemporaryDirectory() as path:
+        writer = LocalVectorStore(path)
+        writer.add([f"c{i}" for i in range(200)], [str(i) for i in range(200)], vectors)
+        reader = LocalVectorStore(path)
+        assert reader.search(vectors[5], k=1)[0][0]["id"] == "c5"
+        writer.build_ivf(lists=4)
+        writer.build_ivf(lists=4)  # the generation the reader maps is deleted now
+        assert reader.search(vectors[5], k=1)[0][0]["id"] == "c5"
+
+        # a rewrite that lands while a reader maps a generation: the reader re-reads meta.json
+        late, mapped = LocalVectorStore(path), []
+        original = late._map
+
+        def racing_map(stamp):
+            mapped.append(stamp)
+            if len(mapped) == 1:
+                raise FileNotFoundError("retired generation")
+            original(stamp)
+
+        late._map = racing_map
+        assert late.search(vectors[7], k=1)[0][0]["id"] == "c7" and len(mapped) == 2
+
+
+if __name__ == "__main__":
+    test_local_vector_store()
+    test_local_vector_store_quantized()
+    test_local_vector_store_concurrent_writers()
+    test_local_vector_store_optimize()
+    test_local_vector_store_reader_survives_a_rewrite()
+    test_local_parent_store()
+    print("Local vector store checks passed")
@@ -0,0 +1,136 @@
+"""
+Checks for the LSH-partitioned semantic cache backend against fakeredis (no Redis or OpenAI needed).
+"""
+
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import fakeredis
+import numpy as np
+from lsh_cache import LSHCache, MEMBERS_PREFIX
+
+DIM = 64
+
+
+def make_cache(probes=4, max_candidates=64, rescore=8):
+    return LSHCache(fakeredis.FakeRedis(), bits=6, probes=probes, seed=42,
+                    max_candidates=max_candidates, rescore_candidates=rescore)
+
+
+def unit(vec):
+    return (vec / np.linalg.norm(vec)).astype(np.float32)
+
+
+def near(rng, vec, noise=0.05):
+    return unit(vec + noise * rng.standard_normal(len(vec)).astype(np.float32))
+
+
+def add(cache, name, vec, answer, ttl=None, version="1-p"):
+    key = cache.key(name, vec)
+    cache.add(key, name, vec, answer, ttl=ttl, version=version)
+    return key
+
+
+def test_set_stores_a_hash_with_the_vector_apart_from_the_answer():
+    cache = make_cache()
+    vec = unit(np.random.default_rng(0).standard_normal(DIM).astype(np.float32))
+    key = add(cache, "q1", vec, "answer one")
+    client = cache._client
+    assert client.type(key) == b"hash"
+    entry = client.hgetall(key)
+    assert entry[b"answer"] == b"answer one" and entry[b"version"] == b"1-p"
+    assert np.array_equal(np.frombuffer(entry[b"embedding"], dtype=np.float32), vec)
+    assert len(entry[b"codes"]) == DIM
+    bucket = key.split("{", 1)[1].split("}", 1)[0]
+    assert client.smembers(f"{MEMBERS_PREFIX}:{{{bucket}}}") == {key.encode()}
+
+
+def test_search_finds_the_closest_entry_and_its_answer():
+    rng = np.random.default_rng(1)
+    cache = make_cache(probes=63, rescore=4)
+    vectors = [unit(rng.standard_normal(DIM).astype(np.float32)) for _ in range(20)]
+    keys = [add(cache, f"q{i}", vec, f"answer {i}") for i, vec in enumerate(vectors)]
+    query = near(rng, vectors[7])
+    key, answer, score = cache.search(query, version="1-p")
+    assert (key, answer) == (keys[7], "answer 7")
+    assert abs(score - float(vectors[7] @ query)) < 1e-5  # rescored against the float32 embedding
+
+    # without rescoring the int8 estimate is returned
+    cache._rescore = 0
+    key, answer, score = cache.search(query, version="1-p")
+    assert key == keys[7] and abs(score - float(vectors[7] @ query)) < 0.02
+
+
+def test_search_skips_other_versions_and_deletes_older_generations():
+    rng = np.random.default_rng(2)
+    cache = make_cache()
+    vec = unit(rng.standard_normal(DIM).astype(np.float32))
+    old = add(cache, "old", vec, "old answer", version="1-p")
+    other = add(cache, "other", near(rng, vec, 0.01), "other prompt", version="2-q")
+    assert cache.search(vec, version="2-p") is None
+    assert not cache._client.exists(old)  # older generation, deleted
+    assert cache._client.exists(other)  # same generation, another prompt: kept for its pods
+
+
+def test_entries_expire_with_their_ttl():
+    rng = np.random.default_rng(3)
+    cache = make_cache()
+    vec = unit(rng.standard_normal(DIM).astype(np.float32))
+    key = add(cache, "q", vec, "answer", ttl=600)
+    bucket = key.split("{", 1)[1].split("}", 1)[0]
+    members_key = f"{MEMBERS_PREFIX}:{{{bucket}}}"
+    assert 0 < cache._client.ttl(key) <= 600
+    assert 0 < cache._client.ttl(members_key) <= 600
+    add(cache, "q2", near(rng, vec, 0.001), "answer 2", ttl=3600)
+    assert cache._client.ttl(members_key) > 600  # the bucket outlives its longest-lived entry
+
+
+def test_expired_entries_leave_their_bucket_on_lookup():
+    rng = np.random.default_rng(4)
+    cache = make_cache()
+    vec = unit(rng.standard_normal(DIM).astype(np.float32))
+    gone = add(cache, "gone", vec, "expired", ttl=600)
+    kept = add(cache, "kept", near(rng, vec, 0.001), "live", ttl=600)
+    members_key = f"{MEMBERS_PREFIX}:{{{gone.split('{', 1)[1].split('}', 1)[0]}}}"
+    cache._client.delete(gone)  # as if its TTL had run out
+    key, answer, _ = cache.search(vec, version="1-p")
+    assert (key, answer) == (kept, "live")
+    assert gone.encode() not in cache._client.smembers(members_key)
+
+
+def test_entries_in_the_old_json_format_are_dropped():
+    rng = np.random.default_rng(5)
+    cache = make_cache()
+    vec = unit(rng.standard_normal(DIM).astype(np.float32))
+    key = cache.key("legacy", vec)
+    bucket = key.split("{", 1)[1].split("}", 1)[0]
+    cache._client.set(key, '{"answer": "legacy"}')
+    cache._client.sadd(f"{MEMBERS_PREFIX}:{{{bucket}}}", key)
+    assert cache.search(vec, version="1-p") is None
+    assert not cache._client.exists(key)
+    add(cache, "legacy", vec, "rewritten")  # a string key is replaced by the hash
+    assert cache.search(vec, version="1-p")[1] == "rewritten"
+
+
+def test_lookups_read_at_most_max_candidates():
+    rng = np.random.default_rng(6)
+    cache = make_cache(probes=63, max_candidates=10)
+    for i in range(50):
+        add(cache, f"q{i}", unit(rng.standard_normal(DIM).astype(np.float32)), f"answer {i}")
+    read = []
+    original = cache._candidates
+    cache._candidates = lambda buckets: read.append(original(buckets)) or read[-1]
+    assert cache.search(unit(rng.standard_normal(DIM).astype(np.float32)), version="1-p") is not None
+    assert 0 < len(read[0]) <= 10
+
+
+if __name__ == "__main__":
+    test_set_stores_a_hash_with_the_vector_apart_from_the_answer()
+    test_search_finds_the_closest_entry_and_its_answer()
+    test_search_skips_other_versions_and_deletes_older_generations()
+    test_entries_expire_with_their_ttl()
+    test_expired_entries_leave_their_bucket_on_lookup()
+    test_entries_in_the_old_json_format_are_dropped()
+    test_lookups_read_at_most_max_candidates()
+    print("LSH cache checks passed")
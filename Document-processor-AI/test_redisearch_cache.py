@@ -0,0 +1,79 @@
+"""
+Checks for the RediSearch semantic cache backend against a stand-in for redisvl's index (no Redis or OpenAI needed).
+"""
+
+import numpy as np
+import redisearch_cache
+from redisearch_cache import RediSearchCache
+
+
+class FakeIndex:
+    """Records what the backend sends to redisvl and answers queries with canned results."""
+
+    created = []
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.loaded, self.queries, self.results = [], [], []
+
+    @classmethod
+    def from_dict(cls, schema, redis_client=None):
+        index = cls(schema)
+        cls.created.append(index)
+        return index
+
+    def create(self, overwrite=False):
+        pass
+
+    def load(self, records, keys=None, ttl=None):
+        self.loaded.append((records, keys, ttl))
+
+    def query(self, query):
+        self.queries.append(query)
+        return self.results
+
+
+def test_entries_are_hashes_with_a_float32_vector_and_a_ttl(monkeypatch):
+    monkeypatch.setattr(redisearch_cache, "SearchIndex", FakeIndex)
+    FakeIndex.created = []
+    cache = RediSearchCache(client=None)
+    vector = np.arange(8, dtype=np.float64)
+    key = cache.key("abc", vector)
+    cache.add(key, "What is RAG?", vector, "an answer", ttl=60, version="3-p")
+    cache.add(cache.key("def"), "Other?", vector, "another", version="3-p")
+
+    assert len(FakeIndex.created) == 1  # created on first use, with the embedding's dimensions
+    index = FakeIndex.created[0]
+    vector_field = [f for f in index.schema["fields"] if f["type"] == "vector"][0]
+    assert vector_field["attrs"]["dims"] == 8 and vector_field["attrs"]["distance_metric"] == "cosine"
+    records, keys, ttl = index.loaded[0]
+    assert keys == [key] and key.startswith(redisearch_cache.KEY_PREFIX) and ttl == 60
+    assert records[0]["embedding"] == vector.astype(np.float32).tobytes()
+    assert records[0]["version"] == "3-p" and records[0]["answer"] == "an answer"
+
+
+def test_search_is_one_knn_query_filtered_by_version(monkeypatch):
+    monkeypatch.setattr(redisearch_cache, "SearchIndex", FakeIndex)
+    FakeIndex.created = []
+    cache = RediSearchCache(client=None)
+    vector = np.ones(4, dtype=np.float32)
+    assert cache.search(vector, version="3-p") is None  # nothing cached
+
+    index = FakeIndex.created[0]
+    query = index.queries[0]
+    assert query._num_results == 1 and str(query.filter) == "@version:{3\\-p}"
+    index.results = [{"id": "genai:semantic_cache_vec:abc", "answer": "an answer", "vector_distance": "0.04"}]
+    key, answer, similarity = cache.search(vector, version="3-p")
+    assert (key, answer) == ("genai:semantic_cache_vec:abc", "an answer")
+    assert abs(similarity - 0.96) < 1e-9  # cosine distance turned into similarity
+
+    cache.search(vector)
+    assert str(index.queries[-1].filter) == "*"  # any version
+
+
+if __name__ == "__main__":
+    import pytest
+    for test in (test_entries_are_hashes_with_a_float32_vector_and_a_ttl, test_search_is_one_knn_query_filtered_by_version):
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            test(monkeypatch)
+    print("RediSearch cache checks passed")
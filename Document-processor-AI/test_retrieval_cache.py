@@ -0,0 +1,73 @@
+"""
+Checks for the retrieval result cache and what invalidates it (no Redis or OpenAI needed).
+"""
+
+import os
+os.environ.setdefault("OPENAI_API_KEY", "test")  # the embeddings refuse to import without one
+
+import numpy as np
+import retrieval
+from bm25_index import BM25Index
+from semantic_index import SemanticIndex
+from ttl_cache import TTLCache
+
+
+class FakeEmbedding:
+    def __init__(self, vector):
+        self.vector = vector
+
+
+def setup(monkeypatch, path):
+    searches = []
+
+    def search(query, k, vector):
+        searches.append((query, k))
+        return [(f"{query}-{i}-{len(searches)}", "text", {}) for i in range(k)]
+
+    monkeypatch.setattr(retrieval, "_search", search)
+    monkeypatch.setattr(retrieval, "current_generation", lambda: 1)
+    monkeypatch.setattr(retrieval, "corpus_revision", lambda: 0)
+    monkeypatch.setattr(retrieval, "_lexical", BM25Index(str(path)))
+    monkeypatch.setattr(retrieval, "_exact_results", TTLCache(max_entries=100, default_ttl=60))
+    monkeypatch.setattr(retrieval, "_similar_results", SemanticIndex(max_entries=100))
+    return searches
+
+
+def test_similar_tier_keeps_one_entry_per_k(monkeypatch, tmp_path):
+    searches = setup(monkeypatch, tmp_path)
+    vector = np.random.default_rng(0).standard_normal(16).astype(np.float32)
+    near = FakeEmbedding(vector + 0.001)
+    two = retrieval.retrieve_chunks_cached("what is rag", k=2, embedding=FakeEmbedding(vector))
+    five = retrieval.retrieve_chunks_cached("what is rag", k=5, embedding=FakeEmbedding(vector))
+    # a near-duplicate question finds the results of both k, the second did not replace the first
+    assert retrieval.retrieve_chunks_cached("explain rag", k=2, embedding=near) == two
+    assert retrieval.retrieve_chunks_cached("explain rag", k=5, embedding=near) == five
+    assert searches == [("what is rag", 2), ("what is rag", 5)]
+
+
+def test_index_writes_invalidate_without_redis(monkeypatch, tmp_path):
+    searches = setup(monkeypatch, tmp_path)
+    vector = np.random.default_rng(1).standard_normal(16).astype(np.float32)
+    retrieval.retrieve_chunks_cached("what is rag", k=2, embedding=FakeEmbedding(vector))
+    retrieval.retrieve_chunks_cached("what is rag", k=2, embedding=FakeEmbedding(vector))
+    assert len(searches) == 1
+
+    # a BM25 commit (the Redis generation stays the same, as when Redis is down)
+    retrieval._lexical.build([("c1", "retrieval augmented generation", {})])
+    retrieval.retrieve_chunks_cached("what is rag", k=2, embedding=FakeEmbedding(vector))
+    assert len(searches) == 2
+
+    # a write to the local vector backend
+    monkeypatch.setattr(retrieval, "corpus_revision", lambda: 1)
+    retrieval.retrieve_chunks_cached("what is rag", k=2, embedding=FakeEmbedding(vector + 0.001))
+    assert len(searches) == 3
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    import pytest
+    for test in (test_similar_tier_keeps_one_entry_per_k, test_index_writes_invalidate_without_redis):
+        with pytest.MonkeyPatch.context() as monkeypatch, tempfile.TemporaryDirectory() as path:
+            test(monkeypatch, Path(path))
+    print("Retrieval cache checks passed")
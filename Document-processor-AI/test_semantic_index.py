@@ -0,0 +1,85 @@
+"""
+Checks for the in-process semantic cache index (no Redis or OpenAI needed).
+"""
+
+import numpy as np
+from semantic_index import SemanticIndex
+
+
+def test_semantic_index():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((3, 8)).astype(np.float32)
+
+    index = SemanticIndex(initial_capacity=2)
+    for i, vec in enumerate(vectors):
+        index.add(f"k{i}", vec, f"answer {i}")
+    assert len(index) == 3
+
+    # a scaled copy of a stored vector is an exact cosine match
+    key, answer, score = index.search(vectors[1] * 5)
+    assert (key, answer) == ("k1", "answer 1")
+    assert abs(score - 1.0) < 1e-5
+
+    # removing a row keeps the others searchable
+    assert index.remove("k0")
+    assert index.search(vectors[2])[0] == "k2"
+    assert index.search(vectors[0])[0] != "k0"
+
+    # expired entries never match
+    index.add("k3", vectors[0], "stale", ttl=-1)
+    assert index.search(vectors[0])[0] != "k3"
+
+    index.clear()
+    assert index.search(vectors[0]) is None
+
+
+def test_semantic_index_quantized():
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((50, 64)).astype(np.float32)
+    for quantization, rescore in (("int8", 0), ("int8", 4), ("binary", 4)):
+        index = SemanticIndex(initial_capacity=8, quantization=quantization, rescore_candidates=rescore)
+        for i, vec in enumerate(vectors):
+            index.add(f"k{i}", vec, f"answer {i}")
+        key, _, score = index.search(vectors[7])
+        assert key == "k7" and abs(score - 1.0) < 1e-2
+        assert index.remove("k7") and index.search(vectors[7])[0] != "k7"
+        assert index.search(vectors[49])[0] == "k49"  # moved into the removed row
+    try:
+        SemanticIndex(quantization="binary", rescore_candidates=0)
+        assert False, "binary codes without rescoring should be rejected"
+    except ValueError:
+        pass
+
+
+def test_semantic_index_eviction():
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((3, 8)).astype(np.float32)
+
+    # LFU keeps the entry that was hit
+    index = SemanticIndex(max_entries=2, policy="lfu")
+    index.add("a", vectors[0], "a")
+    index.add("b", vectors[1], "b")
+    index.touch("a")
+    assert [key for key, _ in index.add("c", vectors[2], "c")] == ["b"]
+    assert "a" in index and "c" in index
+
+    # LRU evicts the least recently used entry
+    index = SemanticIndex(max_entries=2, policy="lru")
+    index.add("a", vectors[0], "a")
+    index.add("b", vectors[1], "b")
+    index.touch("a")
+    assert [key for key, _ in index.add("c", vectors[2], "c")] == ["b"]
+
+    # byte budget fits two entries (vector + 1-byte answer + 2-byte key each)
+    budget = 2 * (vectors[0].nbytes + 3)
+    index = SemanticIndex(max_bytes=budget)
+    for i, vec in enumerate(vectors):
+        index.add(f"k{i}", vec, "x")
+    assert len(index) == 2 and index.nbytes <= budget
+
+
+if __name__ == "__main__":
+    test_semantic_index()
+    test_semantic_index_quantized()
+    test_semantic_index_eviction()
+    print("Semantic index checks passed")
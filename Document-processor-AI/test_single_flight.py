@@ -0,0 +1,92 @@
+"""
+Checks for single-flight coalescing within a worker and across workers on fakeredis (no Redis or OpenAI needed).
+"""
+
+import asyncio
+import fakeredis
+import numpy as np
+from single_flight import QUESTIONS_PREFIX, SingleFlight
+
+
+def run_concurrently(flight, requests):
+    calls = []
+
+    def work(question):
+        async def generate():
+            calls.append(question)
+            await asyncio.sleep(0.05)
+            return f"answer to {question}"
+        return generate
+
+    async def main():
+        return await asyncio.gather(*(flight.run(question, vector, "v1", work(question)) for question, vector in requests))
+
+    return asyncio.run(main()), calls
+
+
+def test_identical_and_similar_questions_share_one_run():
+    rng = np.random.default_rng(0)
+    vector, other = rng.standard_normal(32), rng.standard_normal(32)
+    near = vector + 0.05 * rng.standard_normal(32)
+    flight = SingleFlight(threshold=0.95)
+    requests = [("What is RAG?", vector)] * 5 + [("what is  rag", None), ("Explain RAG", near), ("Other?", other)]
+    answers, calls = run_concurrently(flight, requests)
+    assert calls == ["What is RAG?", "Other?"]
+    assert answers == ["answer to What is RAG?"] * 7 + ["answer to Other?"]
+
+
+def test_followers_run_the_work_when_the_leader_fails():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(len(calls))
+        await asyncio.sleep(0.05)
+        if len(calls) == 1:
+            raise RuntimeError("upstream error")
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.run("q", None, "v1", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert isinstance(results[0], RuntimeError) and results[1:] == ["answer", "answer"]
+    assert len(calls) == 3
+
+
+def test_workers_share_a_similar_question_through_redis():
+    server = fakeredis.FakeServer()
+    rng = np.random.default_rng(1)
+    vector = rng.standard_normal(32)
+    near = vector + 0.05 * rng.standard_normal(32)
+    # two workers: separate in-process state, one Redis
+    workers = [SingleFlight(fakeredis.FakeAsyncRedis(server=server), threshold=0.95, wait_timeout=5)
+               for _ in range(2)]
+    calls, seen = [], []
+
+    def work(question):
+        async def generate():
+            calls.append(question)
+            seen.extend(await workers[0]._client.keys(f"{QUESTIONS_PREFIX}:*"))
+            await asyncio.sleep(0.1)
+            return f"answer to {question}"
+        return generate
+
+    async def main():
+        leader = asyncio.create_task(workers[0].run("What is RAG?", vector, "v1", work("What is RAG?")))
+        await asyncio.sleep(0.02)
+        follower = await workers[1].run("Explain RAG", near, "v1", work("Explain RAG"))
+        return await leader, follower, await workers[0]._client.keys(f"{QUESTIONS_PREFIX}:*")
+
+    leader, follower, left = asyncio.run(main())
+    assert calls == ["What is RAG?"]
+    assert leader == follower == "answer to What is RAG?"
+    assert len(seen) == 1 and seen[0].decode().startswith(f"{QUESTIONS_PREFIX}:v1:")  # one bucket per version
+    assert left == []  # the leader removed its question when it finished
+
+
+if __name__ == "__main__":
+    test_identical_and_similar_questions_share_one_run()
+    test_followers_run_the_work_when_the_leader_fails()
+    test_workers_share_a_similar_question_through_redis()
+    print("Single-flight checks passed")
@@ -0,0 +1,43 @@
+"""
+Checks for incremental redaction of streamed answers (no Redis or OpenAI needed).
+"""
+
+import random
+from stream_guard import StreamGuard
+from postprocess import secure_output
+from guardrails import apply_guardrails
+
+ANSWER = ("  Call 9876543210 or write to JANE.DOE@EXAMPLE.COM (also jane@example.org).\n"
+          "Her SSN 123-45-6789 and Aadhaar 123456789012 must not leak; the attack surface is small.  ")
+
+
+def stream(text, sizes, max_hold=256):
+    guard = StreamGuard(max_hold=max_hold)
+    pieces, start = [], 0
+    for size in sizes:
+        pieces.append(guard.feed(text[start:start + size]))
+        start += size
+    pieces.append(guard.feed(text[start:]))
+    pieces.append(guard.flush())
+    return pieces
+
+
+def test_streamed_output_matches_whole_answer():
+    expected = apply_guardrails(secure_output(ANSWER))
+    rng = random.Random(0)
+    for _ in range(200):
+        sizes = [rng.randint(1, 6) for _ in range(len(ANSWER) // 3)]
+        assert "".join(stream(ANSWER, sizes)) == expected
+
+
+def test_sensitive_spans_are_held_back():
+    pieces = stream("call 98765 43210 now", [5, 5])
+    assert pieces[:2] == ["call", ""]  # "98765" may still grow into a phone number
+    pieces = stream("x" * 20 + " ok", [10, 10], max_hold=12)
+    assert pieces[:2] == ["", "x" * 20]  # a run without whitespace is released past the bound
+
+
+if __name__ == "__main__":
+    test_streamed_output_matches_whole_answer()
+    test_sensitive_spans_are_held_back()
+    print("Stream guard checks passed")
@@ -0,0 +1,29 @@
+"""
+Checks for the base64 float32 embedding format (no Redis or OpenAI needed).
+"""
+
+import json
+import numpy as np
+from vector_codec import encode, decode, to_bytes
+
+
+def test_round_trip_is_exact():
+    vector = np.random.default_rng(0).standard_normal(256).astype(np.float32)
+    text = encode(vector)
+    assert len(text) == 1368  # base64 of 1 KiB of float32s
+    decoded = decode(json.loads(json.dumps({"embedding": text}))["embedding"])
+    assert decoded.dtype == np.float32 and np.array_equal(decoded, vector)
+    assert np.array_equal(decode(to_bytes(vector)), vector)
+
+
+def test_legacy_float_lists_are_read():
+    vector = [0.5, -0.25, 1.0]
+    decoded = decode(vector)
+    assert decoded.dtype == np.float32 and decoded.tolist() == vector
+    assert encode(vector) == encode(np.asarray(vector, dtype=np.float64))  # stored as float32 either way
+
+
+if __name__ == "__main__":
+    test_round_trip_is_exact()
+    test_legacy_float_lists_are_read()
+    print("Vector codec checks passed")
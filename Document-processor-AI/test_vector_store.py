@@ -0,0 +1,60 @@
+"""
+Checks for the vector store's shared connection pool against fakeredis (no Redis or OpenAI needed).
+"""
+
+import os
+os.environ.setdefault("OPENAI_API_KEY", "test")  # the embeddings refuse to import without one
+
+import fakeredis
+import redis
+import vector_store
+
+
+def make_pool(server):
+    return redis.BlockingConnectionPool(max_connections=1, timeout=0.05, queue_class=vector_store._PoolQueue,
+                                        connection_class=fakeredis.FakeConnection, server=server)
+
+
+def test_an_exhausted_pool_raises_its_own_error():
+    pool = make_pool(fakeredis.FakeServer())
+    held = pool.get_connection("PING")
+    try:
+        redis.Redis(connection_pool=pool).ping()
+        assert False, "expected PoolExhaustedError"
+    except vector_store.PoolExhaustedError:
+        pass
+    pool.release(held)
+    assert redis.Redis(connection_pool=pool).ping()
+
+
+def test_with_store_retries_lost_connections_but_not_pool_exhaustion(monkeypatch):
+    monkeypatch.setattr(vector_store, "get_vector_store", lambda: "store")
+    monkeypatch.setattr(vector_store, "_record_pool", lambda: None)
+    calls = []
+
+    def search(error):
+        def run(store):
+            calls.append(store)
+            if len(calls) == 1:
+                raise error
+            return "results"
+        return run
+
+    assert vector_store._with_store(search(redis.ConnectionError("Connection reset by peer"))) == "results"
+    assert len(calls) == 2
+
+    calls.clear()
+    try:
+        vector_store._with_store(search(vector_store.PoolExhaustedError("busy")))
+        assert False, "expected PoolExhaustedError"
+    except vector_store.PoolExhaustedError:
+        pass
+    assert len(calls) == 1  # every connection was busy, nothing to reconnect
+
+
+if __name__ == "__main__":
+    import pytest
+    test_an_exhausted_pool_raises_its_own_error()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_with_store_retries_lost_connections_but_not_pool_exhaustion(monkeypatch)
+    print("Vector store checks passed")
@@ -0,0 +1,68 @@
+"""
+Checks for the cache warm-up: question ranking from the audit log (no Redis or OpenAI needed).
+"""
+
+import logging
+from observability import log as audit_log, log_cache_hit
+from warmup import questions_from_log, record_questions, warm_cache
+
+
+def test_warmup_runs_are_not_ranked(tmp_path):
+    path = tmp_path / "pipeline.log"
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    root = logging.getLogger()
+    level = root.level
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    try:
+        for question in ["popular"] * 3 + ["rare"]:
+            audit_log(question, "prompt", "answer")
+        log_cache_hit("rare")
+
+        def run(question):  # a warm-up run misses for one question and hits for the other
+            if question == "rare":
+                audit_log(question, "prompt", "answer")
+            else:
+                log_cache_hit(question)
+
+        for _ in range(3):  # ranking must not drift towards what was warmed
+            assert warm_cache(["rare"] * 4, run, concurrency=2).warmed == 4
+        warm_cache(["popular"], run, concurrency=1)
+    finally:
+        root.removeHandler(handler)
+        root.setLevel(level)
+        handler.close()
+    assert questions_from_log(str(path), top=2) == ["popular", "rare"]
+    assert questions_from_log(str(path), top=1) == ["popular"]
+    assert "Warm-up question: rare" in path.read_text(encoding="utf-8")
+
+
+def test_recorded_questions_feed_the_warmup(tmp_path):
+    path = tmp_path / "questions.log"
+    root = logging.getLogger()
+    level = root.level
+    root.setLevel(logging.INFO)
+    handler = record_questions(str(path))
+    try:
+        for question in ["popular"] * 2 + ["rare"]:
+            audit_log(question, "prompt", "answer")
+        log_cache_hit("popular")
+        logging.info("Retrieval latency: 12ms")
+    finally:
+        root.removeHandler(handler)
+        root.setLevel(level)
+        handler.close()
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 4  # only the question lines, not the rest of the audit log
+    assert questions_from_log(str(path), top=2) == ["popular", "rare"]
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp:
+        test_warmup_runs_are_not_ranked(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_recorded_questions_feed_the_warmup(Path(tmp))
+    print("Warm-up checks passed")
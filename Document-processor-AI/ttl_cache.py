@@ -0,0 +1,47 @@
+# small thread-safe in-process cache with per-entry TTL and LRU eviction
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire after their own TTL."""
+
+    def __init__(self, max_entries: int, default_ttl: Optional[float] = None):
+        self._max_entries = max_entries
+        self._default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._data: OrderedDict[Any, tuple[Any, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None) -> None:
+        ttl = self._default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else float("inf")
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,24 @@
+# embedding wire and storage format: little-endian float32 bytes, base64 where the container is text
+import base64
+import numpy as np
+
+VECTOR_DTYPE = np.dtype("<f4")  # the layout the embeddings API sends with encoding_format="base64"
+
+def decode(value) -> np.ndarray:
+    """
+    float32 vector from base64 text or raw bytes, a view over the decoded buffer.
+    Lists of floats, the format of entries written before base64, are still read.
+    """
+    if isinstance(value, str):
+        value = base64.b64decode(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=VECTOR_DTYPE)
+    return np.asarray(value, dtype=np.float32)
+
+def to_bytes(vector) -> bytes:
+    """Raw float32 bytes of a vector, as stored in Redis vector fields."""
+    return np.ascontiguousarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+def encode(vector) -> str:
+    """base64 text of a vector's float32 bytes, for JSON entries."""
+    return base64.b64encode(to_bytes(vector)).decode("ascii")
@@ -1,42 +1,269 @@
-# implementation of vector store using REDIS
+# implementation of vector store using REDIS, or local memory-mapped files (VECTOR_BACKEND=local)
+import json
+import uuid
+import hashlib
+import asyncio
+import logging
+import threading
+from queue import Empty, LifoQueue
+import redis
+import redis.asyncio
 from langchain_redis import RedisVectorStore
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.docstore.document import Document
+from redisvl.redis.utils import array_to_buffer
 import os
 from dotenv import load_dotenv
+from config import (VECTOR_BACKEND, VECTOR_STORE_POOL_SIZE, VECTOR_STORE_POOL_TIMEOUT_SECONDS,
+                    VECTOR_STORE_HEALTH_CHECK_SECONDS, LOCAL_INDEX_DIR,
+                    LOCAL_INDEX_IVF_MIN_ROWS, LOCAL_INDEX_REBUILD_RATIO, LOCAL_INDEX_IVF_PROBES, LOCAL_INDEX_QUANTIZATION,
+                    LOCAL_INDEX_RESCORE_CANDIDATES, PARENT_CANDIDATES_PER_RESULT, EMBEDDING_DIMENSIONS)
+from local_vector_store import LocalVectorStore, LocalParentStore
+from embeddings import CompactEmbeddings, get_embeddings, aget_embeddings
+from vector_codec import to_bytes
+from observability import record_pool_usage
 load_dotenv()
 
 REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0") # Default Redis URL
 INDEX_NAME = "genai_docs"
+PARENT_PREFIX = "genai:parent"  # parent sections, outside the index prefix so they are not indexed
 
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small")
+embeddings = CompactEmbeddings()
+
+# One connection pool and one vector store per process, created on first use.
+# Idle connections are health-checked before reuse, so a Redis restart costs one retry.
+# More threads than connections query at once (uvicorn's threadpool, asyncio.to_thread), so a query
+# waits for a free connection instead of failing with "Too many connections".
+class PoolExhaustedError(redis.ConnectionError):
+    """No pooled connection came free within VECTOR_STORE_POOL_TIMEOUT_SECONDS; no connection was lost."""
+
+
+class _PoolQueue(LifoQueue):
+    # BlockingConnectionPool waits on this queue for an idle connection, raise our own error on timeout
+    def get(self, block=True, timeout=None):
+        try:
+            return super().get(block, timeout)
+        except Empty:
+            raise PoolExhaustedError(f"No vector store connection available after {timeout}s") from None
+
+
+_pool = redis.BlockingConnectionPool.from_url(REDIS_URL, max_connections=VECTOR_STORE_POOL_SIZE,
+                                              timeout=VECTOR_STORE_POOL_TIMEOUT_SECONDS, queue_class=_PoolQueue,
+                                              health_check_interval=VECTOR_STORE_HEALTH_CHECK_SECONDS)
+# the async request path reads parent sections through its own pool, bound to the serving event loop;
+# it blocks rather than fails when every connection is in use by other in-flight requests
+_async_pool = redis.asyncio.BlockingConnectionPool.from_url(REDIS_URL, max_connections=VECTOR_STORE_POOL_SIZE,
+                                                            health_check_interval=VECTOR_STORE_HEALTH_CHECK_SECONDS)
+_store: RedisVectorStore | None = None
+_store_lock = threading.Lock()
+
+# Local backend: no Redis Stack on the retrieval path, every worker maps the same files
+_local = LocalVectorStore(LOCAL_INDEX_DIR, probes=LOCAL_INDEX_IVF_PROBES, quantization=LOCAL_INDEX_QUANTIZATION,
+                          rescore_candidates=LOCAL_INDEX_RESCORE_CANDIDATES) if VECTOR_BACKEND == "local" else None
+_local_parents = LocalParentStore(LOCAL_INDEX_DIR) if VECTOR_BACKEND == "local" else None
 
 def add_documents(texts: list[str]):
+    if _local is not None:
+        add_embedded(texts, get_embeddings(texts))
+        return
     docs = [Document(page_content=text) for text in texts]
-    RedisVectorStore.from_documents(
-        docs,
-        embeddings,
-        redis_url=REDIS_URL,
-        index_name=INDEX_NAME
-    )
-
-def get_vector_store():
-    """Get the Redis vector store."""
-    return RedisVectorStore(
-        redis_url=REDIS_URL,
-        index_name=INDEX_NAME,
-        embeddings=embeddings
-    )
-
-def retrieve(query: str, k: int = 2) -> list[str]:
-    """Retrieve documents similar to the query."""
-    vector_store = get_vector_store()
-    results = vector_store.similarity_search(query, k=k)
-    return [d.page_content for d in results] # Convert Document to string
+    get_vector_store().add_documents(docs)
+
+def add_embedded(texts: list[str], vectors, metadatas: list[dict] | None = None,
+                 ids: list[str] | None = None) -> list[str]:
+    """
+    Write chunks whose embeddings were computed already, in the record layout
+    RedisVectorStore.add_texts uses, so ingestion can embed and write in separate stages.
+    The chunk id is also stored in the metadata: search results do not carry the key.
+    """
+    if _local is not None:
+        return _local.add(ids or [uuid.uuid4().hex for _ in texts], texts, vectors, metadatas)
+    store = get_vector_store()
+    config = store.config
+    records = []
+    for i, (text, vector, metadata) in enumerate(zip(texts, vectors, metadatas or [{}] * len(texts))):
+        records.append({
+            config.content_field: text,
+            config.embedding_field: array_to_buffer(vector, dtype=config.vector_datatype),
+            "_index_name": config.index_name,
+            "_metadata_json": json.dumps({**metadata, "chunk_id": ids[i]} if ids else metadata),
+            **{name: value for name, value in metadata.items() if value is not None},
+        })
+    keys = [f"{config.key_prefix}:{id_}" for id_ in ids] if ids else None
+    written = store.index.load(records, keys=keys)
+    prefix = f"{config.key_prefix}:"
+    return [key[len(prefix):] if key.startswith(prefix) else key for key in written or []]
+
+def get_vector_store() -> RedisVectorStore:
+    """Get the shared Redis vector store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                # known dimensions skip the sample embedding call RedisVectorStore makes otherwise
+                _store = RedisVectorStore(
+                    redis_client=redis.Redis(connection_pool=_pool),
+                    index_name=INDEX_NAME,
+                    embeddings=embeddings,
+                    embedding_dimensions=EMBEDDING_DIMENSIONS
+                )
+    return _store
+
+def redis_client() -> redis.Redis:
+    """Client on the shared pool, for bookkeeping next to the index (e.g. the corpus manifest)."""
+    return redis.Redis(connection_pool=_pool)
+
+def existing_ids(ids: list[str]) -> set[str]:
+    """The chunk ids that are already stored."""
+    if _local is not None:
+        return _local.existing_ids(ids)
+    prefix = get_vector_store().config.key_prefix
+    pipe = redis_client().pipeline(transaction=False)
+    for id_ in ids:
+        pipe.exists(f"{prefix}:{id_}")
+    return {id_ for id_, exists in zip(ids, pipe.execute()) if exists}
+
+def delete_ids(ids: list[str]) -> None:
+    if ids and _local is not None:
+        _local.delete(ids)
+    elif ids:
+        get_vector_store().delete(ids)
+
+# Parent sections: chunks are embedded for search, the larger section they belong to is stored once and returned as context
+
+def add_parents(parents: list[tuple[str, str, dict]]) -> None:
+    """Store (parent id, text, metadata) sections."""
+    if not parents:
+        return
+    if _local_parents is not None:
+        _local_parents.add(parents)
+        return
+    redis_client().mset({f"{PARENT_PREFIX}:{id_}": json.dumps([text, metadata]) for id_, text, metadata in parents})
+
+def get_parents(ids: list[str]) -> dict[str, tuple[str, dict]]:
+    """Parent id -> (text, metadata) of the stored sections among `ids`."""
+    if not ids:
+        return {}
+    if _local_parents is not None:
+        return _local_parents.get(ids)
+    values = redis_client().mget([f"{PARENT_PREFIX}:{id_}" for id_ in ids])
+    return {id_: tuple(json.loads(value)) for id_, value in zip(ids, values) if value}
+
+def delete_parents(ids: list[str]) -> None:
+    if ids and _local_parents is not None:
+        _local_parents.delete(ids)
+    elif ids:
+        redis_client().delete(*(f"{PARENT_PREFIX}:{id_}" for id_ in ids))
+
+def _parent_ids(chunks: list[tuple[str, str, dict]]) -> list[str]:
+    return list(dict.fromkeys(m["parent_id"] for _, _, m in chunks if m and m.get("parent_id")))
+
+def _replace_by_parents(chunks: list[tuple[str, str, dict]], parents: dict[str, tuple[str, dict]],
+                        k: int) -> list[tuple[str, str, dict]]:
+    results, seen = [], set()
+    for chunk_id, text, metadata in chunks:
+        parent_id = (metadata or {}).get("parent_id")
+        result = (parent_id, *parents[parent_id]) if parent_id in parents else (chunk_id, text, metadata)
+        if result[0] not in seen:
+            seen.add(result[0])
+            results.append(result)
+            if len(results) == k:
+                break
+    return results
+
+def expand_to_parents(chunks: list[tuple[str, str, dict]], k: int) -> list[tuple[str, str, dict]]:
+    """
+    Replace ranked (chunk id, text, metadata) chunks by their parent sections,
+    deduplicated in rank order, and keep the first k. Chunks without a stored
+    parent (ingested before parents existed) stand for themselves.
+    """
+    return _replace_by_parents(chunks, get_parents(_parent_ids(chunks)), k)
+
+async def aget_parents(ids: list[str]) -> dict[str, tuple[str, dict]]:
+    """Async `get_parents`."""
+    if not ids or _local_parents is not None:
+        return get_parents(ids)  # local sections are read from the page cache, no network round trip
+    values = await redis.asyncio.Redis(connection_pool=_async_pool).mget([f"{PARENT_PREFIX}:{id_}" for id_ in ids])
+    return {id_: tuple(json.loads(value)) for id_, value in zip(ids, values) if value}
+
+async def aexpand_to_parents(chunks: list[tuple[str, str, dict]], k: int) -> list[tuple[str, str, dict]]:
+    """Async `expand_to_parents`."""
+    return _replace_by_parents(chunks, await aget_parents(_parent_ids(chunks)), k)
+
+def optimize_index() -> None:
+    """After ingestion: build, extend or compact the local backend's IVF lists, as much as the change requires."""
+    if _local is not None:
+        _local.optimize(LOCAL_INDEX_IVF_MIN_ROWS, LOCAL_INDEX_REBUILD_RATIO)
+
+def corpus_revision() -> int:
+    """Revision of the local backend's files, bumped by every write; 0 with Redis, whose writes bump the corpus generation."""
+    return _local.revision if _local is not None else 0
+
+def _record_pool():
+    # redis-py keeps no public counters for the pool, read its bookkeeping directly:
+    # the queue holds idle connections and None for connections not created yet
+    available = sum(connection is not None for connection in list(_pool.pool.queue))
+    record_pool_usage(len(_pool._connections) - available, available, _pool.max_connections)
+
+def _with_store(search):
+    """
+    Run a query against the shared store, retrying once if its connection was lost.
+    redis-py drops the broken connection, the others in the pool stay with the threads using them.
+    """
+    try:
+        return search(get_vector_store())
+    except PoolExhaustedError:
+        raise  # every connection busy for VECTOR_STORE_POOL_TIMEOUT_SECONDS: nothing was lost
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        logging.warning(f"Vector store connection lost, reconnecting: {e}")
+        return search(get_vector_store())
+    finally:
+        _record_pool()
+
+def ping() -> bool:
+    """True if the vector store's Redis answers."""
+    if _local is not None:
+        return True
+    try:
+        return bool(redis_client().ping())
+    except redis.RedisError:
+        return False
+
+def _as_chunk(doc: Document) -> tuple[str, str, dict]:
+    """
+    (chunk id, text, metadata) of a search result. LangChain builds results from the
+    stored metadata only (Document.id is None); chunks written without an id in their
+    metadata (add_documents, older ingestions) fall back to a digest of their text.
+    """
+    metadata = dict(doc.metadata)
+    chunk_id = metadata.pop("chunk_id", None) or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()[:32]
+    return chunk_id, doc.page_content, metadata
+
+def retrieve_chunks(query: str, k: int = 2, embedding=None) -> list[tuple[str, str, dict]]:
+    """Retrieve (chunk id, text, metadata) of the documents similar to the query, reusing its embedding when given."""
+    vector = embedding if embedding is not None else get_embeddings([query])[0]
+    if _local is not None:
+        return [(record["id"], record["text"], record["metadata"]) for record, _ in _local.search(vector, k)]
+    # the query vector goes to Redis as the float32 bytes it arrived in
+    results = _with_store(lambda store: store.similarity_search_by_vector(to_bytes(vector), k=k))
+    return [_as_chunk(d) for d in results]
+
+async def aretrieve_chunks(query: str, k: int = 2, embedding=None) -> list[tuple[str, str, dict]]:
+    """
+    Async `retrieve_chunks`. The query embedding is awaited, the search itself runs
+    in the default executor, like the async search methods of LangChain vector stores.
+    """
+    vector = embedding if embedding is not None else (await aget_embeddings([query]))[0]
+    return await asyncio.to_thread(retrieve_chunks, query, k, vector)
+
+def retrieve(query: str, k: int = 2, embedding=None) -> list[str]:
+    """Retrieve the k distinct parent sections of the chunks most similar to the query, reusing its embedding when given."""
+    chunks = retrieve_chunks(query, k * PARENT_CANDIDATES_PER_RESULT, embedding=embedding)
+    return [text for _, text, _ in expand_to_parents(chunks, k)] # Convert Document to string
 
 def retrieve_with_score(query: str, k: int = 2) -> list[tuple[str, float]]:
     """Retrieve documents with their similarity scores."""
-    vector_store = get_vector_store()
-    results = vector_store.similarity_search_with_score(query, k=k)
-    return [(d.page_content, score) for d, score in results] # Convert Document to string
\ No newline at end of file
+    if _local is not None:
+        # reported as cosine distance, like the Redis backend
+        return [(record["text"], 1.0 - score) for record, score in _local.search(get_embeddings([query])[0], k)]
+    results = _with_store(lambda store: store.similarity_search_with_score(query, k=k))
+    return [(d.page_content, score) for d, score in results] # Convert Document to string
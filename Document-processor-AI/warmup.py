@@ -0,0 +1,128 @@
+# warm the semantic cache from historical traffic before serving requests
+import re
+import time
+import logging
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+from observability import record_warmup, warmup_run
+
+# one line per request: the audit log on a miss, the cache-hit line on a hit.
+# Warm-up runs log "Warm-up question" / "Warm-up cache hit" instead, so they never count.
+_QUESTION_LINE = re.compile(r" - INFO - (?:Question|Semantic cache hit for question): (.+)$")
+_QUESTION_MESSAGE = re.compile(r"(?:Question|Semantic cache hit for question): ")
+_LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+def questions_from_log(path: str, top: int) -> list[str]:
+    """Most frequent questions in an audit log (observability.log output, e.g. pipeline.log)."""
+    counts = Counter()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = _QUESTION_LINE.search(line.rstrip("\n"))
+            if match and match.group(1).strip():
+                counts[match.group(1).strip()] += 1
+    return [question for question, _ in counts.most_common(top)]
+
+def record_questions(path: str) -> logging.Handler:
+    """
+    Append the question lines of served requests to `path`, in the format questions_from_log reads.
+    For processes, like the API, that do not write the full audit log to a file.
+    """
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setLevel(logging.INFO)
+    handler.setFormatter(logging.Formatter(_LOG_FORMAT))
+    handler.addFilter(lambda record: bool(_QUESTION_MESSAGE.match(record.getMessage())))
+    logging.getLogger().addHandler(handler)
+    return handler
+
+def questions_from_file(path: str, top: int) -> list[str]:
+    """Questions from a plain text file, one per line."""
+    with open(path, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    return list(dict.fromkeys(questions))[:top]
+
+def _warm_one(run: Callable[[str], object], question: str):
+    with warmup_run():
+        return run(question)
+
+
+class WarmupStatus:
+    """Progress of a warm-up run, shared with the readiness endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.done = 0
+        self.warmed = 0
+        self.failed = 0
+        self.finished = False
+
+    def _publish(self):
+        record_warmup(self.total, self.done, self.warmed, self.failed)
+
+    def start(self, total: int):
+        with self._lock:
+            self.total = total
+            self._publish()
+
+    def complete(self, ok: bool):
+        with self._lock:
+            self.done += 1
+            if ok:
+                self.warmed += 1
+            else:
+                self.failed += 1
+            self._publish()
+
+    def finish(self):
+        with self._lock:
+            self.finished = True
+
+    def as_dict(self) -> dict:
+        return {"total": self.total, "done": self.done, "warmed": self.warmed,
+                "failed": self.failed, "finished": self.finished}
+
+
+def warm_cache(questions: list[str], run: Callable[[str], object], concurrency: int,
+               status: WarmupStatus | None = None) -> WarmupStatus:
+    """
+    Run each question through the pipeline with at most `concurrency` in flight.
+    The pipeline writes every answer to the cache, so a finished run leaves it warm.
+    """
+    status = status or WarmupStatus()
+    status.start(len(questions))
+    logging.info(f"Cache warm-up started: {len(questions)} questions, concurrency {concurrency}")
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="cache-warmup") as pool:
+        futures = {pool.submit(_warm_one, run, question): question for question in questions}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                status.complete(ok=True)
+            except Exception as e:
+                logging.warning(f"Warm-up failed for question '{futures[future]}': {e}")
+                status.complete(ok=False)
+            logging.info(f"Cache warm-up progress: {status.done}/{status.total}")
+    status.finish()
+    logging.info(f"Cache warm-up finished: {status.warmed} entries warmed, {status.failed} failed in {time.time() - t0:.1f}s")
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm the semantic cache from historical questions")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--log", type=str, help="Audit log to read the most frequent questions from")
+    source.add_argument("--questions", type=str, help="Text file with one question per line")
+    parser.add_argument("--top", type=int, default=100, help="Number of questions to warm")
+    parser.add_argument("--concurrency", type=int, default=4, help="Pipeline runs in flight")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=_LOG_FORMAT)
+    from pipeline import run_pipeline
+    questions = questions_from_log(args.log, args.top) if args.log else questions_from_file(args.questions, args.top)
+    result = warm_cache(questions, run_pipeline, args.concurrency)
+    print(f"Warmed {result.warmed}/{result.total} questions ({result.failed} failed)")
+
+# python warmup.py --log pipeline.log --top 100 --concurrency 4